@@ -0,0 +1,37 @@
+from django.conf import settings
+
+# Most observations a filtered query may return, a request may only lower it with ?max_rows=
+# A full export (no filters) streams every row in constant memory and is not limited
+NMEA_MAX_ROWS = getattr(settings, "NMEA_MAX_ROWS", 1000000)
+
+
+def filter_nmea(queryset, filters):
+    """
+    This function narrows a queryset of NMEA observations with the validated filters of NMEAFilterSerializer
+    The time range is read on the index on (time), and a constellation and SVID with a time range on the
+    index on (ConstellationType, SVID, time). The other filters are applied to the rows read from an index
+
+    Inputs:
+    queryset: NMEA observations
+    filters: start, end (included), constellation, svid, prn, min_elevation, min_cn0, the missing ones are not applied
+
+    Outputs:
+    queryset: Observations matching all the filters
+    """
+    lookups = {
+        "start": "time__gte",
+        "end": "time__lte",
+        "constellation": "ConstellationType",
+        "svid": "SVID",
+        "prn": "PRN",
+        "min_elevation": "Elevation__gte",
+        "min_cn0": "C_N0__gte",
+    }
+    return queryset.filter(**{lookup: filters[key] for key, lookup in lookups.items() if key in filters})
+
+
+def exceeds_max_rows(queryset, max_rows):
+    """
+    True if the queryset holds more than max_rows rows, at most max_rows + 1 rows of the index are read
+    """
+    return queryset.order_by()[max_rows:max_rows + 1].exists()
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PhoneAPI', '0002_nmea'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='nmea',
+            name='time',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='PRN',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='C_N0',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='ConstellationType',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='SVID',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='Azimuth',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='Elevation',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='nmea',
+            name='time_typed',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='nmea',
+            name='PRN_typed',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='nmea',
+            name='C_N0_typed',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='nmea',
+            name='ConstellationType_typed',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='nmea',
+            name='SVID_typed',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='nmea',
+            name='Azimuth_typed',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='nmea',
+            name='Elevation_typed',
+            field=models.FloatField(null=True),
+        ),
+    ]
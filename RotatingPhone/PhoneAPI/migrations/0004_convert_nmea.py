@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+from django.utils.dateparse import parse_datetime
+
+# Rows converted at a time
+BATCH_SIZE = 1000
+
+
+def parse_time(value):
+    """
+    Time stored as seconds since the epoch or as an ISO 8601 string
+    """
+    try:
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    except ValueError:
+        pass
+    time = parse_datetime(value.strip())
+    if time is None:
+        raise ValueError(f"Unknown time: {value}")
+    return time if time.tzinfo else time.replace(tzinfo=timezone.utc)
+
+
+def parse_int(value):
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"Not an integer: {value}")
+    return int(number)
+
+
+CONVERT = {
+    'time': parse_time,
+    'PRN': parse_int,
+    'C_N0': float,
+    'ConstellationType': parse_int,
+    'SVID': parse_int,
+    'Azimuth': float,
+    'Elevation': float,
+}
+
+
+def batches(NMEA):
+    """
+    Rows of the table BATCH_SIZE at a time, in the order of their id
+    """
+    last = None
+    rows = NMEA.objects.order_by('pk')
+    while True:
+        batch = list((rows if last is None else rows.filter(pk__gt=last))[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+def convert_nmea(apps, schema_editor):
+    NMEA = apps.get_model('PhoneAPI', 'NMEA')
+    failed = []
+    for batch in batches(NMEA):
+        for row in batch:
+            try:
+                for field, convert in CONVERT.items():
+                    setattr(row, f'{field}_typed', convert(getattr(row, field)))
+            except (TypeError, ValueError, OverflowError, OSError):
+                failed.append(row.pk)
+        NMEA.objects.bulk_update(batch, [f'{field}_typed' for field in CONVERT])
+    if failed:
+        raise ValueError(f"{len(failed)} NMEA rows cannot be converted, fix or delete them first (id: "
+                         f"{', '.join(str(pk) for pk in failed[:20])}{', ...' if len(failed) > 20 else ''})")
+
+
+def revert_nmea(apps, schema_editor):
+    NMEA = apps.get_model('PhoneAPI', 'NMEA')
+    for batch in batches(NMEA):
+        for row in batch:
+            for field in CONVERT:
+                value = getattr(row, f'{field}_typed')
+                setattr(row, field, value.isoformat() if field == 'time' else str(value))
+        NMEA.objects.bulk_update(batch, list(CONVERT))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PhoneAPI', '0003_nmea_typed_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_nmea, revert_nmea),
+    ]
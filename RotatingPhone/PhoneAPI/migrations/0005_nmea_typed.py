@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PhoneAPI', '0004_convert_nmea'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='nmea',
+            name='time',
+        ),
+        migrations.RemoveField(
+            model_name='nmea',
+            name='PRN',
+        ),
+        migrations.RemoveField(
+            model_name='nmea',
+            name='C_N0',
+        ),
+        migrations.RemoveField(
+            model_name='nmea',
+            name='ConstellationType',
+        ),
+        migrations.RemoveField(
+            model_name='nmea',
+            name='SVID',
+        ),
+        migrations.RemoveField(
+            model_name='nmea',
+            name='Azimuth',
+        ),
+        migrations.RemoveField(
+            model_name='nmea',
+            name='Elevation',
+        ),
+        migrations.RenameField(
+            model_name='nmea',
+            old_name='time_typed',
+            new_name='time',
+        ),
+        migrations.RenameField(
+            model_name='nmea',
+            old_name='PRN_typed',
+            new_name='PRN',
+        ),
+        migrations.RenameField(
+            model_name='nmea',
+            old_name='C_N0_typed',
+            new_name='C_N0',
+        ),
+        migrations.RenameField(
+            model_name='nmea',
+            old_name='ConstellationType_typed',
+            new_name='ConstellationType',
+        ),
+        migrations.RenameField(
+            model_name='nmea',
+            old_name='SVID_typed',
+            new_name='SVID',
+        ),
+        migrations.RenameField(
+            model_name='nmea',
+            old_name='Azimuth_typed',
+            new_name='Azimuth',
+        ),
+        migrations.RenameField(
+            model_name='nmea',
+            old_name='Elevation_typed',
+            new_name='Elevation',
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='PRN',
+            field=models.PositiveSmallIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='C_N0',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='ConstellationType',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Unknown'), (1, 'GPS'), (2, 'SBAS'), (3, 'GLONASS'), (4, 'QZSS'), (5, 'BeiDou'), (6, 'Galileo'), (7, 'IRNSS')]),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='SVID',
+            field=models.PositiveSmallIntegerField(),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='Azimuth',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='nmea',
+            name='Elevation',
+            field=models.FloatField(),
+        ),
+        migrations.AddIndex(
+            model_name='nmea',
+            index=models.Index(fields=['time'], name='nmea_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='nmea',
+            index=models.Index(fields=['ConstellationType', 'SVID', 'time'], name='nmea_satellite_time_idx'),
+        ),
+    ]
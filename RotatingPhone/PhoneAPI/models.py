@@ -6,11 +6,28 @@ class Book(models.Model):
     title=models.CharField(max_length=200)
     author=models.CharField(max_length=200)
 
+class Constellation(models.IntegerChoices):
+    # Constellation types of the Android GnssStatus
+    UNKNOWN = 0, "Unknown"
+    GPS = 1, "GPS"
+    SBAS = 2, "SBAS"
+    GLONASS = 3, "GLONASS"
+    QZSS = 4, "QZSS"
+    BEIDOU = 5, "BeiDou"
+    GALILEO = 6, "Galileo"
+    IRNSS = 7, "IRNSS"
+
 class NMEA(models.Model):
-    time = models.CharField(max_length = 200)
-    PRN = models.CharField(max_length = 200)
-    C_N0 = models.CharField(max_length = 200)
-    ConstellationType = models.CharField(max_length = 200)
-    SVID = models.CharField(max_length = 200)
-    Azimuth = models.CharField(max_length = 200)
-    Elevation = models.CharField(max_length = 200)
+    time = models.DateTimeField()
+    PRN = models.PositiveSmallIntegerField()
+    C_N0 = models.FloatField()
+    ConstellationType = models.PositiveSmallIntegerField(choices = Constellation.choices)
+    SVID = models.PositiveSmallIntegerField()
+    Azimuth = models.FloatField()
+    Elevation = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ["time"], name = "nmea_time_idx"),
+            models.Index(fields = ["ConstellationType", "SVID", "time"], name = "nmea_satellite_time_idx"),
+        ]
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Keyset pagination on the primary key: every page is read with "id > last id of the previous page"
+    on the index of the primary key, so the pages stay fast however deep they are
+    """
+    ordering = "id"
+    page_size = 1000
+    page_size_query_param = "limit"
+    max_page_size = 10000
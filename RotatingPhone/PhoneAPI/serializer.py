@@ -1,4 +1,7 @@
+from datetime import datetime, timezone
 from rest_framework import serializers
+from .models import Constellation
+from .filters import NMEA_MAX_ROWS
 
 class BookSerializer(serializers.Serializer):
     id=serializers.IntegerField(label = "Enter Book ID")
@@ -6,11 +9,53 @@ class BookSerializer(serializers.Serializer):
     author=serializers.CharField(label = "Enter Book Author Names")
 
 
+class EpochDateTimeField(serializers.DateTimeField):
+    """
+    Time as an ISO 8601 string or as seconds since the epoch (number or numeric string, UTC)
+    """
+    def to_internal_value(self, value):
+        if isinstance(value, bool):
+            self.fail("invalid", format="ISO 8601 or seconds since the epoch")
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            return super().to_internal_value(value)
+        try:
+            return self.enforce_timezone(datetime.fromtimestamp(seconds, tz=timezone.utc))
+        except (OverflowError, OSError, ValueError):
+            self.fail("invalid", format="ISO 8601 or seconds since the epoch")
+
+
 class NMEASerializer(serializers.Serializer):
-    time = serializers.CharField(label = "Time")
-    PRN = serializers.CharField(label = "PRN")
-    C_N0 = serializers.CharField(label = "C_N0")
-    ConstellationType = serializers.CharField(label = "ConstellationType")
-    SVID = serializers.CharField(label = "SVID")
-    Azimuth = serializers.CharField(label = "Azimuth")
-    Elevation = serializers.CharField(label = "Elevation")
\ No newline at end of file
+    time = EpochDateTimeField(label = "Time")
+    PRN = serializers.IntegerField(label = "PRN", min_value = 0, max_value = 32767)
+    C_N0 = serializers.FloatField(label = "C_N0")
+    ConstellationType = serializers.ChoiceField(label = "ConstellationType", choices = Constellation.choices)
+    SVID = serializers.IntegerField(label = "SVID", min_value = 0, max_value = 32767)
+    Azimuth = serializers.FloatField(label = "Azimuth", min_value = 0, max_value = 360)
+    Elevation = serializers.FloatField(label = "Elevation", min_value = -90, max_value = 90)
+
+
+class ConstellationField(serializers.ChoiceField):
+    """
+    Constellation as its code (e.g. 1) or its name (e.g. GPS)
+    """
+    def __init__(self, **kwargs):
+        super().__init__(choices = Constellation.choices, **kwargs)
+
+    def to_internal_value(self, value):
+        if isinstance(value, str) and value.upper() in Constellation.names:
+            return Constellation[value.upper()].value
+        return super().to_internal_value(value)
+
+
+class NMEAFilterSerializer(serializers.Serializer):
+    start = EpochDateTimeField(label = "Start time", required = False)
+    end = EpochDateTimeField(label = "End time", required = False)
+    constellation = ConstellationField(label = "Constellation", required = False)
+    svid = serializers.IntegerField(label = "SVID", min_value = 0, required = False)
+    prn = serializers.IntegerField(label = "PRN", min_value = 0, required = False)
+    min_elevation = serializers.FloatField(label = "Minimum elevation", required = False)
+    min_cn0 = serializers.FloatField(label = "Minimum C_N0", required = False)
+    max_rows = serializers.IntegerField(label = "Maximum number of rows", min_value = 1, max_value = NMEA_MAX_ROWS,
+                                        required = False)
\ No newline at end of file
@@ -1,3 +1,143 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 from django.test import TestCase
+from rest_framework.test import APIClient
+from .models import NMEA, Constellation
+from .filters import NMEA_MAX_ROWS
 
 # Create your tests here.
+START = datetime(2021, 4, 27, 10, 0, tzinfo=timezone.utc)
+
+
+def nmea_rows(count, constellation=Constellation.GPS):
+    """
+    Observations one second apart, as sent to the API
+    """
+    return [{"time": (START + timedelta(seconds=i)).isoformat(), "PRN": i % 32 + 1, "C_N0": 30.0 + i % 20,
+             "ConstellationType": int(constellation), "SVID": i % 32 + 1, "Azimuth": float(i % 360),
+             "Elevation": float(i % 90)} for i in range(count)]
+
+
+class NMEAMaxRowsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        response = self.client.post("/NMEA/", nmea_rows(5), format="json")
+        self.assertEqual(response.data["Created"], 5)
+
+    def test_filtered_query_over_max_rows(self):
+        response = self.client.get("/NMEA/", {"constellation": "GPS", "max_rows": 4})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/NMEA/", {"constellation": "GPS", "max_rows": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["NMEA List"]), 5)
+
+    def test_max_rows_cannot_lift_the_cap(self):
+        response = self.client.get("/NMEA/", {"constellation": "GPS", "max_rows": NMEA_MAX_ROWS + 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("max_rows", response.data)
+
+    def test_filtered_export_over_max_rows(self):
+        response = self.client.get("/NMEA/", {"export": "ndjson", "constellation": "GPS", "max_rows": 4})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unfiltered_export_streams(self):
+        # A full dump is not limited, whatever the number of rows
+        with mock.patch("PhoneAPI.views.NMEA_MAX_ROWS", 4):
+            response = self.client.get("/NMEA/", {"export": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 5)
+
+    def test_unfiltered_page_is_not_checked(self):
+        # One page is bounded by ?limit=, whatever the number of rows
+        with mock.patch("PhoneAPI.views.NMEA_MAX_ROWS", 4):
+            response = self.client.get("/NMEA/", {"limit": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["NMEA List"]), 2)
+
+
+class NMEAPostTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_single_observation(self):
+        response = self.client.post("/NMEA/", nmea_rows(1)[0], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(NMEA.objects.count(), 1)
+
+    def test_ndjson_batch(self):
+        body = "\n".join(json.dumps(row) for row in nmea_rows(50)) + "\n\n"
+        response = self.client.post("/NMEA/", body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["Received"], response.data["Created"]), (50, 50))
+        self.assertEqual(NMEA.objects.count(), 50)
+
+    def test_invalid_ndjson_line(self):
+        body = json.dumps(nmea_rows(1)[0]) + "\n{not json\n"
+        response = self.client.post("/NMEA/", body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line 2", response.data["detail"])
+        self.assertEqual(NMEA.objects.count(), 0)
+
+    def test_one_invalid_row_creates_nothing(self):
+        rows = nmea_rows(20)
+        rows[7]["Elevation"] = 120.0
+        rows[12]["ConstellationType"] = "Voyager"
+        response = self.client.post("/NMEA/", rows, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data["Errors"]), [7, 12])
+        self.assertEqual(NMEA.objects.count(), 0)
+
+    def test_epoch_time(self):
+        row = dict(nmea_rows(1)[0], time=START.timestamp(), ConstellationType=int(Constellation.GALILEO))
+        response = self.client.post("/NMEA/", row, format="json")
+        self.assertEqual(response.status_code, 201)
+        observation = NMEA.objects.get()
+        self.assertEqual((observation.time, observation.ConstellationType), (START, Constellation.GALILEO))
+
+
+class NMEAGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        rows = nmea_rows(30) + nmea_rows(10, Constellation.GALILEO)
+        response = self.client.post("/NMEA/", rows, format="json")
+        self.assertEqual(response.data["Created"], 40)
+
+    def test_cursor_pages_cover_every_row(self):
+        ids = []
+        response = self.client.get("/NMEA/", {"limit": 7})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.data["NMEA List"]]
+            if response.data["Next"] is None:
+                break
+            response = self.client.get(response.data["Next"])
+        self.assertEqual(ids, list(NMEA.objects.order_by("id").values_list("id", flat=True)))
+        # The previous page of the last one
+        response = self.client.get(response.data["Previous"])
+        self.assertEqual([row["id"] for row in response.data["NMEA List"]], ids[-12:-5])
+
+    def test_filters(self):
+        response = self.client.get("/NMEA/", {"constellation": "Galileo", "min_elevation": 5})
+        self.assertEqual(len(response.data["NMEA List"]), 5)
+        end = START + timedelta(seconds=9)
+        response = self.client.get("/NMEA/", {"constellation": int(Constellation.GPS), "start": START.timestamp(),
+                                              "end": end.isoformat()})
+        self.assertEqual(len(response.data["NMEA List"]), 10)
+
+    def test_invalid_filter(self):
+        response = self.client.get("/NMEA/", {"constellation": "Voyager"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_exports(self):
+        response = self.client.get("/NMEA/", {"export": "ndjson", "constellation": "Galileo"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 10)
+        self.assertEqual({row["ConstellationType"] for row in rows}, {int(Constellation.GALILEO)})
+        response = self.client.get("/NMEA/", {"export": "csv"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(","), ["id", "time", "PRN", "C_N0", "ConstellationType", "SVID", "Azimuth",
+                                               "Elevation"])
+        self.assertEqual(len(lines), 41)
+        response = self.client.get("/NMEA/", {"export": "xml"})
+        self.assertEqual(response.status_code, 400)
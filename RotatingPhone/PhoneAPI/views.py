@@ -1,15 +1,27 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework import status
+from django.db import transaction
 from .models import *
 from .serializer import *
+from .parsers import NDJSONParser
+from .pagination import IdCursorPagination
+from .export import export_response
+from .filters import filter_nmea, exceeds_max_rows, NMEA_MAX_ROWS
 
 # Create your views here.
 class BookApiView(APIView):
     serializer_class = BookSerializer
     def get(self,request):
-        allBooks=Book.objects.all().values()
-        return Response({"Message": "List of books", "Book List":allBooks})
+        # ?export=ndjson|csv streams the whole table, otherwise one page of ?limit= books after the ?cursor=
+        if "export" in request.query_params:
+            return export_response(Book.objects.all(), request.query_params["export"], "Book")
+        paginator = IdCursorPagination()
+        books = paginator.paginate_queryset(Book.objects.all().values(), request, view=self)
+        return Response({"Message": "List of books", "Book List":books,
+                         "Next": paginator.get_next_link(), "Previous": paginator.get_previous_link()})
 
 
     def post(self,request):
@@ -28,27 +40,43 @@ class BookApiView(APIView):
 
 class NMEAApiView(APIView):
     serializer_class = NMEASerializer
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser]
     def get(self,request):
-        allNMEA = NMEA.objects.all().values()
-        return Response({"Naviagtion Message" : "List of NMEA", "NMEA List": allNMEA})
+        # Observations matching the filters (?start=&end=&constellation=&svid=&prn=&min_elevation=&min_cn0=)
+        filter_obj = NMEAFilterSerializer(data=request.query_params)
+        filter_obj.is_valid(raise_exception=True)
+        filters = filter_obj.validated_data
+        max_rows = filters.pop("max_rows", NMEA_MAX_ROWS)
+        queryset = filter_nmea(NMEA.objects.all(), filters)
+        # A filtered query is checked once, on its export or its first page
+        # (a full export streams in constant memory and an unfiltered page is bounded by ?limit=)
+        if filters and ("export" in request.query_params or "cursor" not in request.query_params) \
+                and exceeds_max_rows(queryset, max_rows):
+            return Response({"Message": f"More than {max_rows} NMEA observations match the request, narrow the filters"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # ?export=ndjson|csv streams all of them, otherwise one page of ?limit= observations after the ?cursor=
+        if "export" in request.query_params:
+            return export_response(queryset, request.query_params["export"], "NMEA")
+        paginator = IdCursorPagination()
+        nmea = paginator.paginate_queryset(queryset.values(), request, view=self)
+        return Response({"Naviagtion Message" : "List of NMEA", "NMEA List": nmea,
+                         "Next": paginator.get_next_link(), "Previous": paginator.get_previous_link()})
     
 
     def post(self,request):
-        print("Request data is: ", request.data)
-        serializer_obj = NMEASerializer(data=request.data)
-        if(serializer_obj.is_valid()):
-            NMEA.objects.create(time=serializer_obj.data.get("time"),
-                                PRN=serializer_obj.data.get("PRN"),
-                                C_N0=serializer_obj.data.get("C_N0"),
-                                ConstellationType=serializer_obj.data.get("ConstellationType"),
-                                SVID=serializer_obj.data.get("SVID"),
-                                Azimuth=serializer_obj.data.get("Azimuth"),
-                                Elevation=serializer_obj.data.get("Elevation"))
-                                
-            nmea = NMEA.objects.all().filter(time=request.data["time"]).values()
-            return Response({"Message": "Navigation Message:", "NMEA": nmea})
-
-
-
+        # A single observation, a JSON array or NDJSON lines of observations, validated and inserted as one batch
+        rows = request.data if isinstance(request.data, list) else [request.data]
+        serializer_obj = NMEASerializer(data=rows, many=True)
+        if not serializer_obj.is_valid():
+            errors = serializer_obj.errors
+            if isinstance(errors, list):
+                # Only the rows with errors, by their index in the batch
+                errors = {index: error for index, error in enumerate(errors) if error}
+            return Response({"Message": "Invalid NMEA observations", "Errors": errors},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-    
\ No newline at end of file
+        with transaction.atomic():
+            created = NMEA.objects.bulk_create([NMEA(**row) for row in serializer_obj.validated_data])
+        return Response({"Message": "NMEA observations added", "Received": len(rows), "Created": len(created)},
+                        status=status.HTTP_201_CREATED)
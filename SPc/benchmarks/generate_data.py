@@ -0,0 +1,168 @@
+import os
+import sys
+import math
+import numpy as np
+from datetime import datetime, timedelta
+
+# Start of the synthetic flights and position of the field
+START_TIME = datetime(2021, 4, 27, 21, 41, 39)
+FIELD_LAT = 33.4733643
+FIELD_LON = -88.7737587
+UTC_OFFSET = -5 # Offset of the GPX times (h), as written by Mission Planner
+
+# Satellites in view of every constellation and the NMEA signal ids reported for them
+CONSTELLATIONS = [
+    ('GP', 12, (1, 6)), # L1C/A, L2C-L
+    ('GL', 8, (1, 3)), # L1C/A, L2C/A
+    ('GA', 8, (7,)), # E1
+    ('GB', 6, (1,)), # B1I
+]
+
+def nmea_checksums(bodies):
+    """
+    XOR checksums of NMEA sentence bodies (the characters between '$' and '*'), computed for all the bodies at once
+    """
+    lengths = np.fromiter((len(body) for body in bodies), dtype=np.int64, count=len(bodies))
+    a = np.frombuffer(''.join(bodies).encode(), dtype=np.uint8)
+    cum_xor = np.bitwise_xor.accumulate(a)
+    ends = np.cumsum(lengths) - 1
+    before = ends - lengths
+    return cum_xor[ends] ^ np.where(before >= 0, cum_xor[np.maximum(before, 0)], 0)
+
+def nmea_coord(value):
+    """
+    Degrees to the ddmm.mmmmm (dddmm.mmmmm) format of the NMEA sentences
+    """
+    value = abs(value)
+    return int(value)*100 + (value - int(value))*60
+
+def new_sky(rng):
+    """
+    Initial elevation, azimuth and motion of the satellites in view of every constellation
+    """
+    sky = []
+    for const, n_sats, signals in CONSTELLATIONS:
+        prns = np.sort(rng.choice(np.arange(1, 33), n_sats, replace=False))
+        if const == 'GL':
+            prns = prns % 24 + 65 # GLONASS slots are reported as 65-88
+        sky.append({
+            'const': const,
+            'signals': signals,
+            'prn': prns,
+            'el': rng.uniform(5, 85, n_sats),
+            'az': rng.uniform(0, 360, n_sats),
+            'd_el': rng.uniform(-0.004, 0.004, n_sats), # deg/s
+            'd_az': rng.uniform(-0.008, 0.008, n_sats),
+            'cno': rng.integers(15, 45, n_sats),
+        })
+    return sky
+
+def epoch_bodies(t, dt, sky, rng, lat, lon, alt):
+    """
+    NMEA sentence bodies (RMC, GGA and GSV of every constellation and signal) of one epoch
+    """
+    hms = dt.strftime('%H%M%S')
+    bodies = [
+        f"GNRMC,{hms}.00,A,{lat:010.5f},N,{lon:011.5f},W,0.101,,{dt.strftime('%d%m%y')},,,A,V",
+        f"GNGGA,{hms}.00,{lat:010.5f},N,{lon:011.5f},W,1,{sum(len(s['prn']) for s in sky)},1.36,{alt:.1f},M,-29.5,M,,",
+    ]
+    for s in sky:
+        el = np.clip(s['el'] + s['d_el']*t, 0, 90).round().astype(int)
+        az = ((s['az'] + s['d_az']*t) % 360).round().astype(int) % 360
+        n_sats = len(s['prn'])
+        n_msgs = math.ceil(n_sats/4)
+        for signal in s['signals']:
+            cno = np.clip(s['cno'] + rng.integers(-3, 4, n_sats), 10, 50)
+            for k in range(n_msgs):
+                svs = ''.join(f",{s['prn'][i]:02d},{el[i]:02d},{az[i]:03d},{cno[i]:02d}"
+                              for i in range(4*k, min(4*k + 4, n_sats)))
+                bodies.append(f"{s['const']}GSV,{n_msgs},{k + 1},{n_sats:02d}{svs},{signal}")
+    return bodies
+
+def generate_nmea(file_path, n_sentences, seed=0, chunk_sentences=100000):
+    """
+    This function writes a synthetic receiver log with n_sentences NMEA sentences
+    Every second has a GNRMC, a GNGGA and the GSV sentences of GPS, GLONASS, Galileo and BeiDou on
+    one or two signals (about 14 sentences per second). The same seed always gives the same file
+
+    Outputs:
+    n_epochs: Number of seconds of the log
+    """
+    rng = np.random.default_rng(seed)
+    sky = new_sky(rng)
+    written = 0
+    t = 0
+    with open(file_path, 'wb') as f:
+        while written < n_sentences:
+            bodies = []
+            while len(bodies) < chunk_sentences and written + len(bodies) < n_sentences:
+                dt = START_TIME + timedelta(seconds=t)
+                lat = nmea_coord(FIELD_LAT + 2e-5*math.sin(t/60))
+                lon = nmea_coord(FIELD_LON - 2e-5*math.cos(t/60))
+                bodies += epoch_bodies(t, dt, sky, rng, lat, lon, 90 + 5*math.sin(t/90))
+                t += 1
+            bodies = bodies[:n_sentences - written]
+            checksums = nmea_checksums(bodies)
+            f.write(''.join(f"${body}*{cs:02X}\r\n" for body, cs in zip(bodies, checksums)).encode())
+            written += len(bodies)
+    return t
+
+def generate_gpx(file_path, n_epochs, rate=4, seed=0, chunk_points=100000):
+    """
+    This function writes a synthetic flight log of n_epochs seconds with rate trackpoints per second
+    The aircraft flies an east-west lawnmower pattern over the field at 80 to 120 m
+
+    Outputs:
+    n_points: Number of trackpoints
+    """
+    rng = np.random.default_rng(seed + 1)
+    n_points = n_epochs*rate
+    tz = timedelta(hours=UTC_OFFSET)
+    local_start = START_TIME + tz
+    offset = f"{'-' if UTC_OFFSET < 0 else '+'}{abs(UTC_OFFSET):02d}:00"
+    with open(file_path, 'w') as f:
+        f.write('<gpx creator="Mission Planner" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>')
+        for start in range(0, n_points, chunk_points):
+            i = np.arange(start, min(start + chunk_points, n_points))
+            t = i/rate
+            leg = (t // 120).astype(int) # 120 s legs, alternating direction
+            along = (t % 120)/120
+            along = np.where(leg % 2 == 0, along, 1 - along)
+            lat = FIELD_LAT + 0.0003*(leg % 20)
+            lon = FIELD_LON + 0.002*along
+            ele = 100 + 20*np.sin(t/45) + rng.normal(0, 0.2, len(i))
+            course = np.where(leg % 2 == 0, 90, 270) + rng.normal(0, 1, len(i))
+            roll = rng.normal(0, 1.5, len(i))
+            pitch = rng.normal(0, 1.5, len(i))
+            f.write(''.join(
+                f'<trkpt lat="{lat[k]:.7f}" lon="{lon[k]:.7f}"><ele>{ele[k]:.2f}</ele>'
+                f'<time>{(local_start + timedelta(seconds=int(t[k]))).isoformat()}{offset}</time>'
+                f'<course>{course[k] % 360:.2f}</course><roll>{roll[k]:.2f}</roll><pitch>{pitch[k]:.2f}</pitch><mode /></trkpt>'
+                for k in range(len(i))))
+        f.write('</trkseg></trk></gpx>')
+    return n_points
+
+def generate_flight(out_dir, n_sentences, seed=0, name=None):
+    """
+    This function writes a synthetic flight: <out_dir>/flightlog/<name>.gpx and <out_dir>/ublox/<name>.ubx
+    covering the same period, laid out as data/raw
+
+    Outputs:
+    gpx file, ubx file
+    """
+    name = name or f"synthetic_{n_sentences}"
+    os.makedirs(f"{out_dir}/flightlog", exist_ok=True)
+    os.makedirs(f"{out_dir}/ublox", exist_ok=True)
+    ubx_file = f"{out_dir}/ublox/{name}.ubx"
+    gpx_file = f"{out_dir}/flightlog/{name}.gpx"
+    n_epochs = generate_nmea(ubx_file, n_sentences, seed)
+    generate_gpx(gpx_file, n_epochs, seed=seed)
+    return gpx_file, ubx_file
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python generate_data.py <output_folder> <number of NMEA sentences> [seed]")
+        sys.exit(1)
+    seed = int(sys.argv[3]) if len(sys.argv) == 4 else 0
+    for path in generate_flight(sys.argv[1], int(sys.argv[2]), seed):
+        print(f"Output: {path}")
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..', 'src'))
+
+import numpy as np
+from generate_data import generate_flight
+from functions.NMEA_parser import gps_chksum, gps_chksum_batch
+from functions.geo_calc import get_SP, get_FresnelZones
+from functions.h5_storage import read_table
+from functions.time_join import average_track, join_track
+from functions.metrics import peak_rss_mb
+from process_flightlog import process_flightlog
+from process_ublox_data import process_ublox_data
+from calculate_SP import calculate_SP
+from calculate_FZone_KML import calculate_FZone_KML_all, has_fresnel_zone, FZ_FIELDS
+
+HISTORY_FILE = os.path.join(BENCHMARK_DIR, 'history.jsonl')
+DEFAULT_SCALES = [10000, 100000]
+REGRESSION_THRESHOLD = 0.8 # Throughput below 80% of the previous run of the same benchmark is reported
+FZ_BATCH = 10000 # Rows per call of get_FresnelZones, as in calculate_FZone_KML
+
+# Every stage has a setup (not timed) returning the arguments of the timed run, the run returns the number of items
+def setup_files(files):
+    return files
+
+def run_gps_chksum(files):
+    n = 0
+    with open(files['ubx'], 'r', errors='ignore') as f:
+        for line in f:
+            if '$G' in line and '*' in line:
+                gps_chksum(line[line.find('$G'):line.find('*') + 3])
+                n += 1
+    return n
+
+def setup_bytes(files):
+    with open(files['ubx'], 'rb') as f:
+        return f.read()
+
+def run_gps_chksum_batch(buf):
+    return len(gps_chksum_batch(buf)[0])
+
+def run_process_flightlog(files):
+    process_flightlog(files['gpx'], files['work_dir'])
+    return len(read_table(files['gpx_h5'], columns=['time']))
+
+def run_process_ublox_data(files):
+    process_ublox_data(files['ubx'], '2021-04-27', files['work_dir'])
+    return files['sentences']
+
+def run_calculate_SP(files):
+    calculate_SP(files['gpx_h5'], files['ubx_h5'], files['work_dir'])
+    return len(read_table(files['sp_h5'], columns=['time']))
+
+def setup_get_SP(files):
+    track = average_track(np.floor(read_table(files['gpx_h5'])))
+    ubx_data = read_table(files['ubx_h5'])
+    obs_idx, track_rows = join_track(track, ubx_data['time'])
+    ubx_data = ubx_data[obs_idx]
+    return track_rows[:, 1], track_rows[:, 2], track_rows[:, 3], ubx_data['az'], ubx_data['ele']
+
+def run_get_SP(args):
+    return len(get_SP(*args))
+
+def setup_get_FresnelZone(files):
+    sp_data = read_table(files['sp_h5'], columns=FZ_FIELDS)
+    return sp_data[has_fresnel_zone(sp_data)]
+
+def run_get_FresnelZone(sp_data):
+    for i in range(0, len(sp_data), FZ_BATCH):
+        batch = sp_data[i:i + FZ_BATCH]
+        get_FresnelZones(batch['fl_lat'], batch['fl_lon'], batch['fl_alt'], batch['az'], batch['ele'])
+    return len(sp_data)
+
+def run_kml(files):
+    kml_dir = os.path.join(files['work_dir'], 'kml')
+    os.makedirs(kml_dir, exist_ok=True)
+    calculate_FZone_KML_all(files['sp_h5'], kml_dir)
+    sp_data = read_table(files['sp_h5'], columns=FZ_FIELDS)
+    return int(has_fresnel_zone(sp_data).sum())
+
+# name: (setup, run, unit of the items), in the order they are run
+STAGES = {
+    'gps_chksum': (setup_files, run_gps_chksum, 'sentences'),
+    'gps_chksum_batch': (setup_bytes, run_gps_chksum_batch, 'sentences'),
+    'process_flightlog': (setup_files, run_process_flightlog, 'trackpoints'),
+    'process_ublox_data': (setup_files, run_process_ublox_data, 'sentences'),
+    'calculate_SP': (setup_files, run_calculate_SP, 'observations'),
+    'get_SP': (setup_get_SP, run_get_SP, 'observations'),
+    'get_FresnelZone': (setup_get_FresnelZone, run_get_FresnelZone, 'zones'),
+    'kml': (setup_files, run_kml, 'epochs'),
+}
+
+def run_stage(stage, files):
+    """
+    Run one stage in the current process, returns the run time, the number of items and the peak memory
+    """
+    setup, run, unit = STAGES[stage]
+    args = setup(files)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    items = run(args)
+    seconds = time.perf_counter() - start
+    rss_after = peak_rss_mb()
+    return {'seconds': seconds, 'items': items, 'unit': unit,
+            'peak_rss_mb': round(rss_after, 1), 'stage_rss_mb': round(rss_after - rss_before, 1)}
+
+def benchmark(sentences, work_dir, stages=None, seed=0):
+    """
+    This function generates a synthetic flight with the given number of NMEA sentences and times every stage on it
+    Every stage runs in a new process so its peak memory is measured on its own
+
+    Outputs:
+    results: List of the results of every stage
+    """
+    name = f"synthetic_{sentences}"
+    gpx, ubx = generate_flight(os.path.join(work_dir, 'raw'), sentences, seed, name)
+    files = {'gpx': gpx, 'ubx': ubx, 'work_dir': work_dir, 'sentences': sentences,
+             'gpx_h5': f"{work_dir}/{name}_gpx.h5", 'ubx_h5': f"{work_dir}/{name}_ublox.h5",
+             'sp_h5': f"{work_dir}/{name}_SP.h5"}
+    size_mb = os.path.getsize(ubx)/2**20
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for stage in stages or STAGES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(run_stage, stage, files).result()
+        result.update({'stage': stage, 'sentences': sentences,
+                       'throughput': round(result['items']/result['seconds'], 1),
+                       'seconds': round(result['seconds'], 4)})
+        if stage in ('gps_chksum', 'gps_chksum_batch', 'process_ublox_data'):
+            result['mb_per_s'] = round(size_mb/result['seconds'], 2)
+        results.append(result)
+        print(f"{stage:>20} {sentences:>10} {result['seconds']:>9.3f} s {result['throughput']:>14.1f} {result['unit']}/s "
+              f"{result['peak_rss_mb']:>9.1f} MB")
+    return results
+
+def git_commit():
+    """
+    Commit of the benchmarked code, None outside of a git repository
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def find_regressions(results, history_file=HISTORY_FILE):
+    """
+    Compare the throughput of every benchmark with its last run on the same machine in the history
+    """
+    last = {}
+    if os.path.exists(history_file):
+        with open(history_file) as f:
+            for line in f:
+                run = json.loads(line)
+                if run.get('machine') != platform.node():
+                    continue
+                for result in run['results']:
+                    last[(result['stage'], result['sentences'])] = result['throughput']
+    regressions = []
+    for result in results:
+        previous = last.get((result['stage'], result['sentences']))
+        if previous and result['throughput'] < REGRESSION_THRESHOLD*previous:
+            regressions.append(f"{result['stage']} ({result['sentences']} sentences): "
+                               f"{result['throughput']} {result['unit']}/s, previously {previous}")
+    return regressions
+
+def run_benchmarks(scales=None, stages=None, history_file=HISTORY_FILE, seed=0):
+    """
+    This function runs the benchmarks at every scale (number of NMEA sentences) and appends the results
+    to the history file, one JSON object per run
+
+    Outputs:
+    run: The results and the environment of the run
+    """
+    results = []
+    print(f"{'stage':>20} {'sentences':>10} {'time':>11} {'throughput':>14} {'':>11} {'peak memory':>12}")
+    for sentences in scales or DEFAULT_SCALES:
+        work_dir = tempfile.mkdtemp(prefix='spc_benchmark_')
+        try:
+            results += benchmark(sentences, work_dir, stages, seed)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    run = {'date': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(), 'machine': platform.node(),
+           'python': platform.python_version(), 'numpy': np.__version__, 'cpus': os.cpu_count(), 'seed': seed,
+           'results': results}
+    for regression in find_regressions(results, history_file):
+        print(f"Regression: {regression}")
+    if history_file:
+        with open(history_file, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"Output: {history_file}")
+    return run
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and not all(arg.isdigit() for arg in sys.argv[1:]):
+        print("Usage: python run_benchmarks.py [number of NMEA sentences ...]")
+        sys.exit(1)
+    run_benchmarks([int(arg) for arg in sys.argv[1:]] or None)
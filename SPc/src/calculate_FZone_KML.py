@@ -1,69 +1,180 @@
-from functions.geo_calc import get_FresnelZone
-import simplekml
-import pandas as pd
-import datetime
+from functions.geo_calc import get_FresnelZones
+from functions.kml_writer import open_fz_kml, write_fz_placemarks, close_fz_kml
+import os
+import re
 import sys
 import numpy as np
-import h5py
+from functions.h5_storage import read_table, read_index, read_groups, group_index
+from functions.metrics import stage, step
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-def calculate_FZone_KML(df_loc, sat_prn, band, out_dir):
+# Fields of the SP file identifying a signal, and fields used for the KML
+SAT_KEYS = ['const', 'prn', 'band']
+FZ_FIELDS = ['time', 'fl_lat', 'fl_lon', 'fl_alt', 'ele', 'az', 'SP_lat', 'SP_lon']
+
+def has_fresnel_zone(sp_data):
+    """
+    Rows of a SP array with a Fresnel Zone: the position of the receiver, the elevation, azimuth and SP are known
+    (not nan, e.g. the RXM-RAWX observations and the GSV satellites without elevation have none)
+    and the elevation is not 0
+    """
+    known = np.ones(len(sp_data), dtype=bool)
+    for field in FZ_FIELDS[1:]:
+        known &= np.isfinite(sp_data[field])
+    return known & (sp_data['ele'] != 0)
+
+def parse_sat(sat_prn, band):
+    """
+    This function gets the constellation, PRN and band as stored in the SP file
+    e.g. ('GP02', 'L2') -> (b'GP', 2, b'L2')
+    A PRN given as a number (12 or '12') matches the satellites of every constellation (constellation None)
+    """
+    if isinstance(sat_prn, str) and not sat_prn.strip().isdigit():
+        const, prn = sat_prn.strip()[:2].upper().encode(), int(sat_prn.strip()[2:])
+    else:
+        const, prn = None, int(sat_prn)
+    if isinstance(band, str):
+        band = band.strip().encode()
+    return const, prn, band[:2] # Bands are stored with 2 characters
+
+def calculate_FZone_KML(df_loc, sat_prn, band, out_dir, batch_size=10000, kmz=False, dem=None):
     """
     This function calculates the Fresnel Zone of a satellite signal
     Inputs:
-    sp_df: DataFrame containing the SP of the satellite signals
-    sat_name: Name of the satellite
+    df_loc: Location of the SP file
+    sat_prn: Satellite, e.g. GP02, or PRN of the satellite
+    band: Band of the signal, e.g. L2
+    out_dir: Output folder
+    batch_size: Number of epochs calculated and written at a time
+    kmz: True to write a compressed .kmz file instead of a .kml file
+    dem: Folder of a DEM tile set (see functions.dem), None for a flat ground
 
     Outputs:
     KML file containing SP and FZ of the satellite signals
     """
-    # sp_df = pd.read_csv(df_loc)
-    sp_df = pd.DataFrame(np.array(h5py.File(df_loc)[df_loc.split('/')[-1][:-3]]))
-    # print(sp_df.columns)
-    # print(sp_df.head())
-    new_df = sp_df[(sp_df['prn'] == sat_prn)].reset_index(drop=True)
-    # print(len(new_df))
-    new_df = sp_df[(sp_df['prn'] == sat_prn) & (sp_df['band'] == band)].reset_index(drop=True)
-    # print(len(new_df))
-
-    kml = simplekml.Kml()
-    for i, row in new_df.iterrows():
-        lat = float(row['fl_lat'])
-        lon = float(row['fl_lon'])
-        alt = float(row['fl_alt'])
-
-        el = row['el']
-        az = row['az']
-
-        if not el:
+    # Read only the rows of the signal, using the index of the SP file
+    const, prn, band = parse_sat(sat_prn, band)
+    new_df = read_groups(df_loc, columns=FZ_FIELDS, const=const, prn=prn, band=band)
+    new_df = new_df[np.argsort(new_df['time'], kind='stable')]
+
+    # Signals without elevation or SP have no Fresnel Zone
+    new_df = new_df[has_fresnel_zone(new_df)]
+
+    output_file = f"{out_dir}/{df_loc.split('/')[-1][:-3]}_FZ.{'kmz' if kmz else 'kml'}"
+    write_FZone_KML(new_df, output_file, batch_size, dem=dem)
+
+def write_FZone_KML(sp_data, output_file, batch_size=10000, **fz_params):
+    """
+    This function calculates the Fresnel Zones of the rows of a SP array and writes them to a KML (or .kmz) file
+    The rows are processed in batches of batch_size epochs, the rows without Fresnel Zone (see has_fresnel_zone)
+    are skipped
+    fz_params (n, hgrnd, freq, dem) are passed to get_FresnelZones
+    """
+    sp_data = sp_data[has_fresnel_zone(sp_data)]
+    with stage('write_FZone_KML', file=output_file) as m:
+        writer = open_fz_kml(output_file)
+        for i in range(0, len(sp_data), batch_size):
+            batch = sp_data[i:i + batch_size]
+            with step(m, 'fresnel'):
+                lla_FZ = get_FresnelZones(batch['fl_lat'], batch['fl_lon'], batch['fl_alt'], batch['az'], batch['ele'],
+                                          **fz_params)
+            with step(m, 'kml'):
+                write_fz_placemarks(writer, batch['time'], batch['SP_lat'], batch['SP_lon'], lla_FZ[:, :, 0],
+                                    lla_FZ[:, :, 1])
+        with step(m, 'kml'):
+            close_fz_kml(writer)
+        m['rows_out'] = len(sp_data)
+    print(f"KML file saved: {output_file}")
+
+def calculate_FZone_KML_all(df_loc, out_dir, workers=1, batch_size=10000, kmz=False, dem=None):
+    """
+    This function writes one KML file per signal (constellation, PRN and band) of a SP file
+    The SP file is read once, and with workers > 1 the KML files are written by a pool of processes
+    Inputs:
+    df_loc: Location of the SP file
+    out_dir: Output folder
+    workers: Number of processes
+    batch_size: Number of epochs calculated and written at a time
+    kmz: True to write compressed .kmz files instead of .kml files
+    dem: Folder of a DEM tile set (see functions.dem), None for a flat ground
+
+    Outputs:
+    KML files <name>_<const><prn>_<band>_FZ.kml, e.g. sample_SP_GP12_L2_FZ.kml
+    Returns the locations of the KML files
+    """
+    index = read_index(df_loc)
+    if index is not None:
+        sp_data = read_table(df_loc, columns=FZ_FIELDS)
+    else: # SP files without index, group the rows here
+        sp_data = read_table(df_loc, columns=SAT_KEYS + FZ_FIELDS)
+        sp_data = sp_data[np.lexsort([sp_data[key] for key in reversed(SAT_KEYS + ['time'])])]
+        index = group_index(sp_data, SAT_KEYS)
+
+    return fan_out_FZone_KML(sp_data, index, df_loc.split('/')[-1][:-3], out_dir, workers, batch_size, kmz,
+                             dem=dem)
+
+def fan_out_FZone_KML(sp_data, index, name, out_dir, workers=1, batch_size=10000, kmz=False, **fz_params):
+    """
+    This function writes one KML file per group of rows of a SP array
+    Inputs:
+    sp_data: SP array sorted by signal
+    index: Rows start:stop and const, prn, band of every signal (see functions.h5_storage.group_index)
+    name: Name of the SP file, used as prefix of the KML files
+    out_dir, workers, batch_size, kmz: See calculate_FZone_KML_all
+    fz_params: n, hgrnd, freq, dem passed to get_FresnelZones
+
+    Outputs:
+    output_files: Locations of the KML files
+    """
+    jobs = []
+    for group in index:
+        rows = sp_data[group['start']:group['stop']]
+        rows = rows[has_fresnel_zone(rows)] # Signals without elevation or SP have no Fresnel Zone
+        if len(rows) == 0:
             continue
-        el = float(el)
-        az = float(az)
-        lla_FZ = get_FresnelZone(lat, lon, alt, az, el)
-
-        time = datetime.datetime.strptime(row['time'], '%Y-%m-%d %H:%M:%S')
-        SP_lat = row['SP_lat']
-        SP_lon = row['SP_lon']
-        FZ_lats = lla_FZ[0]
-        FZ_lons = lla_FZ[1]
-        
-        time_plus1 = time + datetime.timedelta(seconds=1)
-        polygon_coords = list(zip(FZ_lons, FZ_lats))
-
-        pol = kml.newpolygon()
-        pol.outerboundaryis = polygon_coords
-        pol.timespan.begin = time.strftime('%Y-%m-%dT%H:%M:%S')
-        pol.timespan.end = time_plus1.strftime('%Y-%m-%dT%H:%M:%S')
-
-        point = kml.newpoint()
-        point.coords = [(SP_lon, SP_lat)]
-        point.timespan.begin = time.strftime('%Y-%m-%dT%H:%M:%S')
-        point.timespan.end = time_plus1.strftime('%Y-%m-%dT%H:%M:%S')
-
-    kml.save(f"{out_dir}/{df_loc.split('/')[-1][:-4]}_FZ.kml")
-    print(f"KML file saved: {out_dir}/{df_loc.split('/')[-1][:-4]}_FZ.kml")
+        sat = f"{group['const'].decode()}{group['prn']:02d}_{group['band'].decode()}"
+        jobs.append((rows, f"{out_dir}/{name}_{sat}_FZ.{'kmz' if kmz else 'kml'}"))
+
+    write = partial(write_FZone_KML, batch_size=batch_size, **fz_params)
+    with stage('fan_out_FZone_KML', name=name, workers=workers) as m:
+        m['rows_out'] = sum(len(rows) for rows, _ in jobs)
+        m['files'] = len(jobs)
+        if workers > 1 and jobs:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(write, *zip(*jobs)))
+        else:
+            for rows, output_file in jobs:
+                write(rows, output_file)
+    return [output_file for _, output_file in jobs]
+
+def remove_stale_KML(out_dir, name, output_files):
+    """
+    This function removes the KML (and .kmz) files of a SP file written by an earlier run that are not in
+    output_files, e.g. the files of the signals that are no longer in the SP file
+    Inputs:
+    out_dir: Output folder
+    name: Name of the SP file, prefix of the KML files (see fan_out_FZone_KML)
+    output_files: Locations of the KML files of the current run
+
+    Outputs:
+    Locations of the removed files
+    """
+    current = {os.path.normpath(output_file) for output_file in output_files}
+    pattern = re.compile(rf"{re.escape(name)}_[A-Za-z]{{2}}\d+_[^_]+_FZ\.km[lz]")
+    removed = []
+    for file_name in os.listdir(out_dir):
+        path = os.path.normpath(os.path.join(out_dir, file_name))
+        if pattern.fullmatch(file_name) and path not in current:
+            os.remove(path)
+            removed.append(path)
+    return removed
 
 if __name__ == "__main__":
-    if len(sys.argv) != 5:
-        print("Usage: python calculate_FZone.py <SP_df_loc> <sat_prn> <band> <output_folder>")
+    if len(sys.argv) not in (5, 6):
+        print("Usage: python calculate_FZone.py <SP_df_loc> <sat_prn|all> <band|all> <output_folder> [number of processes]")
         sys.exit(1)
-    calculate_FZone_KML(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
+    if sys.argv[2] == 'all' and sys.argv[3] == 'all':
+        calculate_FZone_KML_all(sys.argv[1], sys.argv[4], workers=int(sys.argv[5]) if len(sys.argv) == 6 else 1)
+    else:
+        calculate_FZone_KML(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
@@ -1,78 +1,140 @@
-import pandas as pd
 import sys
 import numpy as np
-import h5py
 from functions.geo_calc import get_SP
+from functions.h5_storage import read_table, write_table
+from functions.time_join import average_track, join_track
+from functions.metrics import stage, step
+from functions.spatial_index import write_spatial_index
 
-def calculate_SP(track_df_loc, ubx_data_loc, out_dir):
+# Fields of the SP file
+SP_DTYPE = np.dtype([
+    ('time', 'i8'),
+    ('fl_lat', 'f8'),
+    ('fl_lon', 'f8'),
+    ('fl_alt', 'f8'),
+    ('course', 'f8'),
+    ('roll', 'f8'),
+    ('pitch', 'f8'),
+    ('lat', 'f8'),
+    ('lon', 'f8'),
+    ('const', 'S2'),
+    ('prn', 'i8'),
+    ('band', 'S2'),
+    ('ele', 'f8'),
+    ('az', 'f8'),
+    ('C_N0', 'i8'),
+    ('SP_lat', 'f8'),
+    ('SP_lon', 'f8')
+])
+TRACK_FIELDS = ['time', 'fl_lat', 'fl_lon', 'fl_alt', 'course', 'roll', 'pitch']
+SP_INDEX_KEYS = ['const', 'prn', 'band'] # Signals listed in the index of the SP file
+SP_SORT_KEYS = SP_INDEX_KEYS + ['time']
+
+def compute_SP(track, ubx_data, method='exact', tolerance=0.0, hgrnd=80, metrics=None, dem=None):
     """
-    SP_from_flight_logs_and_ubx
-    This function calculates the Specular Point (SP) of a satellite signal
+    This function calculates the Specular Point (SP) of the satellite signals from arrays in memory
     Inputs:
-    track_df: DataFrame containing the flight logs
-    ubx_data: List of dictionaries containing the UBX data
+    track: (N, 7) flight log array (see process_flightlog)
+    ubx_data: UBX observations (see process_ublox_data)
+    method: How the observations are matched with the flight log (see functions.time_join.join_track)
+            'exact' matches the observations with the mean of the trackpoints of the same second
+            (the trackpoint times are rounded to the nearest second, like the former gpx output)
+    tolerance: Largest time difference (s) between an observation and the trackpoints it is matched with
+    hgrnd: Height of the ground above the sea level
+    dem: Folder of a DEM tile set (see functions.dem), None for a flat ground at hgrnd
+    metrics: Record of the stage (see functions.metrics.stage) the time of the sub-steps is added to
 
     outputs:
-    sp_df: DataFrame containing the SP of the satellite signals
+    struct_arr: SP of the satellite signals (SP_DTYPE), sorted by const, prn, band and time
     """
-    print(f"reading files: \n{track_df_loc}, \n{ubx_data_loc}")
-    # track_df = pd.read_csv(track_df_loc)
+    m = metrics or {}
+    with step(m, 'average'):
+        track = np.array(track, dtype=np.float64)
+        if method == 'exact': # Average the trackpoints of every second, the times are rounded to the nearest second
+            track[:, 0] = np.round(track[:, 0])
+        track = average_track(track)
 
-    track_df = pd.DataFrame(np.array(h5py.File(track_df_loc)[track_df_loc.split('/')[-1][:-3]]))
-    track_df.columns = ['time', 'fl_lat', 'fl_lon', 'fl_alt', 'course', 'roll', 'pitch']  # Rename the columns
-    # track_df['time'] = pd.to_datetime(track_df['time'])
+    with step(m, 'join'):
+        obs_idx, track_rows = join_track(track, ubx_data['time'], method=method, tolerance=tolerance)
+        ubx_data = ubx_data[obs_idx]
 
-    track_df = track_df.groupby('time', as_index=False).mean()
-    # print(track_df)
+    struct_arr = np.empty(len(ubx_data), dtype=SP_DTYPE)
+    for i, name in enumerate(TRACK_FIELDS):
+        struct_arr[name] = track_rows[:, i]
+    # The UBX columns are taken in order: time, lat, lon, const, prn, band, ele, az, C_N0
+    for name, ubx_name in zip(SP_DTYPE.names[7:15], ubx_data.dtype.names[1:]):
+        struct_arr[name] = ubx_data[ubx_name]
+    struct_arr['time'] = ubx_data[ubx_data.dtype.names[0]]
+
+    with step(m, 'get_SP'):
+        SPs = get_SP(struct_arr['fl_lat'], struct_arr['fl_lon'], struct_arr['fl_alt'], struct_arr['az'],
+                     struct_arr['ele'], hgrnd=hgrnd, dem=dem)
+        struct_arr['SP_lat'] = SPs[:,0]
+        struct_arr['SP_lon'] = SPs[:,1]
+
+    # Sort the signals by satellite and band
+    with step(m, 'sort'):
+        return struct_arr[np.lexsort([struct_arr[key] for key in reversed(SP_SORT_KEYS)])]
+
+def write_SP(struct_arr, file_path, name, compression='gzip'):
+    """
+    This function writes the SP array to a HDF5 file, the rows start:stop of every signal are listed in the dataset <name>_index
+    The runs of rows in the same area are listed in the dataset <name>_spatial (see functions.spatial_index and query_SP)
+    """
+    write_table(file_path, name, struct_arr, SP_DTYPE.names, index_keys=SP_INDEX_KEYS, compression=compression)
+    write_spatial_index(file_path, name, data=struct_arr)
 
-    # ubx_data = pd.read_csv(ubx_data_loc)
-    # ubx_data['datetime'] = pd.to_datetime(ubx_data['datetime'])
-    ubx_data = pd.DataFrame(np.array(h5py.File(ubx_data_loc)[ubx_data_loc.split('/')[-1][:-3]]))
-    ubx_data.columns = ['time', 'lat', 'lon', 'const', 'prn', 'band', 'ele', 'az', 'C_N0']  # Rename the columns
-    
-    merged_df = pd.merge(track_df, ubx_data, on = 'time', how='inner') 
-    SPs = get_SP(merged_df['fl_lat'], merged_df['fl_lon'], merged_df['fl_alt'], merged_df['az'], merged_df['ele'])
-    merged_df['SP_lat'] = SPs[:,0]
-    merged_df['SP_lon'] = SPs[:,1]
-    merged_df['time'] = merged_df['time'].astype('int64') 
+def calculate_SP(track_df_loc, ubx_data_loc, out_dir, method='exact', tolerance=0.0, compression='gzip', hgrnd=80,
+                 dem=None):
+    """
+    SP_from_flight_logs_and_ubx
+    This function calculates the Specular Point (SP) of a satellite signal
+    Inputs:
+    track_df: Location of the processed flight log
+    ubx_data: Location of the processed UBX data
+    out_dir: Output folder
+    method: How the observations are matched with the flight log (see functions.time_join.join_track)
+            'exact' matches the observations with the mean of the trackpoints of the same second
+            (the trackpoint times are rounded to the nearest second, like the former gpx output)
+    tolerance: Largest time difference (s) between an observation and the trackpoints it is matched with
+    compression: Compression of the output ('gzip', 'lzf' or None)
+    hgrnd: Height of the ground above the sea level
+    dem: Folder of a DEM tile set (see functions.dem), None for a flat ground at hgrnd
 
-    dtype = np.dtype([
-        ('time', 'i8'),
-        ('fl_lat', 'f8'),
-        ('fl_lon', 'f8'),
-        ('fl_alt', 'f8'),
-        ('course', 'f8'),
-        ('roll', 'f8'),
-        ('pitch', 'f8'),
-        ('lat', 'f8'),
-        ('lon', 'f8'),
-        ('const', 'S2'),
-        ('prn', 'i8'),
-        ('band', 'S2'),
-        ('ele', 'f8'),
-        ('az', 'f8'),
-        ('C_N0', 'i8'),
-        ('SP_lat', 'f8'),
-        ('SP_lon', 'f8')
-    ])
-    struct_arr = np.array(list(merged_df.to_records(index=False)), dtype=dtype)
-    # print(merged_df.head())
+    outputs:
+    SP file with the SP of the satellite signals, sorted by const, prn, band and time
+    The rows start:stop of every signal are listed in the dataset <name>_index
+    """
+    print(f"reading files: \n{track_df_loc}, \n{ubx_data_loc}")
 
+    with stage('calculate_SP', file=track_df_loc, method=method) as m:
+        with step(m, 'read'):
+            track = read_table(track_df_loc)
+            ubx_data = read_table(ubx_data_loc)
+        m['rows_in'] = len(ubx_data)
+        struct_arr = compute_SP(track, ubx_data, method=method, tolerance=tolerance, hgrnd=hgrnd, metrics=m,
+                                dem=dem)
+        m['rows_out'] = len(struct_arr)
+        m['unmatched'] = len(ubx_data) - len(struct_arr)
 
-    with h5py.File(f"{out_dir}/{track_df_loc.split('/')[-1].split('.')[0][:-4]}_SP.h5", 'w') as f:
-        dset = f.create_dataset(f"{track_df_loc.split('/')[-1].split('.')[0][:-4]}_SP", data=struct_arr)
-    print(f"Output: {out_dir}/{track_df_loc.split('/')[-1].split('.')[0][:-4]}_SP.h5")
+        name = f"{track_df_loc.split('/')[-1].split('.')[0][:-4]}_SP"
+        with step(m, 'write'):
+            write_SP(struct_arr, f"{out_dir}/{name}.h5", name, compression=compression)
+    print(f"Output: {out_dir}/{name}.h5")
 
 if __name__ == "__main__":
     # Check if the correct number of arguments is provided
-    if len(sys.argv) != 4:
-        print("Usage: python calculate_SP.py <processed_gpx_file_location> <processed_ublox_file_location>")
+    if len(sys.argv) not in (4, 5, 6, 7):
+        print("Usage: python calculate_SP.py <processed_gpx_file_location> <processed_ublox_file_location> <output_folder_location> [exact|nearest|asof|interp] [tolerance (s)] [DEM folder]")
         sys.exit(1)
 
     # Get the file location from the command line argument
     flight_file_location = sys.argv[1]
     ubx_file_location = sys.argv[2]
     out_dir = sys.argv[3]
+    method = sys.argv[4] if len(sys.argv) > 4 else 'exact'
+    tolerance = float(sys.argv[5]) if len(sys.argv) > 5 else 0.0
+    dem = sys.argv[6] if len(sys.argv) > 6 else None
 
     # Create the file
-    calculate_SP(flight_file_location, ubx_file_location, out_dir)
\ No newline at end of file
+    calculate_SP(flight_file_location, ubx_file_location, out_dir, method=method, tolerance=tolerance, dem=dem)
\ No newline at end of file
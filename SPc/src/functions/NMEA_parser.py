@@ -1,5 +1,6 @@
 import re
 from datetime import datetime
+import numpy as np
 
 def gps_chksum(rawGPS):
     """Calculate the checksum of a GPS string and compare it to the provided checksum.
@@ -42,6 +43,74 @@ def gps_chksum(rawGPS):
     else:
         return None, False
 
+# Value of each byte as a hexadecimal digit, -1 for the bytes that are not hexadecimal digits
+_HEX_VALUE = np.full(256, -1, dtype=np.int16)
+for _i, _c in enumerate(b'0123456789ABCDEF'):
+    _HEX_VALUE[_c] = _i
+    _HEX_VALUE[ord(chr(_c).lower())] = _i
+
+def gps_chksum_batch(buf):
+    """Validate the checksum of every NMEA sentence of a buffer at once.
+    The buffer is split in lines at each new line character. In every line the sentence starts at the
+    first '$G' and ends with the two characters following the first '*', which is the same trimming
+    process_ublox_data applies before calling gps_chksum.
+    The delimiters are located with numpy and the checksums are obtained from a cumulative XOR of the
+    whole buffer, the XOR of a message being the difference of two values of the cumulative XOR.
+
+    For ASCII sentences the result is the same as gps_chksum(sentence) for every sentence.
+    Sentences containing non-ASCII bytes are reported as invalid (NMEA sentences are ASCII only).
+
+    Args:
+        buf (bytes, bytearray or numpy.ndarray of uint8): Buffer containing the NMEA sentences
+    returns:
+        numpy.ndarray (bool): True for the sentences whose checksum matches the provided checksum
+        numpy.ndarray (int): Offset of the '$' starting each sentence
+        numpy.ndarray (int): Offset following the last checksum character of each sentence
+
+    Only the lines containing both '$G' and '*' are reported.
+
+    Example:
+    >>> gps_chksum_batch(b"$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n")
+    (array([ True]), array([0]), array([65]))
+    """
+    a = np.frombuffer(buf, dtype=np.uint8)
+    n = len(a)
+
+    # Start and end (new line character excluded) of every line
+    new_lines = np.flatnonzero(a == ord('\n'))
+    line_start = np.concatenate(([0], new_lines + 1))
+    line_end = np.concatenate((new_lines, [n]))
+
+    # First '$G' and first '*' of every line
+    dollars = np.flatnonzero((a[:-1] == ord('$')) & (a[1:] == ord('G')))
+    stars = np.flatnonzero(a == ord('*'))
+    i_dollar = np.searchsorted(dollars, line_start)
+    i_star = np.searchsorted(stars, line_start)
+    k1 = np.append(dollars, n)[i_dollar]
+    k2 = np.append(stars, n)[i_star]
+    found = (k1 < line_end) & (k2 < line_end) & (k2 > k1)
+    k1 = k1[found]
+    k2 = k2[found]
+    line_end = line_end[found]
+    ends = np.minimum(k2 + 3, line_end)
+
+    # XOR of the message between '$' and '*'
+    xor = np.bitwise_xor.accumulate(a)
+    chksm = xor[k2 - 1] ^ xor[k1]
+
+    # Provided checksum, both characters have to be hexadecimal digits before the end of the line
+    complete = k2 + 2 < line_end
+    hi = _HEX_VALUE[a[np.minimum(k2 + 1, n - 1)]]
+    lo = _HEX_VALUE[a[np.minimum(k2 + 2, n - 1)]]
+    passed = complete & (hi >= 0) & (lo >= 0) & (hi * 16 + lo == chksm)
+
+    # Sentences with non-ASCII bytes are rejected
+    non_ascii = np.flatnonzero(a >= 0x80)
+    if len(non_ascii):
+        passed &= np.searchsorted(non_ascii, k1) == np.searchsorted(non_ascii, ends)
+
+    return passed, k1, ends
+
 def extract_GNRMC(msg):
     """
     Extract the time, latitude and longitude from a GNRMC message
@@ -0,0 +1,246 @@
+import struct
+import numpy as np
+from datetime import datetime, timedelta
+
+# UBX frame: 0xB5 0x62 <class> <id> <length (2 bytes)> <payload> <CK_A> <CK_B>
+UBX_SYNC = b'\xb5\x62'
+UBX_HEADER_LEN = 6
+UBX_CHKSUM_LEN = 2
+
+UBX_NAV_PVT = (0x01, 0x07)
+UBX_NAV_SAT = (0x01, 0x35)
+UBX_RXM_RAWX = (0x02, 0x15)
+
+GPS_EPOCH = datetime(1980, 1, 6)
+
+
+def ubx_chksum(frame):
+    r"""Calculate the 8-bit Fletcher checksum of a UBX frame.
+    The checksum is calculated over the class, id, length and payload of the frame, i.e. everything
+    between the sync characters and the checksum itself.
+
+    Args:
+        frame (bytes or memoryview): The bytes covered by the checksum
+    returns:
+        int: CK_A
+        int: CK_B
+
+    Example:
+    >>> ubx_chksum(b'\x05\x01\x02\x00\x06\x8b')
+    (153, 194)
+    """
+    b = np.frombuffer(frame, dtype=np.uint8).astype(np.int64)
+    n = len(b)
+    ck_a = int(b.sum()) & 0xFF
+    ck_b = int(np.dot(np.arange(n, 0, -1), b)) & 0xFF
+    return ck_a, ck_b
+
+
+def find_ubx_frames(buf, final=True):
+    """Find the valid UBX frames in a buffer.
+    The buffer is scanned for the sync characters 0xB5 0x62, the frame length is read from the header
+    and the Fletcher checksum is verified. The bytes of a valid frame are not scanned again.
+
+    Args:
+        buf (bytes): Buffer possibly mixing UBX frames and NMEA sentences
+        final (bool): False if more data follows the buffer. A frame starting near the end of the buffer
+                      whose length goes past the end of the buffer is then reported as incomplete
+    returns:
+        list: (start, end, class, id) of every valid frame, end is the offset following the checksum
+        int: Offset of the incomplete frame at the end of the buffer, None if there is none
+    """
+    frames = []
+    n = len(buf)
+    mv = memoryview(buf)
+    pos = buf.find(UBX_SYNC)
+    while pos != -1:
+        if pos + UBX_HEADER_LEN > n:
+            if not final:
+                return frames, pos
+            break
+        msg_class, msg_id, length = struct.unpack_from('<BBH', mv, pos + 2)
+        end = pos + UBX_HEADER_LEN + length + UBX_CHKSUM_LEN
+        if end > n:
+            if not final:
+                return frames, pos
+            pos = buf.find(UBX_SYNC, pos + 1)
+            continue
+        if ubx_chksum(mv[pos + 2:end - 2]) == (buf[end - 2], buf[end - 1]):
+            frames.append((pos, end, msg_class, msg_id))
+            pos = buf.find(UBX_SYNC, end)
+        else:
+            pos = buf.find(UBX_SYNC, pos + 1)
+    return frames, None
+
+
+def extract_NAV_PVT(payload):
+    """
+    Extract the time, latitude, longitude and altitude from a UBX-NAV-PVT message
+
+    Offset  Type  Field
+    0       U4    iTOW, GPS time of week of the navigation epoch (ms)
+    4       U2    year (UTC)
+    6       U1    month
+    7       U1    day
+    8       U1    hour
+    9       U1    min
+    10      U1    sec
+    11      X1    valid (bit 0 validDate, bit 1 validTime)
+    ...
+    20      U1    fixType
+    24      I4    lon (1e-7 deg)
+    28      I4    lat (1e-7 deg)
+    32      I4    height above ellipsoid (mm)
+
+    Returns None if the UTC date and time are not valid or there is no fix
+    """
+    year, month, day, hour, minute, sec, valid = struct.unpack_from('<HBBBBBB', payload, 4)
+    fix_type = payload[20]
+    if (valid & 0x03) != 0x03 or fix_type == 0:
+        return None
+    lon, lat, height = struct.unpack_from('<iii', payload, 24)
+    dt = datetime(year, month, day, hour, minute, sec)
+    return dt, lat*1e-7, lon*1e-7, height*1e-3
+
+
+def extract_NAV_SAT(payload):
+    """
+    Extract the information about the visible satellites from a UBX-NAV-SAT message
+
+    Offset  Type  Field
+    0       U4    iTOW (ms)
+    4       U1    version
+    5       U1    numSvs
+    8 + 12*N      repeated for every SV:
+            U1    gnssId
+            U1    svId
+            U1    cno, carrier to noise ratio (dBHz)
+            I1    elev, elevation (deg), unknown if out of range
+            I2    azim, azimuth (deg)
+            I2    prRes, pseudorange residual (0.1 m)
+            X4    flags
+
+    Returns a list of (gnssId, svId, cno, elevation, azimuth) for the satellites being tracked (cno > 0)
+    Unknown elevation and azimuth are returned as nan
+    """
+    num_svs = payload[5]
+    info = []
+    for gnss_id, sv_id, cno, elev, azim in struct.iter_unpack('<BBBbh6x', payload[8:8 + 12*num_svs]):
+        if cno == 0:
+            continue
+        if -90 <= elev <= 90:
+            info.append((gnss_id, sv_id, cno, elev, azim))
+        else:
+            info.append((gnss_id, sv_id, cno, np.nan, np.nan))
+    return info
+
+
+def extract_RXM_RAWX(payload):
+    """
+    Extract the time and the tracked signals from a UBX-RXM-RAWX message
+
+    Offset  Type  Field
+    0       R8    rcvTow, receiver time of week (s)
+    8       U2    week, GPS week number
+    10      I1    leapS, GPS leap seconds
+    11      U1    numMeas
+    16 + 32*N     repeated for every measurement:
+    20            U1    gnssId
+    21            U1    svId
+    22            U1    sigId
+    26            U1    cno (dBHz)
+
+    Returns the UTC time of the measurements and a list of (gnssId, svId, sigId, cno)
+    """
+    rcv_tow, week, leap_s, num_meas = struct.unpack_from('<dHbB', payload, 0)
+    dt = GPS_EPOCH + timedelta(weeks=week, seconds=int(rcv_tow) - leap_s)
+    info = []
+    for k in range(num_meas):
+        gnss_id, sv_id, sig_id = struct.unpack_from('<BBB', payload, 16 + 32*k + 20)
+        cno = payload[16 + 32*k + 26]
+        info.append((gnss_id, sv_id, sig_id, cno))
+    return dt, info
+
+
+def get_ubx_prn(gnss_id, sv_id):
+    """
+    Get the NMEA talker of the constellation and the NMEA satellite number from the UBX gnssId and svId
+    Returns None for the constellations that are not parsed from the NMEA messages either
+    """
+    match gnss_id:
+        case 0:
+            return "GP", sv_id
+        case 1:
+            return "GP", sv_id - 87 # SBAS, reported in GPGSV as 33-64
+        case 2:
+            return "GA", sv_id
+        case 3:
+            return "GB", sv_id
+        case 6:
+            return "GL", sv_id + 64 # GLONASS slots are reported as 65-96
+        case _:
+            return None
+
+
+def get_ubx_band(gnss_id, sig_id=None):
+    """
+    Get the band of the signal based on the UBX gnssId and sigId
+    Without sigId (UBX-NAV-SAT) the band of the primary signal of the constellation is returned
+    """
+    if sig_id is None:
+        sig_id = 0
+    if gnss_id in (0, 1):
+        match sig_id:
+            case 0:
+                return "L1C/A"
+            case 3:
+                return "L2C-L"
+            case 4:
+                return "L2C-M"
+            case 6:
+                return "L5-I"
+            case 7:
+                return "L5-Q"
+            case _:
+                return "None"
+    elif gnss_id == 2:
+        match sig_id:
+            case 0:
+                return "L1-C"
+            case 1:
+                return "L1-B"
+            case 3:
+                return "E5a-I"
+            case 4:
+                return "E5a-Q"
+            case 5:
+                return "E5b-I"
+            case 6:
+                return "E5b-Q"
+            case _:
+                return "None"
+    elif gnss_id == 3:
+        match sig_id:
+            case 0:
+                return "B1I D1"
+            case 1:
+                return "B1I D2"
+            case 2:
+                return "B2I D1"
+            case 3:
+                return "B2I D2"
+            case 5:
+                return "B1C"
+            case 7:
+                return "B2a"
+            case _:
+                return "None"
+    elif gnss_id == 6:
+        match sig_id:
+            case 0:
+                return "L1OF"
+            case 2:
+                return "L2OF"
+            case _:
+                return "None"
+    return "None"
@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+
+# Description of a tile set, stored next to the tiles
+DEM_META = 'dem.json'
+
+
+def tile_path(dem_dir, row, col):
+    """
+    Location of the tile of a DEM tile set, e.g. <dem_dir>/tile_0003_0012.npy
+    """
+    return f"{dem_dir}/tile_{row:04d}_{col:04d}.npy"
+
+
+def write_dem(dem_dir, heights, north, west, dlat, dlon, tile_size=1024, nodata=None):
+    """
+    This function splits a raster of ground heights into the tiles of a DEM tile set
+
+    Inputs:
+    dem_dir: Output folder
+    heights: (rows, cols) ground height (m) at the nodes of a regular grid, the first row is the northern one
+    north, west: Latitude and longitude of the first node (deg)
+    dlat, dlon: Spacing of the nodes (deg)
+    tile_size: Number of cells per side of a tile, the tiles overlap by one node so any point can be
+               interpolated from a single tile
+    nodata: Value of the missing heights, stored as nan
+
+    Outputs:
+    <dem_dir>/dem.json with the layout and the lowest and highest heights, and one .npy file (float32) per tile
+    """
+    heights = np.asarray(heights)
+    rows, cols = heights.shape
+    tile_rows = max(1, -(-(rows - 1)//tile_size))
+    tile_cols = max(1, -(-(cols - 1)//tile_size))
+    os.makedirs(dem_dir, exist_ok=True)
+    for r in range(tile_rows):
+        for c in range(tile_cols):
+            tile = heights[r*tile_size:(r + 1)*tile_size + 1, c*tile_size:(c + 1)*tile_size + 1].astype(np.float32)
+            if nodata is not None:
+                tile[tile == nodata] = np.nan
+            np.save(tile_path(dem_dir, r, c), tile)
+
+    valid = heights[heights != nodata] if nodata is not None else heights
+    valid = valid.astype(np.float32) # Lowest and highest heights as stored in the tiles
+    meta = {'north': north, 'west': west, 'dlat': dlat, 'dlon': dlon, 'rows': rows, 'cols': cols,
+            'tile_size': tile_size, 'tile_rows': tile_rows, 'tile_cols': tile_cols,
+            'min': float(np.nanmin(valid)), 'max': float(np.nanmax(valid))}
+    with open(f"{dem_dir}/{DEM_META}", 'w') as f:
+        json.dump(meta, f, indent=2)
+    # The DEMs opened before are closed, their tiles may have been rewritten
+    _open_dem.cache_clear()
+
+
+def dem_hash(dem_dir):
+    """
+    This function calculates a fingerprint of a DEM tile set, to be used in cache keys
+
+    Outputs:
+    SHA-256 of the content of dem.json and of the name, size and modification time of every tile,
+    so rewriting a tile changes the hash without reading the tiles
+    """
+    dem_dir = dem_dir.replace('\\', '/').rstrip('/')
+    h = hashlib.sha256()
+    with open(f"{dem_dir}/{DEM_META}", 'rb') as f:
+        meta = f.read()
+    h.update(meta)
+    meta = json.loads(meta)
+    for r in range(meta['tile_rows']):
+        for c in range(meta['tile_cols']):
+            path = tile_path(dem_dir, r, c)
+            info = os.stat(path)
+            h.update(f"{os.path.basename(path)} {info.st_size} {info.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def open_dem(dem_dir, max_tiles=16):
+    """
+    This function opens a DEM tile set written by write_dem
+    The tiles are memory mapped when they are first used, and at most max_tiles tiles are kept open
+    (the least recently used tile is closed first), so a large DEM is never read whole
+    A DEM opened again in the same process reuses the open tiles, unless its dem.json changed since
+    (write_dem always rewrites it)
+
+    Outputs:
+    dem: Dictionary with the folder, the description of the tile set and the open tiles
+    """
+    dem_dir = dem_dir.replace('\\', '/').rstrip('/')
+    info = os.stat(f"{dem_dir}/{DEM_META}")
+    return _open_dem(dem_dir, max_tiles, (info.st_size, info.st_mtime_ns))
+
+
+@lru_cache(maxsize=8)
+def _open_dem(dem_dir, max_tiles, stamp):
+    """
+    Open DEMs, cached by folder and by size and modification time of dem.json (stamp)
+    """
+    with open(f"{dem_dir}/{DEM_META}") as f:
+        meta = json.load(f)
+    return {'dir': dem_dir, 'meta': meta, 'tiles': OrderedDict(), 'max_tiles': max_tiles}
+
+
+def load_tile(dem, row, col):
+    """
+    Memory mapped tile of a DEM, the least recently used tile is closed when too many tiles are open
+    """
+    tiles = dem['tiles']
+    key = (row, col)
+    if key in tiles:
+        tiles.move_to_end(key)
+        return tiles[key]
+    tile = np.load(tile_path(dem['dir'], row, col), mmap_mode='r')
+    tiles[key] = tile
+    if len(tiles) > dem['max_tiles']:
+        tiles.popitem(last=False)
+    return tile
+
+
+def dem_height(dem, lat, lon):
+    """
+    This function interpolates the ground height of a DEM at many points
+    The points are grouped by tile, so every tile is looked up once per call
+
+    Inputs:
+    dem: DEM opened with open_dem, or the folder of the tile set
+    lat, lon: Coordinates of the points (deg)
+
+    Outputs:
+    height: Bilinear interpolation of the ground height (m), nan outside of the DEM or where a height is missing
+    """
+    if isinstance(dem, str):
+        dem = open_dem(dem)
+    meta = dem['meta']
+    lat = np.asarray(lat, dtype=np.float64).reshape(-1)
+    lon = np.asarray(lon, dtype=np.float64).reshape(-1)
+    height = np.full(len(lat), np.nan)
+
+    # Position of the points in nodes of the grid
+    fi = (meta['north'] - lat)/meta['dlat']
+    fj = (lon - meta['west'])/meta['dlon']
+    inside = (fi >= 0) & (fi <= meta['rows'] - 1) & (fj >= 0) & (fj <= meta['cols'] - 1)
+    inside &= np.isfinite(fi) & np.isfinite(fj)
+    idx = np.flatnonzero(inside)
+    if len(idx) == 0:
+        return height
+
+    T = meta['tile_size']
+    fi, fj = fi[idx], fj[idx]
+    tile_r = np.minimum((fi//T).astype(np.int64), meta['tile_rows'] - 1)
+    tile_c = np.minimum((fj//T).astype(np.int64), meta['tile_cols'] - 1)
+    tile_id = tile_r*meta['tile_cols'] + tile_c
+    order = np.argsort(tile_id, kind='stable')
+    starts = np.flatnonzero(np.diff(tile_id[order], prepend=-1))
+    stops = np.append(starts[1:], len(order))
+
+    for start, stop in zip(starts, stops):
+        rows = order[start:stop]
+        r, c = tile_r[rows[0]], tile_c[rows[0]]
+        tile = load_tile(dem, r, c)
+        li = fi[rows] - r*T
+        lj = fj[rows] - c*T
+        i0 = np.clip(np.floor(li).astype(np.int64), 0, max(tile.shape[0] - 2, 0))
+        j0 = np.clip(np.floor(lj).astype(np.int64), 0, max(tile.shape[1] - 2, 0))
+        i1 = np.minimum(i0 + 1, tile.shape[0] - 1)
+        j1 = np.minimum(j0 + 1, tile.shape[1] - 1)
+        wi = li - i0
+        wj = lj - j0
+        height[idx[rows]] = ((1 - wi)*(1 - wj)*tile[i0, j0] + (1 - wi)*wj*tile[i0, j1]
+                             + wi*(1 - wj)*tile[i1, j0] + wi*wj*tile[i1, j1])
+    return height
@@ -1,11 +1,73 @@
 import numpy as np
 import pandas as pd
-import navpy
-from datetime import timedelta
-import simplekml
+import calendar
+from functions.kml_writer import open_fz_kml, write_fz_placemarks, close_fz_kml
+from functions.dem import open_dem, dem_height
 
 
-def get_SP(lat, lon, alt, Az, El, hgrnd=80):
+# WGS84 ellipsoid
+WGS84_A = 6378137.0 # Semi major axis (m)
+WGS84_E2 = 0.00669437999014 # Eccentricity squared
+
+
+def ned2lla_batch(ned, lat_ref, lon_ref, alt_ref, dtype=np.float64):
+    """
+    This function converts NED coordinates to Latitude, Longitude, Altitude with a different
+    NED origin for every row, in one pass over the arrays (same result as navpy.ned2lla row by row)
+    Inputs:
+    ned: (N, 3) North, East, Down coordinates (m)
+    lat_ref: Latitude of the NED origin of every row (deg)
+    lon_ref: Longitude of the NED origin of every row (deg)
+    alt_ref: Altitude of the NED origin of every row (m)
+    dtype: Floating point type of the NED rotation, float32 halves the memory of the intermediate arrays.
+           The ECEF position and the latitude iteration are always in float64, float32 cannot resolve
+           ECEF coordinates (~6.4e6 m) below 0.5 m
+
+    Outputs:
+    lla: (N, 3) Latitude, Longitude, Altitude
+    """
+    ned = np.asarray(ned, dtype=dtype).reshape(-1, 3)
+    lat = np.radians(np.asarray(lat_ref, dtype=np.float64).reshape(-1))
+    lon = np.radians(np.asarray(lon_ref, dtype=np.float64).reshape(-1))
+    alt = np.asarray(alt_ref, dtype=np.float64).reshape(-1)
+
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    sin_lon = np.sin(lon)
+    cos_lon = np.cos(lon)
+
+    # ECEF position of the NED origins
+    R_N = WGS84_A/np.sqrt(1 - WGS84_E2*sin_lat**2)
+    x = (R_N + alt)*cos_lat*cos_lon
+    y = (R_N + alt)*cos_lat*sin_lon
+    z = ((1 - WGS84_E2)*R_N + alt)*sin_lat
+
+    # Rotate the NED vectors to ECEF and add them to the origins
+    n, e, d = ned[:, 0], ned[:, 1], ned[:, 2]
+    s_lat, c_lat = sin_lat.astype(dtype), cos_lat.astype(dtype)
+    s_lon, c_lon = sin_lon.astype(dtype), cos_lon.astype(dtype)
+    x = x + (-s_lat*c_lon*n - s_lon*e - c_lat*c_lon*d)
+    y = y + (-s_lat*s_lon*n + c_lon*e - c_lat*s_lon*d)
+    z = z + (c_lat*n - s_lat*d)
+
+    # ECEF to LLA, the latitude is iterated until it converges for every row
+    # (rows that are not finite, e.g. signals at 0 deg elevation, are left out of the convergence test)
+    lon = np.arctan2(y, x)
+    p = np.sqrt(x**2 + y**2)
+    lat = np.arctan2(z, p*(1 - WGS84_E2))
+    h = np.zeros_like(p)
+    err = np.ones_like(p)
+    while np.max(np.abs(err[np.isfinite(err)]), initial=0) > 1e-10:
+        sin_lat = np.sin(lat)
+        R_N = WGS84_A/np.sqrt(1 - WGS84_E2*sin_lat**2)
+        h = p/np.cos(lat) - R_N
+        err = np.arctan2(z*(1 + WGS84_E2*R_N*sin_lat/z), p) - lat
+        lat = lat + err
+
+    return np.stack((np.degrees(lat), np.degrees(lon), h), axis=-1).astype(dtype)
+
+
+def get_SP(lat, lon, alt, Az, El, hgrnd=80, dtype=np.float64, chunk_size=None, dem=None):
     """
     This function calculates the Specular Point (SP) of a satellite signal
     Inputs:
@@ -14,16 +76,26 @@ def get_SP(lat, lon, alt, Az, El, hgrnd=80):
     Alt: Altitude of the receiver
     Az: Azimuth of the satellite signal
     El: Elevation of the satellite signal
-    hgrnd: Height of the ground above the sea level
+    hgrnd: Height of the ground above the sea level, a single value or one value per signal
+    dtype: Floating point type of the calculation (np.float64 or np.float32)
+    chunk_size: Number of rows converted at a time, None to convert all the rows at once
+    dem: DEM tile set (folder or DEM opened with functions.dem.open_dem), None for a flat ground at hgrnd
+         With a DEM the ground height at the SP is solved for (see solve_ground)
 
     Outputs:
     lla: Latitude, Longitude, Altitude of the SP
     """
+    if dem is not None:
+        return solve_ground(lat, lon, alt, Az, El, dem, hgrnd=hgrnd, dtype=dtype, chunk_size=chunk_size)[1]
+
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    alt = np.asarray(alt, dtype=np.float64)
 
     h = alt - hgrnd + 0
     # Convert angles from degrees to radians
-    El_rad = np.radians(El)
-    Az_rad = np.radians(Az)
+    El_rad = np.radians(np.asarray(El, dtype=dtype))
+    Az_rad = np.radians(np.asarray(Az, dtype=dtype))
 
     # Calculate distances using the tangent and sine/cosine rules
     xx = h * np.sin(Az_rad) / np.tan(El_rad)
@@ -33,11 +105,156 @@ def get_SP(lat, lon, alt, Az, El, hgrnd=80):
     NED_loc = np.stack((yy, xx, alt), axis=-1)  # stacking along the last axis to keep (N, E, D) format
 
     # Convert NED coordinates to LLA (Latitude, Longitude, Altitude)
-    shift_lla = np.array([navpy.ned2lla(NED_loc[i], lat[i], lon[i], alt[i]) for i in range(len(lat))])
+    if chunk_size is None:
+        chunk_size = max(len(lat), 1)
+    shift_lla = np.empty((len(lat), 3), dtype=dtype)
+    for i in range(0, len(lat), chunk_size):
+        j = i + chunk_size
+        shift_lla[i:j] = ned2lla_batch(NED_loc[i:j], lat[i:j], lon[i:j], alt[i:j], dtype=dtype)
 
     return shift_lla
 
 
+def solve_ground(lat, lon, alt, Az, El, dem, hgrnd=80, max_iter=50, tol=0.01, dtype=np.float64, chunk_size=None):
+    """
+    This function finds where the reflection rays meet the ground of a DEM
+    The height z where a ray meets the ground is the root of r(z) = DEM height at SP(z) - z, SP(z) being the SP
+    of a flat ground at height z. The root is bracketed by the altitude of the receiver (above the ground) and the
+    lowest height of the DEM (below the ground) and is found by false position (Illinois method).
+    All the signals are solved together, only the signals that have not converged are calculated again
+    Signals whose SP falls outside of the DEM (or on a missing height) use hgrnd there, signals whose receiver
+    is not above the ground use a flat ground at hgrnd
+
+    Inputs:
+    lat, lon, alt, Az, El: See get_SP
+    dem: DEM tile set (folder or DEM opened with functions.dem.open_dem)
+    hgrnd: Height of the ground where the DEM has no height, a single value or one value per signal
+    max_iter: Largest number of iterations
+    tol: Largest error of the ground height (m) of a converged signal
+
+    Outputs:
+    ground: Height of the ground at the SP of every signal
+    lla: Latitude, Longitude, Altitude of the SP
+    """
+    if isinstance(dem, str):
+        dem = open_dem(dem)
+    lat = np.asarray(lat, dtype=np.float64).reshape(-1)
+    lon = np.asarray(lon, dtype=np.float64).reshape(-1)
+    alt = np.asarray(alt, dtype=np.float64).reshape(-1)
+    Az = np.asarray(Az, dtype=np.float64).reshape(-1)
+    El = np.asarray(El, dtype=np.float64).reshape(-1)
+    default = np.broadcast_to(np.asarray(hgrnd, dtype=np.float64), lat.shape)
+
+    def residual(idx, z):
+        lla_z = get_SP(lat[idx], lon[idx], alt[idx], Az[idx], El[idx], hgrnd=z, dtype=dtype, chunk_size=chunk_size)
+        height = dem_height(dem, lla_z[:, 0], lla_z[:, 1])
+        return np.where(np.isnan(height), default[idx], height) - z, lla_z
+
+    # Bracket: the receiver is above the ground (r < 0), the DEM is nowhere lower than z_lo (r >= 0)
+    ground = default.copy()
+    lla = get_SP(lat, lon, alt, Az, El, hgrnd=default, dtype=dtype, chunk_size=chunk_size)
+    below = dem_height(dem, lat, lon)
+    r_hi = np.where(np.isnan(below), default, below) - alt
+    z_lo = np.minimum(default, dem['meta']['min'])
+    active = np.flatnonzero((r_hi < 0) & (El > 0) & np.isfinite(alt))
+    z_hi = alt[active]
+    r_hi = r_hi[active]
+    z_lo = z_lo[active]
+    r_lo, lla[active] = residual(active, z_lo)
+    ground[active] = z_lo
+    err = np.abs(r_lo)
+    side = np.zeros(len(active), dtype=np.int8) # Last end of the bracket moved, -1 high, 1 low
+
+    for _ in range(max_iter):
+        keep = (err > tol) & (z_hi - z_lo > tol)
+        if not keep.any():
+            break
+        active, z_hi, r_hi, z_lo, r_lo, side = active[keep], z_hi[keep], r_hi[keep], z_lo[keep], r_lo[keep], side[keep]
+
+        z = z_hi - r_hi*(z_hi - z_lo)/(r_hi - r_lo)
+        r, lla_z = residual(active, z)
+        ground[active] = z
+        lla[active] = lla_z
+        err = np.abs(r)
+
+        # Illinois: halve the residual of the end that stays twice in a row
+        high = r < 0
+        r_lo = np.where(high & (side == -1), r_lo/2, r_lo)
+        r_hi = np.where(~high & (side == 1), r_hi/2, r_hi)
+        z_hi, r_hi = np.where(high, z, z_hi), np.where(high, r, r_hi)
+        z_lo, r_lo = np.where(high, z_lo, z), np.where(high, r_lo, r)
+        side = np.where(high, -1, 1).astype(np.int8)
+    return ground, lla
+
+
+def get_FresnelZones(lat, lon, alt, az, el, n=1, hgrnd=80, freq=1575.42*1e6, K=50, dtype=np.float64, dem=None):
+    """
+    The function calculates the Fresnel Zones of many satellite signals at once
+
+    Inputs:
+    lat: Latitude of the receiver, one value per signal
+    lon: Longitude of the receiver
+    Alt: Altitude of the receiver
+    Az: Azimuth of the satellite signal
+    El: Elevation of the satellite signal
+    n: Number of Fresnel Zone, a single value or one value per signal
+    hgrnd: Height of the ground above the sea level, a single value or one value per signal
+    freq: Frequency of the signal, a single value or one value per signal
+    K: Number of points of every ellipse
+    dtype: Floating point type of the NED rotation (see ned2lla_batch)
+    dem: DEM tile set, None for a flat ground at hgrnd. With a DEM the zones are calculated
+         for the ground height at the SP of every signal (see solve_ground)
+
+    Outputs:
+    lla_FZ: (N, K, 3) Latitude, Longitude, Altitude of the points of every Fresnel Zone
+    """
+    if dem is not None:
+        hgrnd = solve_ground(lat, lon, alt, az, el, dem, hgrnd=hgrnd)[0]
+    lat = np.asarray(lat, dtype=np.float64).reshape(-1)
+    lon = np.asarray(lon, dtype=np.float64).reshape(-1)
+    alt = np.asarray(alt, dtype=np.float64).reshape(-1)
+    az = np.asarray(az, dtype=np.float64).reshape(-1, 1)
+    el = np.asarray(el, dtype=np.float64).reshape(-1, 1)
+    n = np.asarray(n, dtype=np.float64).reshape(-1, 1)
+    freq = np.asarray(freq, dtype=np.float64).reshape(-1, 1)
+
+    h = (alt - hgrnd + 0).reshape(-1, 1)
+    # Fresnel Zone calculation
+    c_light = 3e8
+    wavelength = c_light/freq
+
+    sin_el = np.sin(el*np.pi/180)
+    S0x = h/np.tan(el*np.pi/180)
+
+    d = n*wavelength/2 # delay for nth Fresnel zone
+    b = np.sqrt(2*d*h*sin_el)/sin_el # Semi minor axis
+    a = b/sin_el # Semi major axis
+
+    C = S0x - np.sqrt(a*a - b*b) # Center of the ellipse
+
+    # Center rotated to azimuth
+    cos_az = np.cos(az*np.pi/180)
+    sin_az = np.sin(az*np.pi/180)
+    Cx = C*cos_az
+    Cy = C*sin_az
+
+    # Rotated Ellipse, the angles are shared by all the signals
+    th = np.linspace(0, 2*np.pi, K)
+    cos_th = np.cos(th)
+    sin_th = np.sin(th)
+    Ex = Cx + (a*cos_th*cos_az) - (b*sin_th*sin_az)
+    Ey = Cy + (a*cos_th*sin_az) + (b*sin_th*cos_az)
+
+    N = len(lat)
+    NED_loc = np.empty((N, K, 3), dtype=dtype)
+    NED_loc[:, :, 0] = Ex
+    NED_loc[:, :, 1] = Ey
+    NED_loc[:, :, 2] = 0
+
+    lla_FZ = ned2lla_batch(NED_loc.reshape(-1, 3), np.repeat(lat, K), np.repeat(lon, K), np.repeat(alt, K), dtype=dtype)
+    return np.round(lla_FZ.reshape(N, K, 3), 6)
+
+
 def get_FresnelZone (lat, lon, alt, az, el,n = 1 ,hgrnd=80, freq=1575.42*1e6):
     """
     The function calculates the Fresnel Zone of a satellite signal
@@ -55,35 +272,7 @@ def get_FresnelZone (lat, lon, alt, az, el,n = 1 ,hgrnd=80, freq=1575.42*1e6):
     Outputs:
     lla_FZ: Latitude, Longitude, Altitude of the Fresnel Zone
     """
-    h = alt - hgrnd + 0
-    # Fresnel Zone calculation
-    # freq = 1575.42*1e6 # L1 frequency
-    c_light = 3e8
-    wavelength = c_light/freq
-    # n = 1
-
-    S0x = h/np.tan(el*np.pi/180) #
-  
-    d  = n*wavelength/ 2 #delay for nth Fresnel zone
-    b = np.sqrt(2*d* h* np.sin(el*np.pi/180))/ np.sin(el*np.pi/180) #Semi minor axis
-    a = b/ np.sin(el*np.pi/180);    #Semi major axis
-    # print(a, b)
-    # break    
-  
-    C = S0x - np.sqrt(a*a - b*b) # Center of the ellipse
-
-    # Center rotated to azimuth
-    Cx = C*np.cos(az*np.pi/180)
-    Cy = C*np.sin(az*np.pi/180)
-  
-    #Rotated Ellipse
-    th = np.linspace(0, 2*np.pi)
-    Ex = Cx + (a * np.cos(th) * np.cos(az*np.pi/180)) - (b * np.sin(th) * np.sin((az*np.pi/180)))
-    Ey = Cy + (a * np.cos(th) * np.sin(az*np.pi/180)) + (b * np.sin(th) * np.cos((az*np.pi/180)))
-
-    NED_loc = [Ex,Ey,0*np.ones_like(Ex)]
-    lla_FZ = navpy.ned2lla(NED_loc, lat, lon, alt)
-    return np.round (lla_FZ, 6)
+    return get_FresnelZones(lat, lon, alt, az, el, n=n, hgrnd=hgrnd, freq=freq)[0].T
 
 def get_fz_from_sp_df(sp_df, sat_name):
     """
@@ -99,47 +288,27 @@ def get_fz_from_sp_df(sp_df, sat_name):
     new_df['FZone_lat'] = None
     new_df['FZone_lon'] = None
     new_df['FZone_alt'] = None
-    for i, row in new_df.iterrows():
-        lat = float(row['fl_lat'])
-        lon = float(row['fl_lon'])
-        alt = float(row['fl_alt'])
-
-        el = row['Az']
-        az = row['El']
-
-        if not el:
-            continue
-        el = float(el)
-        az = float(az)
-        lla_FZ = get_FresnelZone(lat, lon, alt, az, el)
-        new_df.iloc[i, 9] = pd.DataFrame(lla_FZ[0]).values
-        new_df.iloc[i, 10] = pd.DataFrame(lla_FZ[1]).values
-        new_df.iloc[i, 11] = pd.DataFrame(lla_FZ[2]).values
+
+    # Signals without elevation have no Fresnel Zone
+    el = pd.to_numeric(new_df['El'], errors='coerce')
+    valid = (el.notna() & (el != 0)).to_numpy()
+    rows = new_df[valid]
+    lla_FZ = get_FresnelZones(rows['fl_lat'], rows['fl_lon'], rows['fl_alt'], rows['Az'], rows['El'])
+    new_df.loc[valid, 'FZone_lat'] = pd.Series(list(lla_FZ[:, :, 0]), index=rows.index)
+    new_df.loc[valid, 'FZone_lon'] = pd.Series(list(lla_FZ[:, :, 1]), index=rows.index)
+    new_df.loc[valid, 'FZone_alt'] = pd.Series(list(lla_FZ[:, :, 2]), index=rows.index)
     return new_df
 
 def gen_fz_kml(fz_df, output_file):
+    """
+    This function writes the SP and Fresnel Zone of the satellite signals to a KML (or .kmz) file
+    Inputs:
+    fz_df: DataFrame returned by get_fz_from_sp_df
+    output_file: Path of the KML file
+    """
+    fz_df = fz_df[fz_df['FZone_lat'].notna()]
+    time = [calendar.timegm(t.timetuple()) for t in fz_df['time']]
 
-    kml = simplekml.Kml()
-    for index, row in fz_df.iterrows():
-        time = row['time']
-        SP_lat = row['SP_lat']
-        SP_lon = row['SP_lon']
-        lats = row['FZone_lat']
-        lons = row['FZone_lon']
-        
-        
-        time_plus1 = time + timedelta(seconds=1)
-        
-        polygon_coords = list(zip(lons, lats))
-
-        pol = kml.newpolygon()
-        pol.outerboundaryis = polygon_coords
-        pol.timespan.begin = time.strftime('%Y-%m-%dT%H:%M:%S')
-        pol.timespan.end = time_plus1.strftime('%Y-%m-%dT%H:%M:%S')
-
-        point = kml.newpoint()
-        point.coords = [(SP_lon, SP_lat)]
-        point.timespan.begin = time.strftime('%Y-%m-%dT%H:%M:%S')
-        point.timespan.end = time_plus1.strftime('%Y-%m-%dT%H:%M:%S')
-
-    kml.save(output_file)
+    writer = open_fz_kml(output_file)
+    write_fz_placemarks(writer, time, fz_df['SP_lat'], fz_df['SP_lon'], fz_df['FZone_lat'], fz_df['FZone_lon'])
+    close_fz_kml(writer)
@@ -0,0 +1,151 @@
+import numpy as np
+
+# Accumulators kept for every field in every cell, the mean and standard deviation are derived from them
+GRID_STATS = ('count', 'sum', 'sumsq', 'min', 'max')
+GRID_KEYS = ['group', 'row', 'col']
+
+
+def grid_dtype(fields):
+    """
+    Type of the rows of a grid: the group and cell, and the accumulators of every field, e.g. C_N0_sum
+    """
+    dtype = [('group', 'S8'), ('row', 'i8'), ('col', 'i8')]
+    for field in fields:
+        dtype += [(f'{field}_count', 'i8'), (f'{field}_sum', 'f8'), (f'{field}_sumsq', 'f8'),
+                  (f'{field}_min', 'f8'), (f'{field}_max', 'f8')]
+    return np.dtype(dtype)
+
+
+def grid_cells(lat, lon, cell_size):
+    """
+    Row and column of the cells of a global grid of cell_size degrees holding the points,
+    the cell (0, 0) starts at latitude -90 and longitude -180
+    """
+    row = np.floor((np.asarray(lat, dtype=np.float64) + 90)/cell_size).astype(np.int64)
+    col = np.floor((np.asarray(lon, dtype=np.float64) + 180)/cell_size).astype(np.int64)
+    return row, col
+
+
+def group_labels(data, split_by):
+    """
+    Group of every row, the values of the split_by fields joined by '_' (e.g. b'GP_L1'), b'all' without split
+    """
+    if not split_by:
+        return np.full(len(data), b'all', dtype='S8')
+    labels = data[split_by[0]].astype('S8')
+    for key in split_by[1:]:
+        labels = np.char.add(np.char.add(labels, b'_'), data[key].astype('S8'))
+    return labels.astype('S8')
+
+
+def reduce_grid(acc, fields):
+    """
+    This function merges the rows of the same group and cell of a grid
+    The counts and sums are added, the minimum and maximum are kept (cells without a value are nan)
+
+    Outputs:
+    acc: Grid with one row per group and cell, sorted by group, row and column
+    """
+    acc = acc[np.lexsort([acc[key] for key in reversed(GRID_KEYS)])]
+    if len(acc) == 0:
+        return acc
+    new_cell = np.zeros(len(acc) - 1, dtype=bool)
+    for key in GRID_KEYS:
+        new_cell |= acc[key][1:] != acc[key][:-1]
+    start = np.concatenate(([0], np.flatnonzero(new_cell) + 1))
+    if len(start) == len(acc):
+        return acc
+
+    out = np.empty(len(start), dtype=acc.dtype)
+    for key in GRID_KEYS:
+        out[key] = acc[key][start]
+    for field in fields:
+        for stat in ('count', 'sum', 'sumsq'):
+            out[f'{field}_{stat}'] = np.add.reduceat(acc[f'{field}_{stat}'], start)
+        out[f'{field}_min'] = np.fmin.reduceat(acc[f'{field}_min'], start)
+        out[f'{field}_max'] = np.fmax.reduceat(acc[f'{field}_max'], start)
+    return out
+
+
+def aggregate_points(data, fields, cell_size, split_by=(), lat='SP_lat', lon='SP_lon'):
+    """
+    This function bins a chunk of SP observations on the grid
+
+    Inputs:
+    data: Structured array with the coordinates, the fields and the split_by fields
+    fields: Names of the fields to accumulate, e.g. ['C_N0']
+    cell_size: Size of the cells (deg)
+    split_by: Fields splitting the observations in groups, e.g. ['const', 'band'], empty for a single group
+    lat, lon: Fields of the coordinates binned
+
+    Outputs:
+    acc: Grid with the accumulators of every group and cell holding observations (see grid_dtype)
+    """
+    split_by = list(split_by)
+    located = np.isfinite(data[lat]) & np.isfinite(data[lon])
+    data = data[located]
+
+    acc = np.empty(len(data), dtype=grid_dtype(fields))
+    acc['group'] = group_labels(data, split_by)
+    acc['row'], acc['col'] = grid_cells(data[lat], data[lon], cell_size)
+    for field in fields:
+        values = data[field].astype(np.float64)
+        valid = ~np.isnan(values)
+        acc[f'{field}_count'] = valid
+        acc[f'{field}_sum'] = np.where(valid, values, 0)
+        acc[f'{field}_sumsq'] = np.where(valid, values*values, 0)
+        acc[f'{field}_min'] = values
+        acc[f'{field}_max'] = values
+    return reduce_grid(acc, fields)
+
+
+def merge_grids(grids, fields):
+    """
+    This function merges grids of the same cell size (e.g. of different flights) into one grid
+    """
+    return reduce_grid(np.concatenate(grids), fields)
+
+
+def grid_raster(acc, field, stat='mean', group=None, cell_size=1.0):
+    """
+    This function converts the cells of a grid to a raster over the cells holding observations
+
+    Inputs:
+    acc: Grid (see aggregate_points)
+    field: Name of the field, e.g. 'C_N0'
+    stat: 'count', 'sum', 'min', 'max', 'mean' or 'std'
+    group: Group of the cells (e.g. b'GP_L1'), None to merge all the groups
+    cell_size: Size of the cells (deg)
+
+    Outputs:
+    raster: (rows, cols) value of every cell, the first row is the southern one, nan for the empty cells
+    south, west: Latitude and longitude of the south-west corner of the raster
+    """
+    if group is not None:
+        acc = acc[acc['group'] == (group.encode() if isinstance(group, str) else group)]
+    acc = acc[acc[f'{field}_count'] > 0]
+    if len(acc) == 0:
+        return np.empty((0, 0)), np.nan, np.nan
+    if group is None:
+        acc = acc.copy()
+        acc['group'] = b''
+        acc = reduce_grid(acc, [field])
+
+    count = acc[f'{field}_count'].astype(np.float64)
+    match stat:
+        case 'count':
+            values = count
+        case 'sum' | 'min' | 'max':
+            values = acc[f'{field}_{stat}']
+        case 'mean':
+            values = acc[f'{field}_sum']/count
+        case 'std':
+            mean = acc[f'{field}_sum']/count
+            values = np.sqrt(np.maximum(acc[f'{field}_sumsq']/count - mean*mean, 0))
+        case _:
+            raise ValueError(f"Unknown statistic: {stat}, expected one of count, sum, min, max, mean, std")
+
+    row0, col0 = acc['row'].min(), acc['col'].min()
+    raster = np.full((acc['row'].max() - row0 + 1, acc['col'].max() - col0 + 1), np.nan)
+    raster[acc['row'] - row0, acc['col'] - col0] = values
+    return raster, row0*cell_size - 90, col0*cell_size - 180
@@ -0,0 +1,199 @@
+import h5py
+import numpy as np
+from numpy.lib.recfunctions import repack_fields
+
+# Layout of the datasets written by the SPc stages
+SCHEMA_VERSION = 1
+COMPRESSIONS = ('gzip', 'lzf', None)
+CHUNK_BYTES = 1 << 20 # Target size of a chunk
+
+
+def table_name(file_path):
+    """
+    Name of the dataset stored in a file, e.g. sample_SP for .../sample_SP.h5
+    """
+    return file_path.replace('\\', '/').split('/')[-1][:-3]
+
+
+def create_table(f, name, dtype, columns, row_shape=(), compression='gzip', compression_opts=4, shuffle=True,
+                 chunk_rows=None, attrs=None):
+    """
+    This function creates an empty, chunked, resizable dataset that rows can be appended to
+
+    Inputs:
+    f: Open h5py file (or group)
+    name: Name of the dataset
+    dtype: Type of the rows (structured dtype) or of the values (2-D datasets)
+    columns: Names of the columns, stored as the attributes col1, col2, ... and columns
+    row_shape: Shape of a row, e.g. (7,) for a 2-D dataset with 7 columns, () for structured rows
+    compression: 'gzip', 'lzf' or None
+    compression_opts: gzip level (0-9), ignored for the other filters
+    shuffle: Apply the byte shuffle filter before the compression
+    chunk_rows: Number of rows per chunk, by default chunks of about 1 MiB
+    attrs: Additional attributes of the dataset, e.g. file_name
+
+    Outputs:
+    dset: The dataset
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}, expected one of {COMPRESSIONS}")
+    dtype = np.dtype(dtype)
+    row_shape = tuple(row_shape)
+    if chunk_rows is None:
+        row_bytes = dtype.itemsize * int(np.prod(row_shape))
+        chunk_rows = max(1, CHUNK_BYTES // row_bytes)
+
+    dset = f.create_dataset(name, shape=(0,) + row_shape, maxshape=(None,) + row_shape, dtype=dtype,
+                            chunks=(chunk_rows,) + row_shape, compression=compression,
+                            compression_opts=compression_opts if compression == 'gzip' else None,
+                            shuffle=shuffle and compression is not None)
+    if attrs:
+        for key, value in attrs.items():
+            dset.attrs[key] = value
+    for i, column in enumerate(columns):
+        dset.attrs[f'col{i + 1}'] = column
+    dset.attrs['columns'] = list(columns)
+    dset.attrs['schema_version'] = SCHEMA_VERSION
+    return dset
+
+
+def append_rows(dset, rows):
+    """
+    This function appends rows at the end of a dataset created by create_table
+    """
+    n = dset.shape[0]
+    dset.resize((n + len(rows),) + dset.shape[1:])
+    dset[n:] = rows
+
+
+def write_table(file_path, name, data, columns, index_keys=None, **kwargs):
+    """
+    This function writes an array to a new file as a chunked, compressed, appendable dataset
+    With index_keys the rows must be sorted by these fields, and the rows of every group of equal keys
+    are listed in the dataset <name>_index (see group_index)
+    The keyword arguments are passed to create_table
+    """
+    with h5py.File(file_path, 'w') as f:
+        dset = create_table(f, name, data.dtype, columns, row_shape=data.shape[1:], **kwargs)
+        append_rows(dset, data)
+        if index_keys is not None:
+            index = group_index(data, index_keys)
+            f.create_dataset(f'{name}_index', data=index)
+            f[f'{name}_index'].attrs['keys'] = list(index_keys)
+
+
+def group_index(data, keys):
+    """
+    This function lists the groups of rows with equal keys of a structured array sorted by the keys
+
+    Inputs:
+    data: Structured array sorted by the keys
+    keys: Names of the fields of the groups, e.g. ['const', 'prn', 'band']
+
+    Outputs:
+    index: Structured array with the keys of every group and the rows start:stop of the group
+    """
+    if len(data):
+        new_group = np.zeros(len(data) - 1, dtype=bool)
+        for key in keys:
+            new_group |= data[key][1:] != data[key][:-1]
+        start = np.concatenate(([0], np.flatnonzero(new_group) + 1))
+    else:
+        start = np.zeros(0, dtype=np.int64)
+    stop = np.append(start[1:], len(data))
+
+    index = np.empty(len(start), dtype=[(key, data.dtype[key]) for key in keys] + [('start', 'i8'), ('stop', 'i8')])
+    for key in keys:
+        index[key] = data[key][start]
+    index['start'] = start
+    index['stop'] = stop
+    return index
+
+
+def read_index(file_path, name=None):
+    """
+    This function reads the <name>_index dataset of a file written with index_keys, None if there is none
+    """
+    if name is None:
+        name = table_name(file_path)
+    with h5py.File(file_path, 'r') as f:
+        if f'{name}_index' not in f:
+            return None
+        return f[f'{name}_index'][:]
+
+
+def read_groups(file_path, name=None, columns=None, **keys):
+    """
+    This function reads the rows of the groups matching the given keys, e.g. const=b'GP', prn=12, band=b'L2'
+    Every group is read with one contiguous read using the <name>_index dataset,
+    files without an index are read whole and filtered
+
+    Inputs:
+    file_path: Location of the HDF5 file
+    name: Name of the dataset, by default the name of the file without .h5
+    columns: Names of the columns to read, by default all the columns
+    keys: Values of the key fields, keys that are None are not filtered
+
+    Outputs:
+    data: Structured array with the rows of the matching groups
+    """
+    if name is None:
+        name = table_name(file_path)
+    keys = {key: value for key, value in keys.items() if value is not None}
+    with h5py.File(file_path, 'r') as f:
+        dset = f[name]
+        if f'{name}_index' not in f:
+            data = dset[:]
+            mask = np.ones(len(data), dtype=bool)
+            for key, value in keys.items():
+                mask &= data[key] == value
+            data = data[mask]
+            return data if columns is None else repack_fields(data[list(columns)])
+
+        if columns is not None:
+            dset = dset.fields(list(columns))
+        index = f[f'{name}_index'][:]
+        mask = np.ones(len(index), dtype=bool)
+        for key, value in keys.items():
+            mask &= index[key] == value
+        groups = [dset[start:stop] for start, stop in zip(index['start'][mask], index['stop'][mask])]
+        if not groups:
+            return dset[0:0]
+        return np.concatenate(groups)
+
+
+def read_table(file_path, name=None, start=None, stop=None, columns=None):
+    """
+    This function reads the rows start:stop of a dataset, only the chunks holding these rows are read
+
+    Inputs:
+    file_path: Location of the HDF5 file
+    name: Name of the dataset, by default the name of the file without .h5
+    start, stop: Range of rows to read, by default all the rows
+    columns: Names of the columns to read, by default all the columns
+
+    Outputs:
+    data: Structured array, or 2-D array with the columns in the order asked for
+    """
+    if name is None:
+        name = table_name(file_path)
+    with h5py.File(file_path, 'r') as f:
+        dset = f[name]
+        rows = slice(start, stop)
+        if columns is None:
+            return dset[rows]
+        if dset.dtype.names:
+            return dset.fields(list(columns))[rows]
+        names = table_columns(dset)
+        return dset[rows][:, [names.index(column) for column in columns]]
+
+
+def table_columns(dset):
+    """
+    Names of the columns of a dataset, from the columns attribute or col1, col2, ... for older files
+    """
+    if 'columns' in dset.attrs:
+        return [str(column) for column in dset.attrs['columns']]
+    if dset.dtype.names:
+        return list(dset.dtype.names)
+    return [str(dset.attrs[f'col{i + 1}']) for i in range(dset.shape[1])]
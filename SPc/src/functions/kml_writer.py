@@ -0,0 +1,119 @@
+import io
+import zipfile
+import datetime
+
+# The document is written with the same layout and ids as simplekml
+KML_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2">\n')
+KML_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+KML_IDS_PER_EPOCH = 10 # simplekml ids used by a polygon and a point placemark
+
+POLYGON_PLACEMARK = '''        <Placemark id="{placemark}">
+            <TimeSpan id="{timespan}">
+                <begin>{begin}</begin>
+                <end>{end}</end>
+            </TimeSpan>
+            <Polygon id="{polygon}">
+                <outerBoundaryIs>
+                    <LinearRing id="{ring}">
+                        <coordinates>{coords}</coordinates>
+                    </LinearRing>
+                </outerBoundaryIs>
+            </Polygon>
+        </Placemark>
+'''
+
+POINT_PLACEMARK = '''        <Placemark id="{placemark}">
+            <TimeSpan id="{timespan}">
+                <begin>{begin}</begin>
+                <end>{end}</end>
+            </TimeSpan>
+            <Point id="{point}">
+                <coordinates>{lon},{lat},0.0</coordinates>
+            </Point>
+        </Placemark>
+'''
+
+
+def kml_time(epoch_time):
+    """
+    Convert an epoch time in seconds to a KML (UTC) time string
+    """
+    return datetime.datetime.fromtimestamp(int(epoch_time), datetime.timezone.utc).strftime(KML_TIME_FORMAT)
+
+
+def open_fz_kml(output_file):
+    """
+    This function opens a KML file for writing Fresnel Zones in batches
+    A file ending with .kmz is written as a zip file containing doc.kml
+
+    Inputs:
+    output_file: Path of the .kml or .kmz file
+
+    Outputs:
+    writer: Dictionary holding the open file and the number of epochs written
+    """
+    if output_file.lower().endswith('.kmz'):
+        archive = zipfile.ZipFile(output_file, 'w', compression=zipfile.ZIP_DEFLATED)
+        out = io.TextIOWrapper(archive.open('doc.kml', 'w'), encoding='utf-8', newline='\n')
+    else:
+        archive = None
+        out = open(output_file, 'w', encoding='utf-8', newline='\n')
+    out.write(KML_HEADER)
+    return {'out': out, 'archive': archive, 'n': 0}
+
+
+def fz_placemarks(time, SP_lat, SP_lon, FZ_lats, FZ_lons, first_epoch=0):
+    """
+    This function formats the Fresnel Zone polygon and the SP point of every epoch as KML placemarks
+
+    Inputs:
+    time: Epoch time (s) of every epoch
+    SP_lat, SP_lon: Latitude and longitude of the SP of every epoch
+    FZ_lats, FZ_lons: (N, K) latitudes and longitudes of the Fresnel Zone of every epoch
+    first_epoch: Number of epochs written before, used to number the KML ids
+
+    Outputs:
+    text: KML of the placemarks
+    """
+    parts = []
+    for i, (t, sp_lat, sp_lon, lats, lons) in enumerate(zip(time, SP_lat, SP_lon, FZ_lats, FZ_lons)):
+        base = 2 + KML_IDS_PER_EPOCH*(first_epoch + i) # id 1 is the document
+        begin = kml_time(t)
+        end = kml_time(t + 1)
+        coords = ' '.join(f'{lon},{lat},0.0' for lon, lat in zip(lons.tolist(), lats.tolist()))
+        parts.append(POLYGON_PLACEMARK.format(placemark=base + 1, timespan=base + 6, begin=begin, end=end,
+                                              polygon=base, ring=base + 4, coords=coords))
+        parts.append(POINT_PLACEMARK.format(placemark=base + 8, timespan=base + 9, begin=begin, end=end,
+                                            point=base + 7, lon=float(sp_lon), lat=float(sp_lat)))
+    return ''.join(parts)
+
+
+def write_fz_placemarks(writer, time, SP_lat, SP_lon, FZ_lats, FZ_lons):
+    """
+    This function writes a batch of epochs (Fresnel Zone polygon and SP point) to an open KML file
+
+    Inputs:
+    writer: Writer returned by open_fz_kml
+    time: Epoch time (s) of every epoch
+    SP_lat, SP_lon: Latitude and longitude of the SP of every epoch
+    FZ_lats, FZ_lons: (N, K) latitudes and longitudes of the Fresnel Zone of every epoch
+    """
+    if writer['n'] == 0 and len(time):
+        writer['out'].write('    <Document id="1">\n')
+    writer['out'].write(fz_placemarks(time, SP_lat, SP_lon, FZ_lats, FZ_lons, writer['n']))
+    writer['n'] += len(time)
+
+
+def close_fz_kml(writer):
+    """
+    This function ends the document and closes the KML file
+    """
+    if writer['n'] == 0:
+        writer['out'].write('    <Document id="1"/>\n')
+    else:
+        writer['out'].write('    </Document>\n')
+    writer['out'].write('</kml>\n')
+    writer['out'].close()
+    if writer['archive'] is not None:
+        writer['archive'].close()
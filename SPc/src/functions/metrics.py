@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import resource
+from datetime import datetime
+from contextlib import contextmanager, nullcontext
+
+# Location of the metrics file (JSON lines), '-' for the standard error, unset to disable the metrics
+METRICS_ENV = 'SPC_METRICS'
+
+_sink = {'path': os.environ.get(METRICS_ENV) or None}
+
+
+def enable_metrics(path='-'):
+    """
+    Emit the metrics of the stages to a file (JSON lines, appended) or to the standard error with '-'
+    The setting is passed to the processes started afterwards through the environment
+    """
+    _sink['path'] = path
+    os.environ[METRICS_ENV] = path
+
+
+def disable_metrics():
+    _sink['path'] = None
+    os.environ.pop(METRICS_ENV, None)
+
+
+def metrics_enabled():
+    return _sink['path'] is not None
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of the process (MB)
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/2**20 if sys.platform == 'darwin' else rss/2**10 # bytes on macOS, KiB on Linux
+
+
+def emit(record):
+    """
+    Write a metrics record as one JSON line
+    """
+    line = json.dumps(record, default=str) + '\n'
+    if _sink['path'] == '-':
+        sys.stderr.write(line)
+    else:
+        with open(_sink['path'], 'a') as f:
+            f.write(line)
+
+
+def stage(name, /, **fields):
+    """
+    Context manager measuring a stage, e.g.
+
+        with stage('calculate_SP', file=path) as m:
+            ...
+            m['rows_in'] = len(ubx_data)
+            m['rows_out'] = len(struct_arr)
+
+    The record holds the wall time, rows in and out, rows per second, peak RSS of the process and the time of the
+    sub-steps measured with step(m, ...). Any other key set in the record (e.g. rejected sentences) is emitted too
+    When the metrics are disabled the record is a throwaway dictionary and nothing is measured
+    """
+    if _sink['path'] is None:
+        return nullcontext({})
+    return _measure_stage(name, fields)
+
+
+@contextmanager
+def _measure_stage(name, fields):
+    record = {'stage': name, 'start': datetime.now().isoformat(timespec='milliseconds'), 'pid': os.getpid()}
+    record.update(fields)
+    record['steps'] = {}
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        rows = record.get('rows_out', record.get('rows_in'))
+        if rows is not None and record['seconds'] > 0:
+            record['rows_per_s'] = round(rows/record['seconds'], 1)
+        record['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        emit(record)
+
+
+def step(record, name):
+    """
+    Context manager adding the time of a sub-step to the record of a stage, the time of repeated sub-steps is summed
+    """
+    if 'steps' not in record:
+        return nullcontext()
+    return _measure_step(record['steps'], name)
+
+
+@contextmanager
+def _measure_step(steps, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        steps[name] = round(steps.get(name, 0) + time.perf_counter() - start, 6)
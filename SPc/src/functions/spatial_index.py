@@ -0,0 +1,150 @@
+import h5py
+import numpy as np
+from functions.grid import grid_cells
+from functions.h5_storage import table_name
+
+# Runs of consecutive rows in the same cell, with the extent of their points
+RUN_DTYPE = np.dtype([
+    ('row', 'i8'),
+    ('col', 'i8'),
+    ('start', 'i8'),
+    ('stop', 'i8'),
+    ('t_min', 'f8'),
+    ('t_max', 'f8'),
+    ('lat_min', 'f8'),
+    ('lat_max', 'f8'),
+    ('lon_min', 'f8'),
+    ('lon_max', 'f8')
+])
+SPATIAL_CELL = 0.001 # Default size of the cells (deg), about 100 m
+
+
+def spatial_runs(time, lat, lon, cell_size=SPATIAL_CELL):
+    """
+    This function lists the runs of consecutive rows whose points fall in the same cell of the grid
+    The SP files are sorted by signal and time, so a signal stays in a cell for many rows and there are
+    far fewer runs than rows. Rows without a point (nan) are not in any run
+
+    Outputs:
+    runs: Structured array of RUN_DTYPE, in the order of the rows
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    time = np.asarray(time, dtype=np.float64)
+    located = np.isfinite(lat) & np.isfinite(lon)
+    row, col = grid_cells(np.where(located, lat, 0), np.where(located, lon, 0), cell_size)
+
+    rows = np.flatnonzero(located)
+    if len(rows) == 0:
+        return np.empty(0, dtype=RUN_DTYPE)
+    # A run ends where the cell changes or where rows without a point are skipped
+    new_run = (np.diff(rows) != 1) | (np.diff(row[rows]) != 0) | (np.diff(col[rows]) != 0)
+    first = np.concatenate(([0], np.flatnonzero(new_run) + 1))
+    last = np.append(first[1:], len(rows)) - 1
+
+    runs = np.empty(len(first), dtype=RUN_DTYPE)
+    runs['row'] = row[rows[first]]
+    runs['col'] = col[rows[first]]
+    runs['start'] = rows[first]
+    runs['stop'] = rows[last] + 1
+    for name, values, reduce in (('t_min', time, np.minimum), ('t_max', time, np.maximum),
+                                 ('lat_min', lat, np.minimum), ('lat_max', lat, np.maximum),
+                                 ('lon_min', lon, np.minimum), ('lon_max', lon, np.maximum)):
+        runs[name] = reduce.reduceat(values[rows], first)
+    return runs
+
+
+def write_spatial_index(file_path, name=None, cell_size=SPATIAL_CELL, lat='SP_lat', lon='SP_lon', data=None):
+    """
+    This function builds the spatial index of a SP file and stores it in the file as the dataset <name>_spatial
+    The extent of all the points and their time range are stored as attributes, so files outside
+    of a query are skipped without reading their index
+    data: Rows of the file if they are already in memory, by default they are read from the file
+    """
+    if name is None:
+        name = table_name(file_path)
+    with h5py.File(file_path, 'a') as f:
+        if data is None:
+            data = f[name].fields(['time', lat, lon])[:]
+        runs = spatial_runs(data['time'], data[lat], data[lon], cell_size)
+        if f'{name}_spatial' in f:
+            del f[f'{name}_spatial']
+        dset = f.create_dataset(f'{name}_spatial', data=runs)
+        dset.attrs['cell_size'] = cell_size
+        dset.attrs['columns'] = [lat, lon]
+        extent = [runs['t_min'].min(), runs['t_max'].max(), runs['lat_min'].min(), runs['lat_max'].max(),
+                  runs['lon_min'].min(), runs['lon_max'].max()] if len(runs) else [np.nan]*6
+        for key, value in zip(('t_min', 't_max', 'lat_min', 'lat_max', 'lon_min', 'lon_max'), extent):
+            dset.attrs[key] = value
+
+
+def point_in_polygon(lat, lon, polygon):
+    """
+    This function tests which points are inside a polygon (ray casting, even-odd rule)
+
+    Inputs:
+    lat, lon: Coordinates of the points
+    polygon: (M, 2) latitude, longitude of the vertices of the polygon, closed or not
+
+    Outputs:
+    inside: True for the points inside the polygon
+    """
+    polygon = np.asarray(polygon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    inside = np.zeros(len(lat), dtype=bool)
+    lat1, lon1 = polygon[-1]
+    for lat2, lon2 in polygon:
+        crosses = (lat1 > lat) != (lat2 > lat)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            lon_cross = lon1 + (lat - lat1)*(lon2 - lon1)/(lat2 - lat1)
+        inside ^= crosses & (lon < lon_cross)
+        lat1, lon1 = lat2, lon2
+    return inside
+
+
+def overlapping(extent, bbox=None, time_range=None):
+    """
+    True where an extent (runs or attributes with lat_min, lat_max, lon_min, lon_max, t_min, t_max)
+    overlaps the bounding box (south, west, north, east) and the time range (start, stop), None is not filtered
+    """
+    keep = np.ones(np.shape(extent['lat_min']), dtype=bool)
+    if bbox is not None:
+        south, west, north, east = bbox
+        keep &= (extent['lat_max'] >= south) & (extent['lat_min'] <= north)
+        keep &= (extent['lon_max'] >= west) & (extent['lon_min'] <= east)
+    if time_range is not None:
+        start, stop = time_range
+        if start is not None:
+            keep &= extent['t_max'] >= start
+        if stop is not None:
+            keep &= extent['t_min'] <= stop
+    return keep
+
+
+def merge_ranges(start, stop, gap=0):
+    """
+    This function merges the row ranges start:stop that overlap or are less than gap rows apart
+
+    Outputs:
+    start, stop: Sorted, disjoint ranges
+    """
+    if len(start) == 0:
+        return start, stop
+    order = np.argsort(start, kind='stable')
+    start, stop = start[order], np.maximum.accumulate(stop[order])
+    new_range = start[1:] > stop[:-1] + gap
+    first = np.concatenate(([0], np.flatnonzero(new_range) + 1))
+    last = np.append(first[1:], len(start)) - 1
+    return start[first], stop[last]
+
+
+def chunk_ranges(start, stop, chunk_rows):
+    """
+    This function converts row ranges to the ranges of whole chunks holding them, consecutive chunks are merged
+    A compressed chunk is decompressed whole, so reading the chunks once is the least that can be read
+    """
+    if len(start) == 0 or not chunk_rows:
+        return merge_ranges(start, stop)
+    first, last = merge_ranges(start//chunk_rows, (stop - 1)//chunk_rows + 1)
+    return first*chunk_rows, last*chunk_rows
@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# Version of the stage outputs, change it to invalidate the cached outputs of all the stages
+CACHE_VERSION = 2
+
+# Default size of a cache folder (bytes), the least recently used outputs are removed past it (see prune_cache)
+CACHE_MAX_BYTES = 4*1024**3
+
+
+def file_hash(file_path, block_size=1<<20):
+    """
+    SHA-256 of the content of a file, read in blocks
+    """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def stage_key(stage, inputs, params):
+    """
+    This function calculates the cache key of the output of a stage
+
+    Inputs:
+    stage: Name of the stage
+    inputs: Hashes of the input files or keys of the upstream stages
+    params: Dictionary of the parameters of the stage
+
+    Outputs:
+    key: SHA-256 of the stage, inputs and parameters
+    """
+    text = json.dumps([CACHE_VERSION, stage, list(inputs), params], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def load_cached(cache_dir, key):
+    """
+    Load the cached output of a stage, None if it is not in the cache
+    """
+    path = f"{cache_dir}/{key}.npy"
+    if cache_dir is None or not os.path.exists(path):
+        return None
+    try:
+        data = np.load(path, allow_pickle=False)
+        os.utime(path) # Most recently used, see prune_cache
+    except FileNotFoundError: # Removed by prune_cache in another process
+        return None
+    return data
+
+
+def save_cached(cache_dir, key, data):
+    """
+    Save the output of a stage in the cache, the file is written under a temporary name and renamed when complete
+    """
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_dir}/{key}.tmp.npy"
+    np.save(tmp_path, data, allow_pickle=False)
+    os.replace(tmp_path, f"{cache_dir}/{key}.npy")
+
+
+def cached_outputs(cache_dir, key):
+    """
+    List of the files written by a stage that does not return an array, None if they are not in the cache,
+    or if any of them has been removed or overwritten since (e.g. by a run with other parameters)
+    """
+    path = f"{cache_dir}/{key}.json"
+    if cache_dir is None or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            outputs = json.load(f)
+        os.utime(path) # Most recently used, see prune_cache
+    except FileNotFoundError: # Removed by prune_cache in another process
+        return None
+    if not isinstance(outputs, dict):
+        return None # Recorded without the hashes of the files
+    for output, digest in outputs.items():
+        if not os.path.exists(output) or file_hash(output) != digest:
+            return None
+    return list(outputs)
+
+
+def save_outputs(cache_dir, key, outputs):
+    """
+    Record the files written by a stage that does not return an array, with the hash of their content
+    """
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(f"{cache_dir}/{key}.json", 'w') as f:
+        json.dump({output: file_hash(output) for output in outputs}, f)
+
+
+def prune_cache(cache_dir, max_bytes=CACHE_MAX_BYTES, keep=()):
+    """
+    This function removes the least recently used outputs of a cache folder until it holds at most max_bytes
+    An output is used when it is saved or loaded, the outputs of the keys in keep (e.g. the keys of the current run)
+    are never removed
+
+    Outputs:
+    Number of outputs removed
+    """
+    if cache_dir is None or max_bytes is None or not os.path.isdir(cache_dir):
+        return 0
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        try:
+            info = entry.stat()
+        except FileNotFoundError:
+            continue
+        total += info.st_size
+        # The files being written are not removed either
+        if '.tmp.' not in entry.name and entry.name.split('.')[0] not in keep:
+            entries.append((info.st_mtime, info.st_size, entry.path))
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
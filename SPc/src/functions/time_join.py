@@ -0,0 +1,109 @@
+import numpy as np
+
+# Methods of joining the flight track to the observations
+JOIN_METHODS = ('exact', 'nearest', 'asof', 'interp')
+
+
+def average_track(track):
+    """
+    This function averages the trackpoints that have the same time
+    (same result as groupby('time').mean(), missing values are ignored)
+
+    Inputs:
+    track: (N, M) array of trackpoints, the first column is the time
+
+    Outputs:
+    track_avg: (T, M) array with one row per time, sorted by time
+    """
+    track = track[np.argsort(track[:, 0], kind='stable')]
+    times, start, counts = np.unique(track[:, 0], return_index=True, return_counts=True)
+    if len(times) == len(track):
+        return track
+
+    values = track[:, 1:]
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0), start, axis=0)
+    n = np.add.reduceat(valid, start, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums/n
+    return np.column_stack((times, means))
+
+
+def interp_course(c0, c1, w):
+    """
+    Interpolate a course in degrees along the shortest turn
+    """
+    return (c0 + w*((c1 - c0 + 180) % 360 - 180)) % 360
+
+
+def join_track(track, obs_time, method='exact', tolerance=0.0, course_col=4):
+    """
+    This function matches every observation with the position of the aircraft at the time of the observation
+    The track times are searched with a binary search, the join is O((N + T) log T)
+
+    Inputs:
+    track: (T, M) array of trackpoints sorted by time with unique times, the first column is the time
+    obs_time: Time of every observation
+    method: 'exact'   trackpoint with the same time as the observation
+            'nearest' closest trackpoint within the tolerance
+            'asof'    last trackpoint at or before the observation, within the tolerance
+            'interp'  trackpoints before and after the observation linearly interpolated to the observation time,
+                      both trackpoints used must be within the tolerance of the observation
+    tolerance: Largest time difference (s) between an observation and the trackpoint(s) it is matched with
+    course_col: Column of the course, interpolated along the shortest turn (None to interpolate it linearly)
+
+    Outputs:
+    obs_idx: Index of the matched observations, sorted by observation time
+    track_rows: (len(obs_idx), M) trackpoint of every matched observation, the time is the observation time
+    """
+    if method not in JOIN_METHODS:
+        raise ValueError(f"Unknown join method: {method}, expected one of {JOIN_METHODS}")
+
+    obs_time = np.asarray(obs_time)
+    order = np.argsort(obs_time, kind='stable')
+    t = obs_time[order].astype(np.float64)
+    track_time = track[:, 0]
+    T = len(track_time)
+    if T == 0:
+        return order[:0], np.empty((0, track.shape[1]))
+
+    right = np.searchsorted(track_time, t, side='left') # First trackpoint at or after the observation
+    left = np.searchsorted(track_time, t, side='right') - 1 # Last trackpoint at or before the observation
+    right_c = np.minimum(right, T - 1)
+    left_c = np.maximum(left, 0)
+    d_right = np.where(right < T, track_time[right_c] - t, np.inf)
+    d_left = np.where(left >= 0, t - track_time[left_c], np.inf)
+
+    match method:
+        case 'exact':
+            keep = d_left == 0
+            idx = left_c
+        case 'nearest':
+            idx = np.where(d_left <= d_right, left_c, right_c)
+            keep = np.minimum(d_left, d_right) <= tolerance
+        case 'asof':
+            idx = left_c
+            keep = d_left <= tolerance
+        case 'interp':
+            on_point = d_left == 0
+            keep = on_point | ((d_left <= tolerance) & (d_right <= tolerance))
+
+    order = order[keep]
+    t = t[keep]
+    if method != 'interp':
+        track_rows = track[idx[keep]]
+    else:
+        i0, i1 = left_c[keep], right_c[keep]
+        on_point = on_point[keep]
+        t0, t1 = track_time[i0], track_time[i1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = np.where(on_point, 0.0, (t - t0)/(t1 - t0))[:, None]
+        track_rows = track[i0] + w*(track[i1] - track[i0])
+        track_rows[on_point] = track[i0[on_point]]
+        if course_col is not None:
+            track_rows[:, course_col] = np.where(on_point, track[i0, course_col],
+                                                 interp_course(track[i0, course_col], track[i1, course_col], w[:, 0]))
+
+    track_rows = np.array(track_rows, dtype=np.float64)
+    track_rows[:, 0] = t
+    return order, track_rows
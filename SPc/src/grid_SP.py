@@ -0,0 +1,143 @@
+import os
+import sys
+import h5py
+import numpy as np
+from functions.grid import grid_dtype, aggregate_points, merge_grids, GRID_KEYS
+from functions.h5_storage import read_table, write_table, table_name
+from functions.stage_cache import file_hash
+from functions.metrics import stage, step
+
+# Fields gridded by default
+GRID_FIELDS = ['C_N0']
+
+
+def read_grid(grid_file):
+    """
+    This function reads a grid file written by grid_SP
+
+    Outputs:
+    acc: Accumulators of every group and cell (see functions.grid.grid_dtype)
+    info: Cell size, fields, split_by fields and SP files (name:hash) merged in the grid
+    """
+    name = table_name(grid_file)
+    with h5py.File(grid_file, 'r') as f:
+        attrs = f[name].attrs
+        info = {'cell_size': float(attrs['cell_size']),
+                'fields': [str(field) for field in attrs['fields']],
+                'split_by': [str(key) for key in attrs['split_by']] if len(attrs['split_by']) else [],
+                'sources': [str(source) for source in attrs['sources']] if len(attrs['sources']) else []}
+    return read_table(grid_file, name), info
+
+
+def write_grid(grid_file, acc, info, compression='gzip'):
+    """
+    This function writes a grid file, sorted by group and cell, the cells of every group are listed in <name>_index
+    The file is written under a temporary name and renamed when complete
+    """
+    tmp_file = f"{grid_file[:-3]}.tmp.h5"
+    attrs = {'cell_size': info['cell_size'], 'fields': list(info['fields']), 'split_by': list(info['split_by']),
+             'sources': list(info['sources'])}
+    write_table(tmp_file, table_name(grid_file), acc, acc.dtype.names, index_keys=GRID_KEYS[:1],
+                compression=compression, attrs=attrs)
+    os.replace(tmp_file, grid_file)
+
+
+def grid_SP_file(sp_file, fields, cell_size, split_by=(), chunk_rows=1000000):
+    """
+    This function bins the observations of a SP file on the grid, the file is read chunk_rows rows at a time
+    """
+    columns = list(dict.fromkeys(['SP_lat', 'SP_lon'] + list(fields) + list(split_by)))
+    grids = []
+    start = 0
+    while True:
+        chunk = read_table(sp_file, start=start, stop=start + chunk_rows, columns=columns)
+        grids.append(aggregate_points(chunk, fields, cell_size, split_by))
+        if len(chunk) < chunk_rows:
+            break
+        start += chunk_rows
+    return merge_grids(grids, fields)
+
+
+def grid_SP(sp_files, grid_file, cell_size=None, fields=GRID_FIELDS, split_by=(), chunk_rows=1000000):
+    """
+    This function accumulates the observations of SP files on a lat/lon grid
+    For every group and cell the count, sum, sum of squares, minimum and maximum of every field are kept,
+    so the grid of new flights can be merged in without reading the flights merged before
+
+    Inputs:
+    sp_files: Locations of the SP files
+    grid_file: Location of the grid file, created if it does not exist
+    cell_size: Size of the cells (deg), needed to create the grid file
+    fields: Fields of the SP files to accumulate, e.g. ['C_N0']
+    split_by: Fields splitting the observations in groups, e.g. ['const'], ['band'] or ['const', 'band']
+    chunk_rows: Number of rows of a SP file read at a time
+
+    Outputs:
+    Grid file with the accumulators of every group and cell (see functions.grid.grid_raster to get a map)
+    SP files already merged in the grid (same name and content) are skipped, and the fields and groups
+    of an existing grid file are kept
+    """
+    if os.path.exists(grid_file):
+        acc, info = read_grid(grid_file)
+        if cell_size is not None and cell_size != info['cell_size']:
+            raise ValueError(f"The cell size of {grid_file} is {info['cell_size']}, not {cell_size}")
+    else:
+        if cell_size is None:
+            raise ValueError(f"The cell size is needed to create {grid_file}")
+        info = {'cell_size': cell_size, 'fields': list(fields), 'split_by': list(split_by), 'sources': []}
+        acc = np.empty(0, dtype=grid_dtype(fields))
+
+    with stage('grid_SP', file=grid_file) as m:
+        m['files'] = 0
+        grids = [acc]
+        for sp_file in sp_files:
+            source = f"{table_name(sp_file)}:{file_hash(sp_file)}"
+            if source in info['sources']:
+                print(f"Already in the grid: {sp_file}")
+                continue
+            with step(m, 'aggregate'):
+                grids.append(grid_SP_file(sp_file, info['fields'], info['cell_size'], info['split_by'], chunk_rows))
+            info['sources'].append(source)
+            m['files'] += 1
+            print("Done Reading: " + sp_file)
+
+        with step(m, 'merge'):
+            acc = merge_grids(grids, info['fields'])
+        m['rows_out'] = len(acc)
+        with step(m, 'write'):
+            write_grid(grid_file, acc, info)
+    print(f"Output: {grid_file}")
+
+
+def merge_grid_files(grid_files, out_file):
+    """
+    This function merges grid files of the same cell size, fields and groups (e.g. grids of different campaigns)
+    The grids must not share a SP file: the accumulators do not tell the flights apart, so a flight in two
+    grids would be counted twice
+    """
+    grids = []
+    info = None
+    for grid_file in grid_files:
+        acc, grid_info = read_grid(grid_file)
+        if info is None:
+            info = dict(grid_info, sources=[])
+        elif [grid_info[key] for key in ('cell_size', 'fields', 'split_by')] != \
+                [info[key] for key in ('cell_size', 'fields', 'split_by')]:
+            raise ValueError(f"{grid_file} does not have the cell size, fields and groups of {grid_files[0]}")
+        shared = [source for source in grid_info['sources'] if source in info['sources']]
+        if shared:
+            raise ValueError(f"{grid_file} holds SP files already in the grids before it: {', '.join(shared)}")
+        grids.append(acc)
+        info['sources'] += grid_info['sources']
+    write_grid(out_file, merge_grids(grids, info['fields']), info)
+    print(f"Output: {out_file}")
+
+
+if __name__ == "__main__":
+    # Check if the correct number of arguments is provided
+    if len(sys.argv) < 5:
+        print("Usage: python grid_SP.py <grid_file_location> <cell size (deg)> <all|const|band|const,band> <SP_file_location> [SP_file_location ...]")
+        sys.exit(1)
+
+    split_by = [] if sys.argv[3] == 'all' else sys.argv[3].split(',')
+    grid_SP(sys.argv[4:], sys.argv[1], cell_size=float(sys.argv[2]), split_by=split_by)
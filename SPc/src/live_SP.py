@@ -0,0 +1,228 @@
+import sys
+import json
+import time
+import asyncio
+import numpy as np
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from process_flightlog import read_trackpoint, GPX_COLUMNS
+from process_ublox_data import new_ublox_state, new_ublox_records, take_ublox_records, parse_ublox_block
+from calculate_SP import compute_SP
+from calculate_FZone_KML import has_fresnel_zone
+from functions.geo_calc import get_FresnelZones
+from functions.metrics import stage
+
+# Fields of the SP emitted for every observation
+LIVE_FIELDS = ['time', 'const', 'prn', 'band', 'ele', 'az', 'C_N0', 'fl_lat', 'fl_lon', 'fl_alt', 'SP_lat', 'SP_lon']
+
+async def tail(path, stop, poll=0.05, block_size=1<<16, idle_timeout=None):
+    """
+    Asynchronous generator yielding the bytes appended to a growing file, or read from a pipe, as they arrive
+    A file is polled every poll seconds once its end is reached, a pipe is read until it is closed
+    The generator ends when stop is set or after idle_timeout seconds without new data (None to wait forever)
+    """
+    f = await asyncio.to_thread(open, path, 'rb', buffering=0)
+    try:
+        is_pipe = not f.seekable()
+        idle = 0.0
+        while not stop.is_set():
+            block = await asyncio.to_thread(f.read, block_size)
+            if block:
+                idle = 0.0
+                yield block
+            elif is_pipe:
+                break
+            elif idle_timeout is not None and idle >= idle_timeout:
+                break
+            else:
+                await asyncio.sleep(poll)
+                idle += poll
+    finally:
+        f.close()
+
+
+def json_value(value):
+    """
+    Value of a SP field as JSON: text for the bytes, None for nan
+    """
+    if isinstance(value, bytes):
+        return value.decode()
+    value = value.item() if hasattr(value, 'item') else value
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def write_json_line(record, out=sys.stdout):
+    """
+    Default output of live_SP: one JSON object per line, flushed at once
+    The records hold no nan (see json_value), so the lines are strict JSON
+    """
+    out.write(json.dumps(record, allow_nan=False) + '\n')
+    out.flush()
+
+
+async def live_SP(ubx_path, gpx_path, def_date, emit=write_json_line, method='asof', tolerance=1.0, hgrnd=80, n=1,
+                  freq=1575.42*1e6, dem=None, fz=True, max_wait=0.1, track_seconds=600, poll=0.05, idle_timeout=None,
+                  stop=None):
+    """
+    This function follows a growing UBX file (or pipe) and a growing gpx flight log (or pipe) during the flight,
+    and emits the SP and Fresnel Zone of every observation as soon as the flight log reaches its time
+
+    The UBX log is parsed incrementally as it grows (see process_ublox_data.parse_ublox_block) and the trackpoints
+    are read with an incremental XML parser. An observation is joined with the last track_seconds of the
+    flight log (see calculate_SP.compute_SP) when a trackpoint at or after its time has been read, or when it has
+    waited max_wait seconds, so every record is emitted within about max_wait + poll seconds of being read
+
+    Inputs:
+    ubx_path: Location of the UBX file or pipe
+    gpx_path: Location of the gpx file or pipe
+    def_date: Date of the flight (YYYY-MM-DD), used until the date is read from the UBX log
+    emit: Function called with every record (dictionary), by default the records are written to stdout as JSON lines
+    method, tolerance: Join of the observations with the flight log (see functions.time_join.join_track), the
+                       default 'asof' uses the last trackpoint at or before the observation
+    hgrnd, dem: Ground of the SP (see functions.geo_calc.get_SP)
+    n, freq: Fresnel Zone (see functions.geo_calc.get_FresnelZones), fz=False to emit the SP only
+    max_wait: Longest time (s) an observation waits for the flight log
+    track_seconds: Time span of the flight log kept in memory (s)
+    poll: Time (s) between two reads of a file that is not growing
+    idle_timeout: The logs are followed until neither grows for idle_timeout seconds (None: until stop is set)
+    stop: asyncio.Event ending the live mode
+
+    Outputs:
+    Records with the time, const, prn, band, ele, az, C_N0, fl_lat, fl_lon, fl_alt, SP_lat, SP_lon,
+    fz (list of [lat, lon] of the Fresnel Zone, None without elevation or SP) and latency_ms (time since the
+    observation was read)
+    Returns the numbers of records emitted and observations not joined, and the largest latency (ms)
+    """
+    stop = stop or asyncio.Event()
+    default_date = datetime.strptime(def_date, '%Y-%m-%d')
+    track = np.empty((1024, len(GPX_COLUMNS)))
+    live = {'track_n': 0, 'pending': [], 'emitted': 0, 'unmatched': 0, 'max_latency_ms': 0.0}
+
+    def add_trackpoint(row):
+        nonlocal track
+        n_rows = live['track_n']
+        if n_rows == len(track):
+            # Drop the trackpoints older than track_seconds before the last one, grow the array if it is still full
+            keep = track[:n_rows, 0] >= track[n_rows - 1, 0] - track_seconds
+            kept = track[:n_rows][keep]
+            if len(kept) == len(track):
+                track = np.resize(track, (2*len(track), len(GPX_COLUMNS)))
+            track[:len(kept)] = kept
+            n_rows = len(kept)
+        track[n_rows] = row
+        live['track_n'] = n_rows + 1
+
+    def flush(force=False):
+        """
+        Join the observations that are ready with the flight log and emit their SP
+        """
+        if not live['pending']:
+            return
+        obs = np.concatenate([arr for arr, _ in live['pending']])
+        arrived = np.concatenate([t for _, t in live['pending']])
+        n_rows = live['track_n']
+        track_end = track[n_rows - 1, 0] if n_rows else -np.inf
+        now = time.perf_counter()
+        ready = force | (obs['time'] <= track_end) | (now - arrived >= max_wait)
+        if not ready.any():
+            return
+        # The observations still waiting keep their arrival time
+        live['pending'] = [(obs[~ready], arrived[~ready])] if not ready.all() else []
+        obs, arrived = obs[ready], arrived[ready]
+
+        sp = compute_SP(track[:n_rows], obs, method=method, tolerance=tolerance, hgrnd=hgrnd, dem=dem) \
+            if n_rows else obs[:0]
+        live['unmatched'] += len(obs) - len(sp)
+        if fz and len(sp):
+            # Only the observations with elevation and SP have a Fresnel Zone, the others get None
+            with_fz = has_fresnel_zone(sp)
+            lla_FZ = np.full((len(sp), 1, 2), np.nan)
+            if with_fz.any():
+                zones = get_FresnelZones(sp['fl_lat'][with_fz], sp['fl_lon'][with_fz], sp['fl_alt'][with_fz],
+                                         sp['az'][with_fz], sp['ele'][with_fz], n=n, hgrnd=hgrnd, freq=freq, dem=dem)
+                lla_FZ = np.full((len(sp), zones.shape[1], 2), np.nan)
+                lla_FZ[with_fz] = zones[:, :, :2]
+                # e.g. a zone outside of the DEM
+                with_fz[with_fz] = np.isfinite(zones[:, :, :2]).all(axis=(1, 2))
+
+        latency_ms = round((time.perf_counter() - arrived.min())*1000, 1)
+        live['max_latency_ms'] = max(live['max_latency_ms'], latency_ms)
+        for i, row in enumerate(sp):
+            record = {field: json_value(row[field]) for field in LIVE_FIELDS}
+            if fz:
+                record['fz'] = lla_FZ[i].tolist() if with_fz[i] else None
+            record['latency_ms'] = latency_ms
+            emit(record)
+        live['emitted'] += len(sp)
+
+    async def follow_ubx():
+        state = new_ublox_state()
+        records = new_ublox_records(4096)
+        leftover = b''
+        async for block in tail(ubx_path, stop, poll, idle_timeout=idle_timeout):
+            read_at = time.perf_counter()
+            buf = leftover + block
+            cut, _ = parse_ublox_block(buf, state, default_date, records, final=False)
+            leftover = buf[cut:]
+            live['pending'] += [(arr, np.full(len(arr), read_at)) for arr in take_ublox_records(records)]
+            flush()
+        if leftover:
+            parse_ublox_block(leftover, state, default_date, records, final=True)
+            live['pending'] += [(arr, np.full(len(arr), time.perf_counter())) for arr in take_ublox_records(records)]
+
+    async def follow_gpx():
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        row = [np.nan] * len(GPX_COLUMNS)
+        stack = []
+        async for block in tail(gpx_path, stop, poll, idle_timeout=idle_timeout):
+            parser.feed(block)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    stack.append(elem)
+                    continue
+                stack.pop()
+                if elem.tag.split('}')[-1] != 'trkpt':
+                    continue
+                read_trackpoint(elem, row)
+                add_trackpoint(row)
+                elem.clear()
+                if stack:
+                    stack[-1].clear()
+            flush()
+
+    async def follow_time(readers):
+        # Emit the observations that waited max_wait even when no data arrives
+        while not all(reader.done() for reader in readers):
+            await asyncio.sleep(min(poll, max_wait/2))
+            flush()
+
+    with stage('live_SP', file=ubx_path, method=method) as m:
+        readers = [asyncio.create_task(follow_ubx()), asyncio.create_task(follow_gpx())]
+        await asyncio.gather(*readers, follow_time(readers))
+        flush(force=True)
+        m['rows_out'] = live['emitted']
+        m['unmatched'] = live['unmatched']
+        m['max_latency_ms'] = live['max_latency_ms']
+    return {key: live[key] for key in ('emitted', 'unmatched', 'max_latency_ms')}
+
+
+if __name__ == "__main__":
+    # Check if the correct number of arguments is provided
+    if len(sys.argv) not in (4, 5, 6):
+        print("Usage: python live_SP.py <ublox_file_or_pipe> <gpx_file_or_pipe> <data collection date> [output_file_location] [idle timeout (s)]")
+        sys.exit(1)
+
+    out = open(sys.argv[4], 'a') if len(sys.argv) > 4 and sys.argv[4] != '-' else sys.stdout
+    idle_timeout = float(sys.argv[5]) if len(sys.argv) > 5 else None
+    try:
+        stats = asyncio.run(live_SP(sys.argv[1], sys.argv[2], sys.argv[3], emit=lambda record: write_json_line(record, out),
+                                    idle_timeout=idle_timeout))
+        print(f"Done: {stats['emitted']} records, {stats['unmatched']} observations not joined, "
+              f"largest latency {stats['max_latency_ms']} ms", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
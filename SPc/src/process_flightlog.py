@@ -1,15 +1,100 @@
-import pandas as pd
 import os
-import xml.dom.minidom as minidom
-import pandas as pd
+import re
+import calendar
+import xml.etree.ElementTree as ET
+import numpy as np
 import sys
-import h5py
+from functions.h5_storage import write_table
+from functions.metrics import stage, step
 # from functions.NMEA_parser import gps_chksum, extract_GNRMC, extract_GNGGA, extract_GNGSV
 # from datetime import datetime
 
-def process_flightlog(file_path, output_folder_location):
+# Columns of the processed flight log
+GPX_COLUMNS = ['time', 'lat', 'lon', 'ele', 'course', 'roll', 'pitch']
+GPX_INDEX = {tag: i for i, tag in enumerate(GPX_COLUMNS)}
+
+GPX_TIME = re.compile(r'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(\.\d+)?\s*(Z|[+-]\d{2}:?\d{2})?$')
+
+def parse_gpx_time(value):
+    """
+    Convert a GPX (ISO 8601) time to epoch time in seconds
+    e.g. 2021-04-27T16:41:39-05:00, 2021-04-27T21:41:39.5Z
+    Times without UTC offset are taken as UTC
+    The fractional seconds are kept (e.g. 12.6 s), so the joins interpolating the track can use them.
+    The former output rounded the times to the nearest second, the exact join of calculate_SP still does
+    """
+    match = GPX_TIME.match(value.strip())
+    year, month, day, hour, minute, sec, frac, offset = match.groups()
+    t = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(sec)))
+    if frac:
+        t += float(frac)
+    if offset and offset != 'Z':
+        sign = -1 if offset[0] == '-' else 1
+        t -= sign * (int(offset[1:3])*3600 + int(offset[-2:])*60)
+    return t
+
+def read_trackpoint(elem, row):
+    """
+    This function reads a trkpt element into row (time, lat, lon, ele, course, roll, pitch)
+    The values missing from the trackpoint are left unchanged
     """
-    This function read a gpx file and convert it to a pandas dataframe
+    # Get the latitude and longitude from the trackpoint
+    row[1] = float(elem.get('lat'))
+    row[2] = float(elem.get('lon'))
+
+    # Loop through each child of the trackpoint to find ele, time, course, roll, pitch
+    for child in elem:
+        tag = child.tag.split('}')[-1]
+        if tag not in GPX_INDEX or tag in ('lat', 'lon'):
+            continue
+        value = child.text.strip() if child.text else None
+        if value is None:
+            row[GPX_INDEX[tag]] = np.nan
+        elif tag == 'time':
+            row[0] = parse_gpx_time(value)
+        else:
+            row[GPX_INDEX[tag]] = float(value)
+
+def read_flightlog(file_path, initial_rows=1<<14):
+    """
+    This function reads the trackpoints of a gpx file incrementally
+    The trackpoints are appended to a preallocated array that doubles its size when it is full,
+    and every trackpoint element is discarded once it has been read, so only the output array
+    grows with the length of the track
+
+    Output is a float array with one row per trackpoint and the following columns:
+    time (epoch time in seconds), lat, lon, ele, course, roll, pitch
+    A value missing from a trackpoint is taken from the previous trackpoint (nan for the first one)
+    """
+    trackpts = np.empty((initial_rows, len(GPX_COLUMNS)), dtype=np.float64)
+    n = 0
+    row = [np.nan] * len(GPX_COLUMNS) # Values of the current trackpoint
+
+    stack = [] # Open elements, the parent of a trackpoint is emptied after every trackpoint
+    for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if elem.tag.split('}')[-1] != 'trkpt': # Get the tag name without the namespace
+            continue
+
+        read_trackpoint(elem, row)
+        if n == len(trackpts): # Grow the array
+            trackpts = np.resize(trackpts, (2*len(trackpts), len(GPX_COLUMNS)))
+        trackpts[n] = row
+        n += 1
+
+        # Discard the trackpoint that has been read
+        elem.clear()
+        if stack:
+            stack[-1].clear()
+
+    return trackpts[:n]
+
+def process_flightlog(file_path, output_folder_location, compression='gzip'):
+    """
+    This function read a gpx file and convert it to a HDF5 file
     Make sure the gpx file has the fillowing structure:
     <gpx>
         <trk>
@@ -25,94 +110,39 @@ def process_flightlog(file_path, output_folder_location):
         </trk>
     </gpx>
 
-    Output is a pandas dataframe with the following columns:
-    time, lat, lon, ele, course, roll, pitch
+    Output is a float array with the following columns:
+    time (epoch time in seconds, with the fractional seconds of the gpx file), lat, lon, ele, course, roll, pitch
+    stored as a chunked dataset compressed with the given filter ('gzip', 'lzf' or None)
     """
     # Check if the file exists
     if not os.path.exists(file_path):
         print ('File does not exist:', file_path)
         return None
-    
-    try: # Try to read the gpx file using minidom parser
-        xml_doc = minidom.parse(file_path)
-    except: # If there is an error, print the error and continue to the next file
-        print("Error Reading: "+ file_path)
-        return None
-    
-    root = xml_doc.documentElement # Get the root element of the xml file
-    trackpoints = root.getElementsByTagName('trkpt') # Get all the trackpoints tags from the xml file
-
-    trackpt_df = pd.DataFrame() # Create an empty dataframe to store the trackpoints data
-
-    for trackpoint in trackpoints: # Loop through each trackpoint
-        # Get the latitude and longitude from the trackpoint
-        lat = trackpoint.getAttribute('lat') 
-        lon = trackpoint.getAttribute('lon')
-        
-        # Loop through each child of the trackpoint to find ele, time, course, roll, pitch
-        for child in trackpoint.childNodes:
-            if child.nodeType == child.ELEMENT_NODE:
-                tag = child.tagName # Get the tag name
-                value = child.firstChild.data if child.firstChild else None # Get the value of the tag if it exists
-                # print(tag, value)
-                # break
-
-                # Store the values in the in corresponding variables
-                if tag == 'ele':
-                    ele = value
-                elif tag == 'time':
-                    t = value
-                elif tag == 'course':
-                    course = value
-                elif tag == 'roll':
-                    roll = value
-                elif tag == 'pitch':
-                    pitch = value
-
-        try: # Try to save the values in the dataframe
-            row_df = pd.DataFrame([[t, lat, lon, ele, course, roll, pitch]], columns=['time','lat','lon','ele','course','roll','pitch'])
-            trackpt_df = pd.concat([trackpt_df, row_df])
-        except:
-            print ('Error saving row')
-            print (row_df)
-            continue 
-
-    trackpt_df.reset_index(drop=True, inplace=True) # Reset the index of the dataframe
-
-    # Convert the time column to datetime format
-    trackpt_df['time'] = pd.to_datetime(trackpt_df['time']).dt.tz_convert('UTC').round('s')
-    trackpt_df['time'] = trackpt_df['time'].dt.tz_localize(None)
-
-    print ("Done Reading: "+ file_path)
-
-
-    if "/" in file_path:
-        file_name = file_path.split("/")[-1]
-        file_name_stripped = file_name.split(".")[0]
-    else:
-        file_name = file_path.split("\\")[-1]
-        file_name_stripped = file_name.split(".")[0]
-    
-    trackpt_df['time'] = trackpt_df['time'].astype('int64') // 10**9 # Convert the time to epoch time
-    trackpt_df['lat'] = trackpt_df['lat'].astype(float)
-    trackpt_df['lon'] = trackpt_df['lon'].astype(float)
-    trackpt_df['ele'] = trackpt_df['ele'].astype(float)
-    trackpt_df['course'] = trackpt_df['course'].astype(float)
-    trackpt_df['roll'] = trackpt_df['roll'].astype(float)
-    trackpt_df['pitch'] = trackpt_df['pitch'].astype(float)
-
-    # trackpt_df.to_csv(f"{output_folder_location}/{file_name_stripped}_gpx.csv", index=False)
-    
-    with h5py.File(f"{output_folder_location}/{file_name_stripped}_gpx.h5", 'w') as f:
-        dset = f.create_dataset(f'{file_name_stripped}_gpx', data=trackpt_df)
-        dset.attrs['file_name'] = file_name_stripped
-        dset.attrs['col1'] = 'time'
-        dset.attrs['col2'] = 'lat'
-        dset.attrs['col3'] = 'lon'
-        dset.attrs['col4'] = 'ele'
-        dset.attrs['col5'] = 'course'
-        dset.attrs['col6'] = 'roll'
-        dset.attrs['col7'] = 'pitch'
+
+    with stage('process_flightlog', file=file_path) as m:
+        m['bytes_in'] = os.path.getsize(file_path)
+        try: # Try to read the gpx file with the incremental parser
+            with step(m, 'parse'):
+                trackpts = read_flightlog(file_path)
+        except: # If there is an error, print the error and continue to the next file
+            print("Error Reading: "+ file_path)
+            m['errors'] = 1
+            return None
+
+        print ("Done Reading: "+ file_path)
+
+
+        if "/" in file_path:
+            file_name = file_path.split("/")[-1]
+            file_name_stripped = file_name.split(".")[0]
+        else:
+            file_name = file_path.split("\\")[-1]
+            file_name_stripped = file_name.split(".")[0]
+
+        with step(m, 'write'):
+            write_table(f"{output_folder_location}/{file_name_stripped}_gpx.h5", f'{file_name_stripped}_gpx', trackpts,
+                        GPX_COLUMNS, compression=compression, attrs={'file_name': file_name_stripped})
+        m['rows_out'] = len(trackpts)
     print (f"Output: {output_folder_location}/{file_name_stripped}_gpx.h5")
 
 if __name__ == "__main__":
@@ -126,4 +156,4 @@ if __name__ == "__main__":
     output_folder_location = sys.argv[2]
 
     # Create the file
-    process_flightlog(input_file_location, output_folder_location)
\ No newline at end of file
+    process_flightlog(input_file_location, output_folder_location)
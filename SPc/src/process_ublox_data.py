@@ -1,164 +1,537 @@
-from functions.NMEA_parser import gps_chksum, extract_GNRMC, extract_GNGGA, extract_GNGSV
+from functions.NMEA_parser import gps_chksum_batch, extract_GNRMC, extract_GNGGA, extract_GNGSV
+from functions.UBX_parser import ubx_chksum, find_ubx_frames, extract_NAV_PVT, extract_NAV_SAT, extract_RXM_RAWX, get_ubx_prn, get_ubx_band
+from functions.UBX_parser import UBX_NAV_PVT, UBX_NAV_SAT, UBX_RXM_RAWX, UBX_SYNC, UBX_HEADER_LEN, UBX_CHKSUM_LEN
+from functions.h5_storage import create_table, append_rows
+from functions.metrics import stage, step
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import bisect
+import heapq
+import calendar
+import os
 import sys
-import pandas as pd
 import numpy as np
 import h5py
 
-def process_ublox_data(file_path, def_date, out_dir):
+# create compound data type
+UBLOX_DTYPE = np.dtype([
+    ('time', 'i8'),
+    ('lat', 'f8'),
+    ('long', 'f8'),
+    ('const', 'S2'),
+    ('prn', 'i8'),
+    ('band', 'S2'),
+    ('ele', 'f8'),
+    ('az', 'f8'),
+    ('C_N0', 'i8')
+    ])
+UBLOX_COLUMNS = list(UBLOX_DTYPE.names)
+
+def new_ublox_state():
     """
-    Function to read a UBX file and extract the data
-    The UBX file should be containing NMEA messages (GNRMC, GNGGA, GPGSV, GLGSV, etc.)
+    State carried from one message to the next: time (datetime and epoch time) and position of the last GNRMC/GNGGA/NAV-PVT message
+    """
+    return {'dt': None, 'time': None, 'lat': None, 'lon': None}
+
+def new_ublox_records(batch_size=100000):
+    """
+    Accumulator for the observations of a UBX file
+    The observations are written directly in preallocated structured arrays of UBLOX_DTYPE with batch_size
+    rows. When an array is full it is moved to the list of full batches and a new array is allocated
+    The sentences failing the checksum (rejected) and the messages that could not be parsed (errors) are counted
+    """
+    return {'full': [], 'arr': np.empty(batch_size, dtype=UBLOX_DTYPE), 'n': 0, 'rejected': 0, 'errors': 0}
 
-    The function will return a list of dictionaries, where each dictionary contains the following keys:
-    datetime, latitude, longitude, SVs 
-    where SVs is a list of dictionaries containing the following keys:
-    SV, Elevation, Azimuth, C_N0
+def take_ublox_records(records, partial=True):
+    """
+    Remove the observations from an accumulator created by new_ublox_records
+    Returns the list of full batches, followed by the partially filled batch if partial is True
+    """
+    batches = records['full']
+    records['full'] = []
+    if partial and records['n']:
+        batches.append(records['arr'][:records['n']])
+        records['arr'] = np.empty(len(records['arr']), dtype=UBLOX_DTYPE)
+        records['n'] = 0
+    return batches
 
-    Each SV represents a satellite visible at a given time
+def epoch_time(dt):
+    """
+    Epoch time in seconds of a (UTC) datetime
+    """
+    return calendar.timegm(dt.timetuple())
 
+def parse_ublox_block(buf, state, default_date, records, final=True):
     """
+    Parse the NMEA sentences and UBX frames of a block of a UBX file
 
-    # Attempts to get a default date from the file path
-    # the file path should be in the format: D:\GNSSR\USDA-NF-Ublox\2020\2020-06-15_12_inch_plate\Ublox_data
-    # where the date is the 4th element in the path
-    # If it fails, it will ask the user to input a date
-    try:
-        default_date = datetime.strptime(file_path.split("\\")[4][:10], '%Y-%m-%d')
-    except:
-        # inp = input('Enter a date of the flight in the format YYYY-MM-DD (e.g. 2021-04-27): ')
-        inp = def_date
-        default_date = datetime.strptime(inp, '%Y-%m-%d')
-    data_file = open(file_path, errors="ignore") # Reading the UBX file
-    lines = data_file.readlines() 
-
-    i = 0
-    dt = None
-    lat = None
-    lon = None
-    data = []
-    const = []
-
-    # iterate through the lines
-    while i < len(lines):
-        
-        # print(lines)
-        line = lines [i]
-        k1 = line.find('$G')
-        k2 = line.find('*')
-        if k1 == -1 or k2 == -1:
-            i = i+1
-            continue
-        line = line[k1:k2+3]  # +3 to include '*' and the two checksum characters
-    
-        # Verify the checksum of the trimmed line
-        _, passed = gps_chksum(line)
-        if not passed:
-            i = i+1
+    Inputs:
+    buf: Bytes of the block
+    state: Dictionary returned by new_ublox_state, updated with the time and position of the block
+    default_date: datetime used to complete the date of the GNGGA messages
+    records: Accumulator the observations are appended to (see new_ublox_records), one row per satellite and signal
+    final: False if more data follows the block, the last partial line (or binary frame) is then left unparsed
+
+    Outputs:
+    cut: Number of bytes of the block that were parsed, the remaining bytes have to be parsed with the next block
+    first_fix: Offset of the first message setting the time and position, None if there is none
+
+    The binary UBX frames are removed from the block before the NMEA sentences are searched, so a
+    sentence interrupted by a binary frame is still parsed. NAV-PVT messages set the time and position
+    like GNRMC/GNGGA, NAV-SAT messages give the observations like GSV and RXM-RAWX messages give one
+    observation per tracked signal (without elevation and azimuth)
+    The checksums of all the sentences of the block are verified at once with gps_chksum_batch
+    """
+    dt = state['dt']
+    t = state['time']
+    lat = state['lat']
+    lon = state['lon']
+    first_fix = None
+
+    arr = records['arr']
+    n = records['n']
+    def add(row):
+        # Write an observation in the current array, a new array is started when it is full
+        nonlocal arr, n
+        if n == len(arr):
+            records['full'].append(arr)
+            arr = np.empty(len(arr), dtype=UBLOX_DTYPE)
+            n = 0
+        arr[n] = row
+        n += 1
+
+    # Locate the binary frames, a frame cut by the end of the block is completed with the next block
+    frames, incomplete = find_ubx_frames(buf, final=final)
+
+    # Only complete lines and frames are parsed, the rest of the block is kept for the next block
+    # (new line characters inside a binary frame do not end a line)
+    if not final:
+        cut = buf.rfind(b'\n', 0, len(buf) if incomplete is None else incomplete) + 1
+        for f_start, f_end, _, _ in reversed(frames):
+            if f_start < cut <= f_end:
+                cut = buf.rfind(b'\n', 0, f_start) + 1
+        # The frames following the last line are parsed too, up to the first sentence still incomplete,
+        # so a log of binary frames only is not carried whole from block to block
+        for f_start, f_end, _, _ in frames:
+            if f_start < cut:
+                continue
+            if b'$' in buf[cut:f_start]:
+                break
+            cut = f_end
+        frames = [frame for frame in frames if frame[1] <= cut]
+    else:
+        cut = len(buf)
+
+    # Text of the block without the binary frames, and position of each frame in that text
+    frame_pos = []
+    removed = [0] # number of bytes removed before each frame position
+    if frames:
+        segments = []
+        prev = 0
+        n_text = 0
+        for f_start, f_end, _, _ in frames:
+            segments.append(buf[prev:f_start])
+            n_text += f_start - prev
+            frame_pos.append(n_text)
+            removed.append(removed[-1] + f_end - f_start)
+            prev = f_end
+        segments.append(buf[prev:cut])
+        text = b''.join(segments)
+    else:
+        text = buf[:cut]
+    mv = memoryview(buf)
+
+    # Verify the checksum of every sentence of the block
+    passed, starts, ends = gps_chksum_batch(text)
+    records['rejected'] += len(passed) - int(passed.sum())
+
+    # Frames and sentences are parsed in the order they were received
+    sentences = ((k1, k2, None) for k1, k2 in zip(starts[passed], ends[passed]))
+    binary = ((pos, pos, frame) for pos, frame in zip(frame_pos, frames))
+    for k1, k2, frame in heapq.merge(binary, sentences, key=lambda event: event[0]):
+
+        if frame is not None:
+            f_start, f_end, msg_class, msg_id = frame
+            payload = mv[f_start + UBX_HEADER_LEN:f_end - UBX_CHKSUM_LEN]
+
+            if (msg_class, msg_id) == UBX_NAV_PVT:
+                try:
+                    pvt = extract_NAV_PVT(payload)
+                except:
+                    records['errors'] += 1
+                    continue
+                if pvt:
+                    dt, lat, lon, alt = pvt
+                    t = epoch_time(dt)
+                    if first_fix is None:
+                        first_fix = f_start
+
+            elif dt and (msg_class, msg_id) == UBX_NAV_SAT:
+                try:
+                    info = extract_NAV_SAT(payload)
+                except:
+                    records['errors'] += 1
+                    continue
+                for gnss_id, sv_id, cno, ele, az in info:
+                    prn = get_ubx_prn(gnss_id, sv_id)
+                    if prn is None:
+                        continue
+                    add((t, lat, lon, prn[0], prn[1], get_ubx_band(gnss_id)[:2], ele, az, cno))
+
+            elif dt and (msg_class, msg_id) == UBX_RXM_RAWX:
+                try:
+                    raw_dt, info = extract_RXM_RAWX(payload)
+                except:
+                    records['errors'] += 1
+                    continue
+                for gnss_id, sv_id, sig_id, cno in info:
+                    prn = get_ubx_prn(gnss_id, sv_id)
+                    if prn is None:
+                        continue
+                    add((epoch_time(raw_dt), lat, lon, prn[0], prn[1], get_ubx_band(gnss_id, sig_id)[:2], np.nan, np.nan, cno))
             continue
+
+        line = text[k1:k2].decode()
         parts = line.split(',')
 
         if parts[0] == "$GNRMC":
             try:
                 dt, lat, lon = extract_GNRMC(line)
             except:
-                # print(line)
-                i = i+1
+                records['errors'] += 1
                 continue
-            
+            t = epoch_time(dt)
+            if first_fix is None:
+                first_fix = k1 + removed[bisect.bisect_right(frame_pos, k1)]
+
         elif parts[0] == "$GNGGA":
             try:
                 dt, lat, lon, alt = extract_GNGGA(line)
                 dt = dt.replace(year=default_date.year, month=default_date.month, day = default_date.day)
             except:
-                i = i+1
+                records['errors'] += 1
                 continue
+            t = epoch_time(dt)
+            if first_fix is None:
+                first_fix = k1 + removed[bisect.bisect_right(frame_pos, k1)]
 
         elif dt and (parts[0] in ['$GPGSV', '$GLGSV', '$GAGSV', '$GBGSV']):
-            try: 
-                info, _ = extract_GNGSV(line)
+            try:
+                info = extract_GNGSV(line)[0]
             except:
-                i = i+1
+                records['errors'] += 1
                 continue
-            if  len(info) > 0:
-                # data.append(instance)
-                instance = {}
-                instance['time'] = dt
-                instance['lat'] = lat
-                instance['long'] = lon
-                # instance['SVs'] = []
-                for sv in info:
-                    # if sv['C_N0']:
-                    # print (sv[:2])
-                    const.append(sv[:2])
-                    sv_data = sv.split('_')
-                    instance['const'] = str(sv_data[0][:2])
-                    instance['prn'] = int(sv_data[0][2:4]) 
-                    instance['band'] = str(sv_data[1][:2])
-                    instance['ele'] = int(sv_data[2]) if sv_data[2] else np.nan
-                    instance['az'] = int(sv_data[3]) if sv_data[3] else np.nan
-                    instance['C_N0'] = int(sv_data[4]) if sv_data[4] else np.nan
-                    data.append(instance)
-                    # print (instance)
-
-        i = i+1
-    # print (data[0])
-    # check samples of each constellation
-    # unique_const = np.unique(const)
-    # for const_str in unique_const:
-    #     count = const.count(const_str)
-    #     print(f"{const_str}: {count} times")
-    data_df = pd.DataFrame(data)
-    # print (data_df)
-    data_df['time'] = data_df['time'].astype('int64') // 10**9
-    data_df['band'] = data_df['band'].values.astype('S')
-    # print(data_df.band)
-    data_df['const'] = data_df['const'].values.astype('S')
-    # print(data_df.const)
-    print("Done Reading: "+ file_path)
-    # print(data_df.dtypes)
-    # print(data_df)
-    # data_df.to_csv(f"{out_dir}/{file_path.split('/')[-1].split('.')[0]}_ublox.csv", index=False)
-    # print(f"Output: {out_dir}/{file_path.split('/')[-1].split('.')[0]}_ublox.csv")
+            for sv in info:
+                sv_data = sv.split('_')
+                add((t, lat, lon,
+                     sv_data[0][:2], # const
+                     int(sv_data[0][2:4]), # prn
+                     sv_data[1][:2], # band
+                     int(sv_data[2]) if sv_data[2] else np.nan, # ele
+                     int(sv_data[3]) if sv_data[3] else np.nan, # az
+                     int(sv_data[4]))) # C_N0
 
-    # create compound data type
-    dtype = np.dtype([
-    ('time', 'i8'),
-    ('lat', 'f8'),
-    ('long', 'f8'),
-    ('const', 'S2'),
-    ('prn', 'i8'),
-    ('band', 'S2'),
-    ('ele', 'f8'),
-    ('az', 'f8'),
-    ('C_N0', 'i8')
-    ])
-    struct_arr = np.array(list(data_df.to_records(index=False)), dtype=dtype)
-    # print(struct_arr)
-    with h5py.File(f"{out_dir}/{file_path.split('/')[-1].split('.')[0]}_ublox.h5", 'w') as f:
-        dset = f.create_dataset(f"{file_path.split('/')[-1].split('.')[0]}_ublox", data=struct_arr)
-        dset.attrs['file_name'] = file_path.split('/')[-1].split('.')[0]
-        dset.attrs['col1'] = 'time'
-        dset.attrs['col2'] = 'lat'
-        dset.attrs['col3'] = 'long'
-        dset.attrs['col4'] = 'const'
-        dset.attrs['col5'] = 'prn'
-        dset.attrs['col6'] = 'band'
-        dset.attrs['col7'] = 'ele'
-        dset.attrs['col8'] = 'az'
-        dset.attrs['col9'] = 'C_N0'
-    print(f"Output: {out_dir}/{file_path.split('/')[-1].split('.')[0]}_ublox.h5")
+    records['arr'] = arr
+    records['n'] = n
+    state['dt'] = dt
+    state['time'] = t
+    state['lat'] = lat
+    state['lon'] = lon
+    return cut, first_fix
+
+def read_ublox_data(source, default_date, batch_size=100000, block_size=1<<22, stats=None):
+    """
+    Generator that reads a UBX file block by block and yields the extracted observations in batches
+    The UBX file can contain NMEA messages (GNRMC, GNGGA, GPGSV, GLGSV, etc.) as well as binary
+    UBX messages (NAV-PVT, NAV-SAT, RXM-RAWX), in any order
+
+    Inputs:
+    source: Path to the UBX file or an open file-like object
+    default_date: datetime used to complete the date of the GNGGA messages
+    batch_size: Maximum number of observations yielded at a time
+    block_size: Number of bytes read from the file at a time
+    stats: Optional dictionary where the numbers of rejected sentences and parse errors are added
+
+    Outputs (yielded):
+    Structured arrays of UBLOX_DTYPE with the columns time, lat, long, const, prn, band, ele, az, C_N0
+    Each row represents a satellite visible at a given time
+
+    Only one block and the observations of that block are held in memory at a time, so the memory
+    used does not depend on the length of the log
+    """
+    # Accept an already opened file (e.g. a pipe or a socket) as well as a file location
+    if hasattr(source, 'read'):
+        data_file = source
+    else:
+        data_file = open(source, 'rb') # Reading the UBX file
+
+    state = new_ublox_state()
+    records = new_ublox_records(batch_size)
+    leftover = b''
+
+    try:
+        while True:
+            block = data_file.read(block_size)
+            if isinstance(block, str):
+                block = block.encode(errors="ignore")
+            buf = leftover + block
+
+            cut, _ = parse_ublox_block(buf, state, default_date, records, final=not block)
+            leftover = buf[cut:]
+
+            yield from take_ublox_records(records, partial=not block)
+
+            if not block:
+                break
+    finally:
+        if data_file is not source:
+            data_file.close()
+        add_ublox_stats(stats, records)
+
+def add_ublox_stats(stats, counts):
+    """
+    Add the numbers of rejected sentences and parse errors to a stats dictionary (if there is one)
+    """
+    if stats is not None:
+        for key in ('rejected', 'errors'):
+            stats[key] = stats.get(key, 0) + counts[key]
+
+def ubx_message_at(buf, k, final):
+    """
+    True if a message starts at offset k of buf: a line (buf[k-1] is a new line) beginning with a valid NMEA
+    sentence, or a valid UBX frame followed by another message (UBX sync characters or '$') or by the end
+    of the file. None if more data is needed to decide and final is False
+    """
+    if buf.startswith(b'$G', k) and buf[k - 1:k] == b'\n':
+        end = buf.find(b'\n', k)
+        if end == -1 and not final:
+            return None
+        passed, starts, _ = gps_chksum_batch(buf[k:] if end == -1 else buf[k:end])
+        return bool(len(passed) and passed[0] and starts[0] == 0)
+    if buf.startswith(UBX_SYNC, k):
+        if k + UBX_HEADER_LEN > len(buf):
+            return None if not final else False
+        length = int.from_bytes(buf[k + 4:k + 6], 'little')
+        end = k + UBX_HEADER_LEN + length + UBX_CHKSUM_LEN
+        if end + 2 > len(buf) and not final:
+            return None
+        if end > len(buf) or ubx_chksum(buf[k + 2:end - 2]) != (buf[end - 2], buf[end - 1]):
+            return False
+        return end == len(buf) or buf.startswith(UBX_SYNC, end) or buf.startswith(b'$', end)
+    return False
+
+def resync_ublox(data_file, offset, window=1<<16):
+    """
+    Find the first message of a UBX file starting at or after offset (see ubx_message_at): a line beginning
+    with a valid NMEA sentence, or a UBX frame for the logs of binary frames only
+
+    Inputs:
+    data_file: UBX file opened in binary mode
+    offset: Offset in bytes where the search starts
+
+    Outputs:
+    Offset of the beginning of the message, or the size of the file if there is none
+    """
+    if offset <= 0:
+        return 0
+    data_file.seek(offset - 1)
+    pos = offset - 1 # file offset of buf[0]
+    buf = data_file.read(window)
+    final = len(buf) < window
+    k = 1 # next offset of buf searched
+    while True:
+        line = buf.find(b'\n$', k - 1)
+        frame = buf.find(UBX_SYNC, k)
+        starts = [start for start in (line + 1 if line != -1 else -1, frame) if start != -1]
+        found = ubx_message_at(buf, min(starts), final) if starts else None
+        if found:
+            return pos + min(starts)
+        if found is False:
+            k = min(starts) + 1
+            continue
+        if final:
+            return pos + len(buf)
+        # Read more, the bytes before the candidate (or all but the last two bytes without one) are dropped
+        keep = min(starts) - 1 if starts else max(len(buf) - 2, 0)
+        pos += keep
+        buf = buf[keep:]
+        k = 1
+        block = data_file.read(window)
+        final = len(block) < window
+        buf += block
+
+def parse_ublox_chunk(file_path, start, stop, default_date, block_size=1<<22):
+    """
+    Parse the part of a UBX file between two byte offsets (used by the parallel mode of process_ublox_data)
+
+    Both offsets are moved to the beginning of the next line holding a valid NMEA sentence (see resync_ublox),
+    so consecutive chunks share their boundary. The chunk is parsed without knowing the time and position
+    of the previous chunk, the part before the first message setting them (the head) is returned unparsed
+    and is parsed when the chunks are merged
+
+    Outputs:
+    head: Bytes of the chunk before the first message setting the time and position
+    arrays: List of structured arrays with the observations following the head
+    state: Time and position at the end of the chunk, None if the chunk does not set them
+    counts: Numbers of rejected sentences of the chunk and parse errors following the head
+    """
+    with open(file_path, 'rb') as data_file:
+        start = resync_ublox(data_file, start)
+        stop = resync_ublox(data_file, stop)
+
+        state = new_ublox_state()
+        records = new_ublox_records()
+        head_len = None
+        leftover = b''
+        buf_pos = start # file offset of the beginning of buf
+        data_file.seek(start)
+        remaining = stop - start
+        while True:
+            block = data_file.read(min(block_size, remaining))
+            remaining -= len(block)
+            buf = leftover + block
+
+            cut, first_fix = parse_ublox_block(buf, state, default_date, records, final=not block)
+            if head_len is None and first_fix is not None:
+                head_len = buf_pos + first_fix - start
+            leftover = buf[cut:]
+            buf_pos += cut
+
+            if not block:
+                break
+
+        if head_len is None:
+            head_len = stop - start
+            state = None
+        data_file.seek(start)
+        head = data_file.read(head_len)
+    # The parse errors of the head are counted when the head is parsed again with the state of the previous
+    # chunk (see read_ublox_data_parallel), they are left out of the errors of the chunk
+    head_records = new_ublox_records(1)
+    if state is not None:
+        parse_ublox_block(head, new_ublox_state(), default_date, head_records, final=True)
+    else:
+        head_records['errors'] = records['errors']
+    counts = {'rejected': records['rejected'], 'errors': records['errors'] - head_records['errors']}
+    return head, take_ublox_records(records), state, counts
+
+def read_ublox_data_parallel(file_path, default_date, workers=None, chunk_size=1<<26, stats=None):
+    """
+    Generator that parses a UBX file with a pool of processes and yields structured arrays of UBLOX_DTYPE
+
+    The file is split in chunks of chunk_size bytes parsed by parse_ublox_chunk in parallel. The chunks are
+    merged in order: the head of every chunk is parsed with the time and position of the end of the
+    previous chunk, so the observations are identical to the ones of read_ublox_data
+    At most two chunks per worker are parsed ahead of the one being merged
+    The numbers of rejected sentences and parse errors are added to stats (if given)
+    """
+    size = os.path.getsize(file_path)
+    workers = workers or os.cpu_count()
+    bounds = list(range(0, size, chunk_size)) + [size]
+    chunks = list(zip(bounds[:-1], bounds[1:]))
+
+    state = new_ublox_state()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        next_chunk = 0
+        while pending or next_chunk < len(chunks):
+            while next_chunk < len(chunks) and len(pending) < 2*workers:
+                start, stop = chunks[next_chunk]
+                pending.append(executor.submit(parse_ublox_chunk, file_path, start, stop, default_date))
+                next_chunk += 1
+            head, arrays, chunk_state, counts = pending.pop(0).result()
+            add_ublox_stats(stats, counts)
+
+            # The head of the chunk continues the previous chunk
+            # (its sentences were checked in the chunk, its parse errors are only counted here)
+            if head:
+                records = new_ublox_records()
+                parse_ublox_block(head, state, default_date, records, final=True)
+                add_ublox_stats(stats, {'rejected': 0, 'errors': records['errors']})
+                yield from take_ublox_records(records)
+            for arr in arrays:
+                yield arr
+            if chunk_state is not None:
+                state = chunk_state
+
+def ublox_batches(file_path, def_date, batch_size=100000, workers=1, stats=None):
+    """
+    Read a UBX file as batches of observations, with a pool of processes if workers > 1
+    The numbers of rejected sentences and parse errors are added to stats (if given) once the batches are read
+    """
+    # Attempts to get a default date from the file path
+    # the file path should be in the format: D:\GNSSR\USDA-NF-Ublox\2020\2020-06-15_12_inch_plate\Ublox_data
+    # where the date is the 4th element in the path
+    # If it fails, it will ask the user to input a date
+    try:
+        default_date = datetime.strptime(file_path.split("\\")[4][:10], '%Y-%m-%d')
+    except:
+        # inp = input('Enter a date of the flight in the format YYYY-MM-DD (e.g. 2021-04-27): ')
+        inp = def_date
+        default_date = datetime.strptime(inp, '%Y-%m-%d')
+
+    if workers > 1:
+        batches = read_ublox_data_parallel(file_path, default_date, workers, stats=stats)
+    else:
+        batches = read_ublox_data(file_path, default_date, batch_size, stats=stats)
+    return batches
+
+def load_ublox_data(file_path, def_date, batch_size=100000, workers=1, stats=None):
+    """
+    Read a UBX file into one array of observations (UBLOX_DTYPE) without writing it to a file
+    """
+    batches = ublox_batches(file_path, def_date, batch_size, workers, stats=stats)
+    return np.concatenate([np.empty(0, dtype=UBLOX_DTYPE)] + list(batches))
+
+def process_ublox_data(file_path, def_date, out_dir, batch_size=100000, workers=1, compression='gzip'):
+    """
+    Function to read a UBX file and extract the data
+    The UBX file should be containing NMEA messages (GNRMC, GNGGA, GPGSV, GLGSV, etc.)
+
+    The observations are stored in a HDF5 file with the following columns:
+    time, lat, long, const, prn, band, ele, az, C_N0
+
+    Each row represents a satellite visible at a given time
+
+    The file is parsed as it is read and the observations are written to the output in batches
+    of batch_size rows, so logs of any length can be processed with a constant amount of memory
+    With workers > 1 the file is parsed by a pool of processes (see read_ublox_data_parallel)
+    The output is compressed with the given filter ('gzip', 'lzf' or None)
+    """
+
+    file_name = file_path.split('/')[-1].split('.')[0]
+    with stage('process_ublox_data', file=file_path, workers=workers) as m:
+        stats = {'rejected': 0, 'errors': 0}
+        batches = ublox_batches(file_path, def_date, batch_size, workers, stats=stats)
+        m['bytes_in'] = os.path.getsize(file_path)
+        m['rows_out'] = 0
+        with h5py.File(f"{out_dir}/{file_name}_ublox.h5", 'w') as f:
+            # Resizable dataset, every batch is appended at the end
+            dset = create_table(f, f"{file_name}_ublox", UBLOX_DTYPE, UBLOX_COLUMNS, compression=compression,
+                                attrs={'file_name': file_name})
+            while True:
+                with step(m, 'parse'):
+                    struct_arr = next(batches, None)
+                if struct_arr is None:
+                    break
+                with step(m, 'write'):
+                    append_rows(dset, struct_arr)
+                m['rows_out'] += len(struct_arr)
+        m.update(stats)
+    print("Done Reading: "+ file_path)
+    print(f"Output: {out_dir}/{file_name}_ublox.h5")
 
 if __name__ == "__main__":
     # Check if the correct number of arguments is provided
-    if len(sys.argv) != 4:
-        print("Usage: python process_ublox_data.py <input_gpx_file_location> <data collection date>")
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python process_ublox_data.py <input_gpx_file_location> <data collection date> <output_folder_location> [number of processes]")
         sys.exit(1)
 
     # Get the file location from the command line argument
     input_file_location = sys.argv[1]
     def_date = sys.argv[2]
     out_dir = sys.argv[3]
+    workers = int(sys.argv[4]) if len(sys.argv) == 5 else 1
 
     # Create the file
-    process_ublox_data(input_file_location, def_date, out_dir)
\ No newline at end of file
+    process_ublox_data(input_file_location, def_date, out_dir, workers=workers)
@@ -0,0 +1,125 @@
+import os
+import sys
+import h5py
+import numpy as np
+from numpy.lib.recfunctions import repack_fields
+from functions.h5_storage import table_name, write_table, table_columns
+from functions.spatial_index import overlapping, chunk_ranges, point_in_polygon
+from functions.metrics import stage, step
+
+
+def find_SP_files(paths):
+    """
+    SP files of a list of files and folders, the folders are searched for *_SP.h5 files
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, file_names in os.walk(path):
+                files += sorted(f"{root}/{file_name}".replace('\\', '/') for file_name in file_names
+                                if file_name.endswith('_SP.h5'))
+        else:
+            files.append(path)
+    return files
+
+
+def query_SP_file(sp_file, bbox=None, time_range=None, polygon=None, columns=None, lat='SP_lat', lon='SP_lon'):
+    """
+    This function reads the rows of a SP file whose point is inside a region during a time range
+    With the spatial index of the file (see functions.spatial_index) only the chunks holding runs of rows
+    overlapping the query are read, every chunk once. Files without index are read whole
+
+    Inputs:
+    sp_file: Location of the SP file
+    bbox: (south, west, north, east) in degrees, None for no bounding box
+    time_range: (start, stop) epoch times in seconds, both included, None for all the times
+    polygon: (M, 2) latitude, longitude of the vertices of a field boundary, None for no polygon
+    columns: Names of the columns to return, by default all the columns
+
+    Outputs:
+    data: Structured array with the matching rows, in the order of the file
+    """
+    if polygon is not None:
+        polygon = np.asarray(polygon, dtype=np.float64)
+        poly_box = (polygon[:, 0].min(), polygon[:, 1].min(), polygon[:, 0].max(), polygon[:, 1].max())
+        bbox = poly_box if bbox is None else (max(bbox[0], poly_box[0]), max(bbox[1], poly_box[1]),
+                                              min(bbox[2], poly_box[2]), min(bbox[3], poly_box[3]))
+
+    name = table_name(sp_file)
+    with h5py.File(sp_file, 'r') as f:
+        dset = f[name]
+        names = table_columns(dset)
+        read_columns = names if columns is None else list(dict.fromkeys(list(columns) + ['time', lat, lon]))
+        view = dset.fields(read_columns)
+
+        if f'{name}_spatial' in f:
+            spatial = f[f'{name}_spatial']
+            if not overlapping(spatial.attrs, bbox, time_range):
+                data = view[0:0]
+            else:
+                runs = spatial[:]
+                runs = runs[overlapping(runs, bbox, time_range)]
+                starts, stops = chunk_ranges(runs['start'], runs['stop'], dset.chunks[0] if dset.chunks else None)
+                parts = [view[start:min(stop, len(dset))] for start, stop in zip(starts, stops)]
+                data = np.concatenate(parts) if parts else view[0:0]
+        else:
+            data = view[:]
+
+    # Exact test of the rows read
+    keep = np.isfinite(data[lat]) & np.isfinite(data[lon])
+    if bbox is not None:
+        south, west, north, east = bbox
+        keep &= (data[lat] >= south) & (data[lat] <= north) & (data[lon] >= west) & (data[lon] <= east)
+    if time_range is not None:
+        start, stop = time_range
+        if start is not None:
+            keep &= data['time'] >= start
+        if stop is not None:
+            keep &= data['time'] <= stop
+    if polygon is not None:
+        keep[keep] = point_in_polygon(data[lat][keep], data[lon][keep], polygon)
+    data = data[keep]
+    return data if columns is None else repack_fields(data[list(columns)])
+
+
+def query_SP(paths, bbox=None, time_range=None, polygon=None, columns=None):
+    """
+    This function finds the SP observations inside a region during a time range across many SP files
+
+    Inputs:
+    paths: SP files and folders holding SP files (e.g. the output folders of a campaign)
+    bbox, time_range, polygon, columns: See query_SP_file
+
+    Outputs:
+    data: Structured array with the matching rows of all the files
+    sources: Index in files of the file of every row
+    files: Locations of the SP files searched
+    """
+    files = find_SP_files(paths)
+    results = []
+    with stage('query_SP', files=len(files)) as m:
+        for sp_file in files:
+            with step(m, 'read'):
+                results.append(query_SP_file(sp_file, bbox, time_range, polygon, columns))
+        sources = np.repeat(np.arange(len(files)), [len(result) for result in results])
+        data = np.concatenate(results) if results else np.empty(0)
+        m['rows_out'] = len(data)
+    return data, sources, files
+
+
+if __name__ == "__main__":
+    # Check if the correct number of arguments is provided
+    if len(sys.argv) < 7:
+        print("Usage: python query_SP.py <south> <west> <north> <east> <output_file_location> <SP_file_or_folder> [SP_file_or_folder ...]")
+        sys.exit(1)
+
+    bbox = tuple(float(value) for value in sys.argv[1:5])
+    data, sources, files = query_SP(sys.argv[6:], bbox=bbox)
+    if len(files) == 0:
+        print("No SP file found")
+        sys.exit(1)
+    output_file = sys.argv[5]
+    write_table(output_file, table_name(output_file), data, data.dtype.names,
+                attrs={'sources': [table_name(files[i]) for i in np.unique(sources)]})
+    print(f"Found {len(data)} observations in {len(np.unique(sources))} of {len(files)} SP files")
+    print(f"Output: {output_file}")
@@ -0,0 +1,174 @@
+from run_pipeline import run_pipeline
+from functions.dem import dem_hash
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import inspect
+import json
+import os
+import re
+import sys
+import time
+
+DATE_IN_PATH = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+def flight_name(file_path):
+    """
+    Name of the flight of a log file, e.g. sample for .../sample.log.gpx and .../sample.ubx
+    """
+    return os.path.basename(file_path).split('.')[0]
+
+def find_flights(raw_dir):
+    """
+    This function finds the flights with a flight log and a UBX log, matched by file name:
+    <raw_dir>/flightlog/<name>*.gpx and <raw_dir>/ublox/<name>*.ubx
+
+    Outputs:
+    flights: Sorted list of (name, gpx file, ubx file), the file is None if a log is missing
+    """
+    logs = {}
+    for folder, extension, i in (('flightlog', '.gpx', 0), ('ublox', '.ubx', 1)):
+        folder = os.path.join(raw_dir, folder)
+        if not os.path.isdir(folder):
+            continue
+        for file_name in os.listdir(folder):
+            if file_name.lower().endswith(extension):
+                logs.setdefault(flight_name(file_name), [None, None])[i] = os.path.join(folder, file_name).replace('\\', '/')
+    return [(name, gpx, ubx) for name, (gpx, ubx) in sorted(logs.items())]
+
+# Parameters of run_pipeline changing the outputs of a flight
+OUTPUT_PARAMS = ('method', 'tolerance', 'hgrnd', 'n', 'freq', 'kmz', 'dem')
+
+def run_params(def_date, params):
+    """
+    Parameters of the run of a flight as recorded in the manifest, the missing ones take the defaults of run_pipeline
+    A DEM is recorded with its fingerprint too, so rewriting it runs the flights again
+    """
+    defaults = inspect.signature(run_pipeline).parameters
+    recorded = {key: params.get(key, defaults[key].default) for key in OUTPUT_PARAMS}
+    recorded['def_date'] = def_date
+    if recorded['dem'] is not None:
+        recorded['dem_hash'] = dem_hash(recorded['dem'])
+    return json.loads(json.dumps(recorded, default=str))
+
+def is_up_to_date(entry, gpx, ubx, params):
+    """
+    A flight is up to date if its last run succeeded with the same parameters (see run_params),
+    all its outputs exist and they are newer than both logs
+    """
+    if not entry or entry.get('status') not in ('ok', 'skipped') or not entry.get('outputs'):
+        return False
+    if entry.get('params') != params:
+        return False
+    newest_input = max(os.path.getmtime(gpx), os.path.getmtime(ubx))
+    return all(os.path.exists(output) and os.path.getmtime(output) >= newest_input for output in entry['outputs'])
+
+def run_flight(name, gpx, ubx, def_date, out_dir, params):
+    """
+    Run the pipeline for one flight, the errors are returned in the manifest entry instead of being raised
+    """
+    start = time.perf_counter()
+    entry = {'name': name, 'flightlog': gpx, 'ublox': ubx, 'params': run_params(def_date, params)}
+    try:
+        outputs = run_pipeline(gpx, ubx, def_date, out_dir, **params)
+        entry['status'] = 'ok' if outputs is not None else 'error'
+        entry['outputs'] = [f"{out_dir}/{name}_SP.h5"] + (outputs or [])
+    except Exception as e: # If there is an error, record it and continue with the next flight
+        entry['status'] = 'error'
+        entry['error'] = f"{type(e).__name__}: {e}"
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    return entry
+
+def run_campaign(raw_dir, def_date, out_dir, workers=None, force=False, **params):
+    """
+    This function runs the pipeline for every flight found in a raw data folder with a pool of processes
+
+    Inputs:
+    raw_dir: Folder with the flightlog and ublox folders (e.g. data/raw)
+    def_date: Date of the flights (YYYY-MM-DD), the date in the path of a log is used when there is one
+    out_dir: Output folder
+    workers: Number of processes, by default the number of cores
+    force: Run the flights that are up to date too
+    params: Parameters passed to run_pipeline (method, tolerance, hgrnd, n, freq, kmz, dem)
+
+    Outputs:
+    <out_dir>/manifest.json with the status, parameters, run time and outputs of every flight
+    A flight is skipped when its outputs are newer than its logs and were written with the same parameters
+    A worker that dies (e.g. killed when out of memory) fails the flights queued in the pool with it,
+    the next flights run in a new pool
+    Returns the manifest
+    """
+    workers = workers or os.cpu_count()
+    manifest_path = f"{out_dir}/manifest.json"
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = {entry['name']: entry for entry in json.load(f)['flights']}
+
+    start = time.perf_counter()
+    started = datetime.now().isoformat(timespec='seconds')
+    entries = []
+    jobs = []
+    for name, gpx, ubx in find_flights(raw_dir):
+        if gpx is None or ubx is None:
+            entries.append({'name': name, 'flightlog': gpx, 'ublox': ubx, 'status': 'missing log'})
+            continue
+        match = DATE_IN_PATH.search(ubx)
+        flight_date = match.group(1) if match else def_date
+        if not force and is_up_to_date(previous.get(name), gpx, ubx, run_params(flight_date, params)):
+            # The entry keeps the run time of the run that wrote the outputs
+            entries.append(dict(previous[name], status='skipped'))
+            print(f"{name}: up to date")
+        else:
+            jobs.append((name, gpx, ubx, flight_date))
+
+    # At most two flights per worker are queued at a time
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {}
+        next_job = 0
+        while pending or next_job < len(jobs):
+            while next_job < len(jobs) and len(pending) < 2*workers:
+                try:
+                    future = executor.submit(run_flight, *jobs[next_job], out_dir, params)
+                except BrokenProcessPool:
+                    break # Submitted again to the new pool
+                pending[future] = jobs[next_job]
+                next_job += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = any(isinstance(future.exception(), BrokenProcessPool) for future in done)
+            if broken:
+                # A worker died (e.g. killed when out of memory), every flight queued in the pool ends at once
+                done, _ = wait(pending)
+            for future in done:
+                name, gpx, ubx, flight_date = pending.pop(future)
+                try:
+                    entry = future.result()
+                except BrokenProcessPool as e:
+                    entry = {'name': name, 'flightlog': gpx, 'ublox': ubx, 'params': run_params(flight_date, params),
+                             'status': 'error', 'error': f"{type(e).__name__}: {e}", 'seconds': None}
+                print(f"{entry['name']}: {entry['status']} ({entry['seconds']} s)")
+                entries.append(entry)
+            if broken:
+                # The next flights run in a new pool
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        executor.shutdown()
+
+    manifest = {'started': started, 'raw_dir': raw_dir, 'out_dir': out_dir, 'workers': workers,
+                'seconds': round(time.perf_counter() - start, 3),
+                'flights': sorted(entries, key=lambda entry: entry['name'])}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Output: {manifest_path}")
+    return manifest
+
+if __name__ == "__main__":
+    # Check if the correct number of arguments is provided
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python run_campaign.py <raw_data_folder> <data collection date> <output_folder_location> [number of processes]")
+        sys.exit(1)
+
+    workers = int(sys.argv[4]) if len(sys.argv) == 5 else None
+    run_campaign(sys.argv[1], sys.argv[2], sys.argv[3], workers=workers)
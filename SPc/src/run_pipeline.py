@@ -0,0 +1,127 @@
+from functions.stage_cache import file_hash, stage_key, load_cached, save_cached, cached_outputs, save_outputs, \
+    prune_cache, CACHE_MAX_BYTES
+from functions.h5_storage import group_index
+from process_flightlog import read_flightlog
+from process_ublox_data import load_ublox_data
+from calculate_SP import compute_SP, write_SP, SP_INDEX_KEYS
+from calculate_FZone_KML import fan_out_FZone_KML, remove_stale_KML
+from functions.metrics import stage, step
+from functions.dem import dem_hash
+import os
+import sys
+
+def run_pipeline(flightlog_path, ublox_path, def_date, out_dir, method='exact', tolerance=0.0, hgrnd=80, n=1,
+                 freq=1575.42*1e6, kmz=False, workers=1, cache_dir=None, compression='gzip', dem=None,
+                 cache_size=CACHE_MAX_BYTES):
+    """
+    This function runs all the stages, from the flight log and the UBX log to the KML files of every signal
+    The arrays are passed from one stage to the next in memory
+
+    The output of every stage is cached under a hash of its inputs and parameters, so running the pipeline again
+    only recomputes the stages whose inputs or parameters changed, e.g. changing n or freq only writes the KML files again
+
+    Inputs:
+    flightlog_path: Location of the gpx file
+    ublox_path: Location of the UBX file
+    def_date: Date of the flight (YYYY-MM-DD), used until the date is read from the UBX file
+    out_dir: Output folder
+    method, tolerance: Join of the observations with the flight log (see calculate_SP)
+    hgrnd: Height of the ground above the sea level
+    n: Number of Fresnel Zone
+    freq: Frequency of the signal
+    kmz: True to write compressed .kmz files instead of .kml files
+    workers: Number of processes used to read the UBX file and write the KML files
+    cache_dir: Folder of the cached stage outputs, by default <out_dir>/.cache
+    cache_size: Largest size of the cache folder (bytes), the least recently used outputs of other runs are removed
+                past it (None to keep them all)
+    dem: Folder of a DEM tile set (see functions.dem), None for a flat ground at hgrnd
+
+    Outputs:
+    <name>_SP.h5 and the KML files of every signal, returns the locations of the KML files
+    The KML files of the flight left by earlier runs that are not outputs of this run are removed
+    With the metrics enabled (see functions.metrics) the record of the run lists the stages read from the cache
+    """
+    if cache_dir is None:
+        cache_dir = f"{out_dir}/.cache"
+    for path in (flightlog_path, ublox_path):
+        if not os.path.exists(path):
+            print ('File does not exist:', path)
+            return None
+    name = flightlog_path.replace('\\', '/').split('/')[-1].split('.')[0]
+
+    with stage('run_pipeline', file=flightlog_path, method=method, workers=workers) as m:
+        m['cached'] = []
+
+        # Flight log
+        track_key = stage_key('flightlog', [file_hash(flightlog_path)], {})
+        track = load_cached(cache_dir, track_key)
+        if track is None:
+            with step(m, 'flightlog'):
+                track = read_flightlog(flightlog_path)
+            save_cached(cache_dir, track_key, track)
+            print("Done Reading: " + flightlog_path)
+        else:
+            m['cached'].append('flightlog')
+
+        # UBX observations
+        ubx_key = stage_key('ublox', [file_hash(ublox_path)], {'def_date': def_date})
+        ubx_data = load_cached(cache_dir, ubx_key)
+        if ubx_data is None:
+            stats = {'rejected': 0, 'errors': 0}
+            with step(m, 'ublox'):
+                ubx_data = load_ublox_data(ublox_path, def_date, workers=workers, stats=stats)
+            m.update(stats)
+            save_cached(cache_dir, ubx_key, ubx_data)
+            print("Done Reading: " + ublox_path)
+        else:
+            m['cached'].append('ublox')
+        m['rows_in'] = len(ubx_data)
+
+        # Specular points
+        # The DEM is part of the parameters of the SP and FZ stages only when there is one
+        terrain = {'dem': dem, 'dem_hash': dem_hash(dem)} if dem is not None else {}
+        sp_key = stage_key('SP', [track_key, ubx_key], {'method': method, 'tolerance': tolerance, 'hgrnd': hgrnd,
+                                                        **terrain})
+        sp_data = load_cached(cache_dir, sp_key)
+        sp_file = f"{out_dir}/{name}_SP.h5"
+        if sp_data is None:
+            sp_data = compute_SP(track, ubx_data, method=method, tolerance=tolerance, hgrnd=hgrnd, metrics=m,
+                                 dem=dem)
+            save_cached(cache_dir, sp_key, sp_data)
+            with step(m, 'write_SP'):
+                write_SP(sp_data, sp_file, f"{name}_SP", compression=compression)
+            print(f"Output: {sp_file}")
+        else:
+            # The name of the SP file does not hold the parameters, so it is written again from the cache
+            m['cached'].append('SP')
+            with step(m, 'write_SP'):
+                write_SP(sp_data, sp_file, f"{name}_SP", compression=compression)
+            print(f"Output: {sp_file}")
+        m['rows_out'] = len(sp_data)
+
+        # Fresnel Zones
+        fz_key = stage_key('FZ', [sp_key], {'hgrnd': hgrnd, 'n': n, 'freq': freq, 'kmz': kmz, 'out_dir': out_dir,
+                                            **terrain})
+        output_files = cached_outputs(cache_dir, fz_key)
+        if output_files is None:
+            index = group_index(sp_data, SP_INDEX_KEYS)
+            with step(m, 'FZ'):
+                output_files = fan_out_FZone_KML(sp_data, index, f"{name}_SP", out_dir, workers=workers, kmz=kmz,
+                                                 hgrnd=hgrnd, n=n, freq=freq, dem=dem)
+            save_outputs(cache_dir, fz_key, output_files)
+        else:
+            m['cached'].append('FZ')
+        # The KML files of an earlier run that are not outputs of this one (e.g. signals no longer in the SP file)
+        for stale_file in remove_stale_KML(out_dir, f"{name}_SP", output_files):
+            print(f"Removed: {stale_file}")
+        prune_cache(cache_dir, cache_size, keep=[track_key, ubx_key, sp_key, fz_key])
+    return output_files
+
+if __name__ == "__main__":
+    # Check if the correct number of arguments is provided
+    if len(sys.argv) not in (5, 6):
+        print("Usage: python run_pipeline.py <input_gpx_file_location> <input_ublox_file_location> <data collection date> <output_folder_location> [number of processes]")
+        sys.exit(1)
+
+    workers = int(sys.argv[5]) if len(sys.argv) == 6 else 1
+    run_pipeline(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], workers=workers)
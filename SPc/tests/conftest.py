@@ -0,0 +1,9 @@
+import os
+import sys
+
+SPC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The tests import the modules of src the way the scripts do (e.g. from functions.grid import ...),
+# and the synthetic flights of the benchmarks
+sys.path.insert(0, os.path.join(SPC_DIR, 'src'))
+sys.path.insert(0, os.path.join(SPC_DIR, 'benchmarks'))
@@ -0,0 +1,33 @@
+import numpy as np
+from calculate_SP import SP_DTYPE
+from calculate_FZone_KML import fan_out_FZone_KML, has_fresnel_zone
+from functions.h5_storage import group_index
+
+
+def sp_rows(const, prn, n, ele=30.0):
+    rows = np.zeros(n, dtype=SP_DTYPE)
+    rows['time'] = 1619517600 + np.arange(n)
+    rows['fl_lat'], rows['fl_lon'], rows['fl_alt'] = 41.0, 2.0, 150.0
+    rows['const'], rows['prn'], rows['band'] = const, prn, b'L1'
+    rows['ele'], rows['az'] = ele, 120.0
+    rows['SP_lat'], rows['SP_lon'] = 41.0005, 2.0005
+    return rows
+
+
+def test_rows_without_geometry_are_skipped(tmp_path):
+    gps = sp_rows(b'GP', 2, 6)
+    gps['ele'][1] = np.nan # GSV satellite without elevation
+    gps['ele'][2] = 0.0
+    gps['SP_lat'][3] = np.nan
+    gps['az'][4] = np.nan
+    # RXM-RAWX observations have no elevation at all
+    galileo = sp_rows(b'GA', 12, 4, ele=np.nan)
+    galileo['SP_lat'] = galileo['SP_lon'] = np.nan
+    sp_data = np.concatenate([galileo, gps])
+    assert has_fresnel_zone(sp_data).tolist() == [False]*4 + [True, False, False, False, False, True]
+
+    files = fan_out_FZone_KML(sp_data, group_index(sp_data, ['const', 'prn', 'band']), 'flight', str(tmp_path))
+    assert files == [f"{tmp_path}/flight_GP02_L1_FZ.kml"]
+    text = open(files[0]).read()
+    assert 'nan' not in text.lower()
+    assert text.count('<Point') == 2
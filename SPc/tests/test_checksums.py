@@ -0,0 +1,61 @@
+import numpy as np
+from functions.NMEA_parser import gps_chksum, gps_chksum_batch
+from functions.UBX_parser import ubx_chksum, find_ubx_frames, UBX_NAV_PVT
+from ubx_logs import ubx_frame, nmea_sentence, ubx_log
+
+
+def fletcher(frame):
+    ck_a = ck_b = 0
+    for b in frame:
+        ck_a = (ck_a + b) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    return ck_a, ck_b
+
+
+def test_batch_checksum_matches_gps_chksum():
+    rng = np.random.default_rng(0)
+    lines = []
+    for i in range(300):
+        line = nmea_sentence(f"GPGSV,3,{i % 3 + 1},12,{i % 32:02d},{rng.integers(90)},{rng.integers(360)},"
+                             f"{rng.integers(50)}")
+        kind = i % 5
+        if kind == 1: # Corrupted message
+            line = line.replace(b',', b';', 1)
+        elif kind == 2: # Corrupted checksum
+            line = line[:-3] + b'Z\r\n'
+        elif kind == 3: # Lower case checksum and leading garbage
+            line = b'\x00xx' + line[:-4] + line[-4:-2].lower() + b'\r\n'
+        elif kind == 4: # Truncated checksum
+            line = line[:-3] + b'\r\n'
+        lines.append(line)
+    buf = b''.join(lines)
+    passed, starts, ends = gps_chksum_batch(buf)
+    assert len(passed) == len(lines)
+    expected = [gps_chksum(buf[start:end].decode())[1] for start, end in zip(starts, ends)]
+    assert passed.tolist() == expected
+    assert passed.sum() == 120
+
+
+def test_batch_checksum_rejects_non_ascii():
+    line = nmea_sentence("GPTXT,01,01,02,café")
+    assert gps_chksum_batch(line)[0].tolist() == [False]
+
+
+def test_ubx_chksum_is_fletcher():
+    rng = np.random.default_rng(1)
+    for n in (0, 1, 4, 92, 1000):
+        frame = rng.integers(0, 256, n, dtype=np.uint8).tobytes()
+        assert ubx_chksum(frame) == fletcher(frame)
+
+
+def test_find_ubx_frames_skips_corrupted_frames():
+    log = ubx_log(20)
+    frames, incomplete = find_ubx_frames(log)
+    assert incomplete is None
+    bad = bytearray(log)
+    bad[frames[3][0] + 10] ^= 0xFF
+    bad_frames, _ = find_ubx_frames(bytes(bad))
+    assert bad_frames == frames[:3] + frames[4:]
+    # A frame cut at the end of a block is reported when more data follows
+    frame = ubx_frame(UBX_NAV_PVT, bytes(92))
+    assert find_ubx_frames(log + frame[:20], final=False) == (frames, len(log))
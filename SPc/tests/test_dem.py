@@ -0,0 +1,41 @@
+import os
+import numpy as np
+from functions.dem import write_dem, open_dem, dem_height, dem_hash
+
+
+def write_flat(dem_dir, height, north=41.0):
+    write_dem(dem_dir, np.full((9, 9), height), north, 2.0, 0.01, 0.01, tile_size=4)
+
+
+def test_heights_across_tiles(tmp_path):
+    # A plane rising to the east, interpolated exactly by the bilinear interpolation
+    heights = np.tile(np.arange(9, dtype=float)*10, (9, 1))
+    write_dem(str(tmp_path), heights, 41.0, 2.0, 0.01, 0.01, tile_size=4)
+    lat = np.array([40.995, 40.93, 40.97, 41.5])
+    lon = np.array([2.005, 2.045, 2.075, 2.01])
+    height = dem_height(str(tmp_path), lat, lon)
+    assert np.allclose(height[:3], [5, 45, 75])
+    assert np.isnan(height[3])
+
+
+def test_rewritten_dem_is_reopened(tmp_path):
+    dem_dir = str(tmp_path)
+    write_flat(dem_dir, 100)
+    assert np.allclose(dem_height(dem_dir, [40.97], [2.03]), 100)
+    assert open_dem(dem_dir) is open_dem(dem_dir)
+    # Moved north, the cached description of the DEM would put the point outside of it
+    write_flat(dem_dir, 250, north=41.05)
+    assert np.allclose(dem_height(dem_dir, [41.02], [2.03]), 250)
+
+
+def test_hash_follows_the_tiles(tmp_path):
+    dem_dir = str(tmp_path)
+    write_flat(dem_dir, 100)
+    first = dem_hash(dem_dir)
+    assert dem_hash(dem_dir + '/') == first
+    # Only a tile changes, dem.json is the same
+    path = f"{dem_dir}/tile_0001_0001.npy"
+    mtime = os.stat(path).st_mtime_ns
+    np.save(path, np.full((5, 5), 100.0, dtype=np.float32))
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+    assert dem_hash(dem_dir) != first
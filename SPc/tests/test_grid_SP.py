@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from calculate_SP import SP_DTYPE, write_SP
+from grid_SP import grid_SP, merge_grid_files, read_grid
+
+
+def write_flight(sp_file, seed):
+    rng = np.random.default_rng(seed)
+    rows = np.zeros(200, dtype=SP_DTYPE)
+    rows['const'], rows['prn'], rows['band'] = b'GP', 2, b'L1'
+    rows['time'] = 1619517600 + np.arange(len(rows))
+    rows['SP_lat'] = 33.47 + rng.uniform(0, 0.01, len(rows))
+    rows['SP_lon'] = -88.77 + rng.uniform(0, 0.01, len(rows))
+    rows['C_N0'] = rng.integers(20, 50, len(rows))
+    write_SP(rows, sp_file, sp_file.split('/')[-1][:-3], compression=None)
+    return sp_file
+
+
+def test_merge_grid_files(tmp_path):
+    flights = [write_flight(f"{tmp_path}/flight{i}_SP.h5", i) for i in range(3)]
+    grid_SP(flights[:2], f"{tmp_path}/a.h5", cell_size=0.001)
+    grid_SP(flights[2:], f"{tmp_path}/b.h5", cell_size=0.001)
+    grid_SP(flights, f"{tmp_path}/all.h5", cell_size=0.001)
+    merge_grid_files([f"{tmp_path}/a.h5", f"{tmp_path}/b.h5"], f"{tmp_path}/merged.h5")
+    merged, info = read_grid(f"{tmp_path}/merged.h5")
+    expected, expected_info = read_grid(f"{tmp_path}/all.h5")
+    assert info['sources'] == expected_info['sources']
+    assert merged['C_N0_count'].sum() == 600
+    assert np.array_equal(merged['C_N0_count'], expected['C_N0_count'])
+    assert np.allclose(merged['C_N0_sum'], expected['C_N0_sum'])
+
+
+def test_merge_refuses_shared_flights(tmp_path):
+    flights = [write_flight(f"{tmp_path}/flight{i}_SP.h5", i) for i in range(3)]
+    grid_SP(flights[:2], f"{tmp_path}/a.h5", cell_size=0.001)
+    grid_SP(flights[1:], f"{tmp_path}/b.h5", cell_size=0.001)
+    with pytest.raises(ValueError, match="flight1_SP"):
+        merge_grid_files([f"{tmp_path}/a.h5", f"{tmp_path}/b.h5"], f"{tmp_path}/merged.h5")
@@ -0,0 +1,27 @@
+import io
+import json
+import asyncio
+from generate_data import generate_flight
+from live_SP import live_SP, write_json_line
+from ubx_logs import nmea_sentence
+
+
+def strict_constant(name):
+    raise ValueError(f"{name} is not JSON")
+
+
+def test_live_records_are_strict_json(tmp_path):
+    gpx, ubx = generate_flight(str(tmp_path), 300)
+    # A GSV satellite without elevation and azimuth, at the time of the last epoch of the log
+    with open(ubx, 'ab') as f:
+        f.write(nmea_sentence("GPGSV,1,1,01,07,,,35,1"))
+
+    out = io.StringIO()
+    stats = asyncio.run(live_SP(ubx, gpx, '2021-04-27', emit=lambda record: write_json_line(record, out),
+                                poll=0.01, idle_timeout=0.1))
+    records = [json.loads(line, parse_constant=strict_constant) for line in out.getvalue().splitlines()]
+    assert len(records) == stats['emitted'] > 0
+    without_el = [record for record in records if record['prn'] == 7 and record['ele'] is None]
+    assert without_el and all(record['fz'] is None and record['SP_lat'] is None for record in without_el)
+    with_fz = [record for record in records if record['fz'] is not None]
+    assert with_fz and all(record['ele'] for record in with_fz)
@@ -0,0 +1,32 @@
+import calendar
+import numpy as np
+from process_flightlog import parse_gpx_time, read_flightlog
+
+T0 = calendar.timegm((2021, 4, 27, 21, 41, 39))
+
+GPX = """<gpx creator="Mission Planner" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>
+<trkpt lat="33.4733643" lon="-88.7737587"><ele>101.5</ele><time>2021-04-27T16:41:39-05:00</time><course>90</course><roll>1.5</roll><pitch>-0.5</pitch></trkpt>
+<trkpt lat="33.4733650" lon="-88.7737500"><ele>102.0</ele><time>2021-04-27T16:41:39.6-05:00</time><course>91</course></trkpt>
+<trkpt lat="33.4733660" lon="-88.7737400"><ele>102.5</ele><time>2021-04-27T21:41:40.25Z</time><course>92</course><roll>0.5</roll><pitch>0.5</pitch></trkpt>
+</trkseg></trk></gpx>"""
+
+
+def test_parse_gpx_time():
+    assert parse_gpx_time("2021-04-27T21:41:39Z") == T0
+    assert parse_gpx_time("2021-04-27T16:41:39-05:00") == T0
+    assert parse_gpx_time("2021-04-27 23:41:39+0200") == T0
+    assert parse_gpx_time("2021-04-27T21:41:39") == T0
+    # The fractional seconds are kept, the exact join rounds them to the nearest second
+    assert parse_gpx_time("2021-04-27T21:41:51.6Z") == T0 + 12.6
+    assert np.round(parse_gpx_time("2021-04-27T21:41:51.6Z")) == T0 + 13
+
+
+def test_read_flightlog(tmp_path):
+    gpx_file = tmp_path / "flight.gpx"
+    gpx_file.write_text(GPX)
+    track = read_flightlog(str(gpx_file), initial_rows=1)
+    np.testing.assert_allclose(track[:, 0], [T0, T0 + 0.6, T0 + 1.25])
+    np.testing.assert_allclose(track[:, 3], [101.5, 102.0, 102.5])
+    # The values missing from a trackpoint are taken from the previous one
+    np.testing.assert_allclose(track[:, 5], [1.5, 1.5, 0.5])
+    np.testing.assert_allclose(track[:, 6], [-0.5, -0.5, 0.5])
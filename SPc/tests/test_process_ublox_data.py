@@ -0,0 +1,65 @@
+import io
+import numpy as np
+from datetime import datetime
+from process_ublox_data import read_ublox_data, read_ublox_data_parallel, resync_ublox, ubx_message_at
+from process_ublox_data import parse_ublox_block, new_ublox_state, new_ublox_records, take_ublox_records
+from ubx_logs import ubx_log, nmea_sentence
+
+DATE = datetime(2021, 4, 27)
+
+
+def parse_whole(log):
+    records = new_ublox_records()
+    parse_ublox_block(log, new_ublox_state(), DATE, records, final=True)
+    return np.concatenate(take_ublox_records(records))
+
+
+def test_binary_log_buffer_is_bounded():
+    log = ubx_log(3000)
+    block_size = 4096
+    state = new_ublox_state()
+    records = new_ublox_records()
+    leftover = b''
+    largest = 0
+    for start in range(0, len(log), block_size):
+        buf = leftover + log[start:start + block_size]
+        cut, _ = parse_ublox_block(buf, state, DATE, records, final=False)
+        leftover = buf[cut:]
+        largest = max(largest, len(leftover))
+    parse_ublox_block(leftover, state, DATE, records, final=True)
+
+    # Only a partial frame is carried to the next block
+    assert largest < block_size
+    np.testing.assert_array_equal(np.concatenate(take_ublox_records(records)), parse_whole(log))
+
+
+def test_blocks_match_whole_log():
+    for nmea in (False, True):
+        log = ubx_log(500, seed=1, nmea=nmea)
+        expected = parse_whole(log)
+        assert len(expected) > 0
+        for block_size in (100, 4096, 1 << 22):
+            data = np.concatenate(list(read_ublox_data(io.BytesIO(log), DATE, block_size=block_size)))
+            np.testing.assert_array_equal(data, expected)
+
+
+def test_parallel_matches_serial(tmp_path):
+    # A binary log, and a mixed log with sentences that cannot be parsed
+    bad = nmea_sentence("GNRMC,bad")
+    mixed = b''.join(ubx_log(40, seed=k, nmea=True) + bad for k in range(10))
+    for name, log in (('binary', ubx_log(400, seed=2)), ('mixed', mixed)):
+        file_path = tmp_path / f"{name}.ubx"
+        file_path.write_bytes(log)
+        serial_stats, parallel_stats = {}, {}
+        serial = np.concatenate(list(read_ublox_data(str(file_path), DATE, stats=serial_stats)))
+        parallel = np.concatenate(list(read_ublox_data_parallel(str(file_path), DATE, workers=2,
+                                                                chunk_size=len(log)//7, stats=parallel_stats)))
+        np.testing.assert_array_equal(parallel, serial)
+        assert parallel_stats == serial_stats
+
+        # The chunks are split on messages, not only on NMEA lines
+        with open(file_path, 'rb') as data_file:
+            offsets = [resync_ublox(data_file, start) for start in range(0, len(log), len(log)//7)]
+        assert len(set(offsets)) == len(offsets)
+        assert all(ubx_message_at(log, offset, True) for offset in offsets[1:] if offset < len(log))
+    assert serial_stats['errors'] == 10
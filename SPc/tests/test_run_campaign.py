@@ -0,0 +1,57 @@
+import os
+import pytest
+import run_campaign as run_campaign_module
+from generate_data import generate_flight
+from run_campaign import run_campaign, run_flight
+
+
+@pytest.fixture(scope='module')
+def raw_dir(tmp_path_factory):
+    raw_dir = tmp_path_factory.mktemp('raw')
+    for seed, name in enumerate(('flight_a', 'flight_b')):
+        generate_flight(str(raw_dir), 2000, seed=seed, name=name)
+    return str(raw_dir)
+
+
+def statuses(manifest):
+    return {entry['name']: entry['status'] for entry in manifest['flights']}
+
+
+def test_skips_only_flights_run_with_the_same_parameters(raw_dir, tmp_path):
+    out_dir = str(tmp_path)
+    first = run_campaign(raw_dir, '2021-04-27', out_dir, workers=1, n=1)
+    assert statuses(first) == {'flight_a': 'ok', 'flight_b': 'ok'}
+
+    second = run_campaign(raw_dir, '2021-04-27', out_dir, workers=1, n=1)
+    assert statuses(second) == {'flight_a': 'skipped', 'flight_b': 'skipped'}
+    # The skipped flights keep the run time of the run that wrote their outputs
+    assert [entry['seconds'] for entry in second['flights']] == [entry['seconds'] for entry in first['flights']]
+
+    # The defaults of run_pipeline are the same parameters as the omitted ones
+    assert statuses(run_campaign(raw_dir, '2021-04-27', out_dir, workers=1)) == \
+        {'flight_a': 'skipped', 'flight_b': 'skipped'}
+
+    third = run_campaign(raw_dir, '2021-04-27', out_dir, workers=1, n=2, hgrnd=60)
+    assert statuses(third) == {'flight_a': 'ok', 'flight_b': 'ok'}
+    assert all(entry['params']['n'] == 2 and entry['params']['hgrnd'] == 60 for entry in third['flights'])
+
+
+def crash_flight_b(name, *args):
+    # A worker killed while running flight_b, as by the out of memory killer
+    if name == 'flight_b':
+        os._exit(1)
+    return run_flight(name, *args)
+
+
+def test_dead_worker_fails_its_pool_only(tmp_path, monkeypatch):
+    raw_dir = str(tmp_path / 'raw')
+    for seed, name in enumerate(('flight_a', 'flight_b', 'flight_c', 'flight_d')):
+        generate_flight(raw_dir, 500, seed=seed, name=name)
+    monkeypatch.setattr(run_campaign_module, 'run_flight', crash_flight_b)
+    manifest = run_campaign(raw_dir, '2021-04-27', str(tmp_path / 'out'), workers=1)
+    flights = {entry['name']: entry for entry in manifest['flights']}
+    # flight_c fails too if it was queued in the broken pool, flight_d always runs in a new one
+    assert [flights[name]['status'] for name in ('flight_a', 'flight_b', 'flight_d')] == ['ok', 'error', 'ok']
+    assert flights['flight_c']['status'] in ('ok', 'error')
+    assert flights['flight_b']['error'].startswith('BrokenProcessPool')
+    assert flights['flight_b']['params']['n'] == 1
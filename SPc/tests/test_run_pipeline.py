@@ -0,0 +1,75 @@
+import os
+import json
+import numpy as np
+import pytest
+from generate_data import generate_flight
+from functions.h5_storage import read_table
+from functions.stage_cache import file_hash
+from functions.metrics import enable_metrics, disable_metrics
+from run_pipeline import run_pipeline
+
+
+@pytest.fixture(scope='module')
+def flight(tmp_path_factory):
+    return generate_flight(str(tmp_path_factory.mktemp('raw')), 3000)
+
+
+def run(flight, out_dir, **params):
+    """
+    Run the pipeline, returns the SP file, the hashes of the KML files and the stages read from the cache
+    """
+    metrics_file = out_dir / 'metrics.jsonl'
+    enable_metrics(str(metrics_file))
+    try:
+        kml_files = run_pipeline(*flight[:2], '2021-04-27', str(out_dir), **params)
+    finally:
+        disable_metrics()
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    cached = [record for record in records if record['stage'] == 'run_pipeline'][-1]['cached']
+    sp_data = read_table(str(out_dir / 'synthetic_3000_SP.h5'))
+    return sp_data, {kml: file_hash(kml) for kml in kml_files}, cached
+
+
+def test_cache_follows_parameters(flight, tmp_path):
+    sp_1, kml_1, cached = run(flight, tmp_path, n=1)
+    assert cached == []
+    sp_2, kml_2, cached = run(flight, tmp_path, n=2, hgrnd=60)
+    assert cached == ['flightlog', 'ublox']
+    assert not np.array_equal(sp_1['SP_lat'], sp_2['SP_lat'])
+    assert kml_1.keys() == kml_2.keys() and kml_1 != kml_2
+
+    # Back to the first parameters: the SP are read from the cache and the SP file is written again,
+    # the KML files overwritten by the second run are written again
+    sp_3, kml_3, cached = run(flight, tmp_path, n=1)
+    assert cached == ['flightlog', 'ublox', 'SP']
+    np.testing.assert_array_equal(sp_3, sp_1)
+    assert kml_3 == kml_1
+
+    # Nothing changed: every stage is read from the cache
+    sp_4, kml_4, cached = run(flight, tmp_path, n=1)
+    assert cached == ['flightlog', 'ublox', 'SP', 'FZ']
+    assert kml_4 == kml_1
+
+
+def test_stale_kml_files_are_removed(flight, tmp_path):
+    # A KML file of a signal that is not in the SP file, e.g. written by a run on an older version of the logs
+    stale = tmp_path / 'synthetic_3000_SP_GP99_L1_FZ.kml'
+    stale.write_text('')
+    other = tmp_path / 'other_SP_GP01_L1_FZ.kml'
+    other.write_text('')
+    _, kml_hashes, _ = run(flight, tmp_path)
+    assert not stale.exists() and other.exists()
+    # A run writing .kmz files removes the .kml files
+    _, kmz_hashes, _ = run(flight, tmp_path, kmz=True)
+    assert sorted(path.name for path in tmp_path.glob('synthetic_3000_SP_*_FZ.km*')) == \
+        sorted(os.path.basename(kmz) for kmz in kmz_hashes)
+
+
+def test_cache_is_pruned(flight, tmp_path):
+    cache_dir = tmp_path / '.cache'
+    run(flight, tmp_path, n=1)
+    first_run = set(os.listdir(cache_dir))
+    run(flight, tmp_path, n=2, cache_size=0)
+    # Only the outputs of the last run are kept, the FZ record of n=1 is removed
+    kept = set(os.listdir(cache_dir))
+    assert len(kept) == len(first_run) and kept != first_run
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from functions.time_join import average_track, join_track
+from calculate_SP import compute_SP
+from process_ublox_data import UBLOX_DTYPE
+
+# time, lat, lon, ele, course, roll, pitch
+TRACK = np.array([
+    [100.0, 33.0, -88.0, 100.0, 350.0, 0.0, 0.0],
+    [101.0, 33.1, -88.1, 110.0, 10.0, 1.0, 2.0],
+    [103.0, 33.3, -88.3, 130.0, 30.0, 3.0, 4.0],
+])
+
+
+def test_average_track():
+    track = np.array([[2.0, 1.0, np.nan], [1.0, 5.0, 6.0], [2.0, 3.0, 4.0]])
+    np.testing.assert_array_equal(average_track(track), [[1.0, 5.0, 6.0], [2.0, 2.0, 4.0]])
+
+
+def test_exact():
+    obs_idx, rows = join_track(TRACK, [101, 102, 100])
+    np.testing.assert_array_equal(obs_idx, [2, 0])
+    np.testing.assert_array_equal(rows, TRACK[:2])
+
+
+def test_nearest_and_asof():
+    obs_time = [100.4, 101.6, 102.2, 104.5]
+    obs_idx, rows = join_track(TRACK, obs_time, method='nearest', tolerance=0.5)
+    np.testing.assert_array_equal(obs_idx, [0])
+    np.testing.assert_array_equal(rows[:, 1], [33.0])
+
+    obs_idx, rows = join_track(TRACK, obs_time, method='nearest', tolerance=1.0)
+    np.testing.assert_array_equal(obs_idx, [0, 1, 2])
+    np.testing.assert_array_equal(rows[:, 1], [33.0, 33.1, 33.3])
+    # The time of the joined rows is the observation time
+    np.testing.assert_array_equal(rows[:, 0], [100.4, 101.6, 102.2])
+
+    obs_idx, rows = join_track(TRACK, obs_time, method='asof', tolerance=1.5)
+    np.testing.assert_array_equal(obs_idx, [0, 1, 2, 3])
+    np.testing.assert_array_equal(rows[:, 1], [33.0, 33.1, 33.1, 33.3])
+
+
+def test_interp():
+    obs_idx, rows = join_track(TRACK, [100.5, 102.0, 99.0, 101.0], method='interp', tolerance=2.0)
+    np.testing.assert_array_equal(obs_idx, [0, 3, 1])
+    np.testing.assert_allclose(rows[:, 1], [33.05, 33.1, 33.2])
+    np.testing.assert_allclose(rows[:, 3], [105.0, 110.0, 120.0])
+    # The course is interpolated along the shortest turn (350 -> 10 through north)
+    np.testing.assert_allclose(rows[:, 4], [0.0, 10.0, 20.0])
+
+    # Both trackpoints have to be within the tolerance
+    obs_idx, _ = join_track(TRACK, [102.0], method='interp', tolerance=0.5)
+    assert len(obs_idx) == 0
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        join_track(TRACK, [100], method='linear')
+
+
+def test_exact_rounds_track_times():
+    # A trackpoint at 12.6 s is joined with the observations of 13 s, like the former gpx output
+    track = np.array([[12.6, 33.0, -88.0, 100.0, 0.0, 0.0, 0.0], [14.4, 33.1, -88.1, 100.0, 0.0, 0.0, 0.0]])
+    ubx = np.zeros(3, dtype=UBLOX_DTYPE)
+    ubx['time'] = [12, 13, 14]
+    ubx['const'] = b'GP'
+    ubx['band'] = b'L1'
+    ubx['ele'] = 45.0
+    sp = compute_SP(track, ubx)
+    np.testing.assert_array_equal(sp['time'], [13, 14])
+    np.testing.assert_array_equal(sp['fl_lat'], [33.0, 33.1])
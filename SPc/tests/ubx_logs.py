@@ -0,0 +1,69 @@
+import struct
+import numpy as np
+from datetime import datetime, timedelta
+from functions.UBX_parser import ubx_chksum, UBX_SYNC, UBX_NAV_PVT, UBX_NAV_SAT
+
+# Start of the synthetic logs
+START_TIME = datetime(2021, 4, 27, 21, 41, 39)
+
+
+def ubx_frame(msg, payload):
+    """
+    UBX frame of a message (class, id) with its checksum
+    """
+    body = struct.pack('<BBH', msg[0], msg[1], len(payload)) + payload
+    return UBX_SYNC + body + bytes(ubx_chksum(body))
+
+
+def nav_pvt(dt, lat, lon, height=100.0):
+    payload = bytearray(92)
+    struct.pack_into('<HBBBBBB', payload, 4, dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, 0x03)
+    payload[20] = 3
+    struct.pack_into('<iii', payload, 24, round(lon*1e7), round(lat*1e7), round(height*1e3))
+    return ubx_frame(UBX_NAV_PVT, bytes(payload))
+
+
+def nav_sat(svs):
+    """
+    NAV-SAT frame of (gnssId, svId, cno, elevation, azimuth) satellites
+    """
+    payload = bytearray(8 + 12*len(svs))
+    payload[5] = len(svs)
+    for k, (gnss_id, sv_id, cno, elev, azim) in enumerate(svs):
+        struct.pack_into('<BBBbh', payload, 8 + 12*k, gnss_id, sv_id, cno, elev, azim)
+    return ubx_frame(UBX_NAV_SAT, bytes(payload))
+
+
+def nmea_sentence(body):
+    checksum = 0
+    for c in body.encode():
+        checksum ^= c
+    return f"${body}*{checksum:02X}\r\n".encode()
+
+
+def gnrmc(dt, lat, lon):
+    lat_txt = f"{int(abs(lat)):02d}{(abs(lat) % 1)*60:07.4f},{'N' if lat >= 0 else 'S'}"
+    lon_txt = f"{int(abs(lon)):03d}{(abs(lon) % 1)*60:07.4f},{'E' if lon >= 0 else 'W'}"
+    return nmea_sentence(f"GNRMC,{dt:%H%M%S}.00,A,{lat_txt},{lon_txt},0.0,0.0,{dt:%d%m%y},,,A")
+
+
+def ubx_log(n_epochs, seed=0, nmea=False):
+    """
+    Log of n_epochs epochs of NAV-PVT and NAV-SAT frames (binary only), with a GNRMC sentence
+    before every NAV-PVT if nmea is True
+    The random payloads hold new line and '$' bytes like the logs of a receiver
+    """
+    rng = np.random.default_rng(seed)
+    parts = []
+    for k in range(n_epochs):
+        dt = START_TIME + timedelta(seconds=k)
+        lat = 33.47 + rng.uniform(-0.01, 0.01)
+        lon = -88.77 + rng.uniform(-0.01, 0.01)
+        if nmea:
+            parts.append(gnrmc(dt, lat, lon))
+        parts.append(nav_pvt(dt, lat, lon))
+        svs = [(int(gnss_id), int(sv_id), int(rng.integers(20, 50)), int(rng.integers(-5, 90)),
+                int(rng.integers(0, 360)))
+               for gnss_id, sv_id in zip(rng.choice([0, 2, 3, 6], 20), rng.integers(1, 30, 20))]
+        parts.append(nav_sat(svs))
+    return b''.join(parts)